@@ -2,6 +2,8 @@
 ASGI config for rent_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn rent_system.asgi:application``)
+to run the async endpoints under /api/async/ without blocking a worker thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
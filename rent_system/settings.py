@@ -2,7 +2,7 @@
 
 from datetime import timedelta
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import environ
 
 env = environ.Env()
@@ -32,16 +32,37 @@ INSTALLED_APPS = [
 # REST Framework settings - Using Session Authentication
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rental.authentication.JWTAuthenticationFromCookie',      # JWT из заголовка или куки access_token
         'rest_framework.authentication.SessionAuthentication',  # Сессионная аутентификация
         'rest_framework.authentication.BasicAuthentication',    # Basic Auth для тестирования
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_RENDERER_CLASSES': (
+        # Тот же JSON, через orjson (requirements.txt); без orjson - обычный JSONRenderer
+        'rental.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
+# Списки объектов, броней и отзывов собираются из .values() без полей DRF (rental/fast_serializers.py)
+FAST_SERIALIZERS = config('FAST_SERIALIZERS', default=True, cast=bool)
 AUTH_USER_MODEL = 'rental.CustomUser'
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=config('JWT_ACCESS_TOKEN_MINUTES', default=15, cast=int)),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_USER_CLASS': 'rental.authentication.ClaimsUser',
+}
+# Пользователь собирается из claims токена без SELECT по CustomUser (rental/authentication.py)
+JWT_STATELESS_USER = config('JWT_STATELESS_USER', default=True, cast=bool)
+# Отзыв токенов хранится в таблице TokenRevocation (и в кэше, если он общий);
+# процесс перечитывает метку пользователя не чаще раза в JWT_REVOCATION_CACHE_TTL секунд
+JWT_REVOCATION_CACHE_TTL = config('JWT_REVOCATION_CACHE_TTL', default=30, cast=int)
 # Middleware configuration
 MIDDLEWARE = [
+    'rental.profiling.ProfilingMiddleware',
+    'rental.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,6 +70,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'rental.middleware.QueryCountMiddleware',
 ]
 
 ROOT_URLCONF = 'rent_system.urls'
@@ -73,24 +95,78 @@ TEMPLATES = [
 WSGI_APPLICATION = 'rent_system.wsgi.application'
 
 # Database configuration
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.sqlite3',
-#         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
-# }
-
-# Optional MySQL configuration (comment out if not used)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': config('DB_NAME'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST'),
-        'PORT': config('DB_PORT', default='3306'),
+# DB_ENGINE=sqlite - локальная разработка и тесты без MySQL
+DB_ENGINE = config('DB_ENGINE', default='mysql')
+# Постоянные соединения вместо нового подключения на каждый запрос;
+# перед повторным использованием соединение проверяется (CONN_HEALTH_CHECKS)
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / config('DB_NAME', default='db.sqlite3'),
+            # Транзакция сразу берёт блокировку записи: select_for_update в SQLite не работает
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': config('DB_NAME'),
+            'USER': config('DB_USER'),
+            'PASSWORD': config('DB_PASSWORD'),
+            'HOST': config('DB_HOST'),
+            'PORT': config('DB_PORT', default='3306'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
-}
+
+# Реплики только для чтения (rental/routers.py). MySQL: DB_REPLICA_HOSTS=host[:port],...
+# с учётными данными primary или DB_REPLICA_USER/DB_REPLICA_PASSWORD.
+# SQLite: DB_REPLICA_NAME - второй файл, копия primary (manage.py sync_sqlite_replica).
+# В тестах реплики зеркалят тестовую БД primary.
+DATABASE_REPLICAS = []
+if DB_ENGINE == 'sqlite':
+    if config('DB_REPLICA_NAME', default=''):
+        DATABASES['replica1'] = {
+            **DATABASES['default'], 'NAME': BASE_DIR / config('DB_REPLICA_NAME'), 'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICAS.append('replica1')
+else:
+    for number, address in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+        host, _, port = address.partition(':')
+        DATABASES[f'replica{number}'] = {
+            **DATABASES['default'],
+            'HOST': host,
+            'PORT': port or DATABASES['default']['PORT'],
+            'USER': config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+            'PASSWORD': config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['rental.routers.PrimaryReplicaRouter']
+# Реплика проверяется не чаще раза в интервал; отстающая больше DB_REPLICA_MAX_LAG секунд исключается
+DB_REPLICA_CHECK_INTERVAL = config('DB_REPLICA_CHECK_INTERVAL', default=10.0, cast=float)
+DB_REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=30, cast=int)
+# После записи клиент столько секунд читает с primary, чтобы видеть свои изменения
+DB_REPLICA_PIN_SECONDS = config('DB_REPLICA_PIN_SECONDS', default=5, cast=int)
+
+# Хэширование паролей: стоимость PBKDF2 настраивается, старые хэши
+# перехэшируются при следующем входе (rental/hashers.py)
+PASSWORD_HASHERS = [
+    'rental.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# 0 - число итераций Django по умолчанию
+PASSWORD_HASH_ITERATIONS = config('PASSWORD_HASH_ITERATIONS', default=0, cast=int)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -111,3 +187,95 @@ STATIC_URL = 'static/'
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Буферизованный счётчик просмотров (rental/counters.py)
+VIEW_COUNTER_BUFFERED = config('VIEW_COUNTER_BUFFERED', default=True, cast=bool)
+VIEW_COUNTER_BATCH_SIZE = config('VIEW_COUNTER_BATCH_SIZE', default=500, cast=int)
+VIEW_COUNTER_FLUSH_INTERVAL = config('VIEW_COUNTER_FLUSH_INTERVAL', default=5.0, cast=float)
+
+# Счётчик SQL-запросов на HTTP-запрос (rental/middleware.py)
+QUERY_COUNT_ENABLED = config('QUERY_COUNT_ENABLED', default=DEBUG, cast=bool)
+QUERY_COUNT_WARN_THRESHOLD = config('QUERY_COUNT_WARN_THRESHOLD', default=20, cast=int)
+QUERY_COUNT_REPEAT_THRESHOLD = config('QUERY_COUNT_REPEAT_THRESHOLD', default=5, cast=int)
+
+# Профилирование запросов (rental/profiling.py). Включать только на закрытых стендах:
+# трассу запрашивает любой клиент, приславший заголовок PROFILING_HEADER
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_HEADER = config('PROFILING_HEADER', default='X-Profile')
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_MODE = config('PROFILING_MODE', default='sample')  # sample | cprofile
+PROFILING_INTERVAL = config('PROFILING_INTERVAL', default=0.001, cast=float)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'var' / 'profiles'))
+
+# Потоковая выгрузка CSV/NDJSON (rental/exports.py): строк за одно чтение из БД
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Массовый импорт объектов (rental/imports.py)
+IMPORT_BATCH_SIZE = config('IMPORT_BATCH_SIZE', default=500, cast=int)
+IMPORT_MAX_ROWS = config('IMPORT_MAX_ROWS', default=50000, cast=int)
+IMPORT_MAX_REPORTED_ERRORS = config('IMPORT_MAX_REPORTED_ERRORS', default=1000, cast=int)
+
+# Конвейер событий SearchHistory/PropertyView (rental/ingest.py)
+INGEST_BUFFERED = config('INGEST_BUFFERED', default=True, cast=bool)
+INGEST_BATCH_SIZE = config('INGEST_BATCH_SIZE', default=500, cast=int)
+INGEST_FLUSH_INTERVAL = config('INGEST_FLUSH_INTERVAL', default=2.0, cast=float)
+INGEST_QUEUE_SIZE = config('INGEST_QUEUE_SIZE', default=20000, cast=int)
+INGEST_ENQUEUE_TIMEOUT = config('INGEST_ENQUEUE_TIMEOUT', default=0.05, cast=float)
+INGEST_BULK_MAX_EVENTS = config('INGEST_BULK_MAX_EVENTS', default=1000, cast=int)
+INGEST_RETRY_INTERVAL = config('INGEST_RETRY_INTERVAL', default=10.0, cast=float)
+INGEST_SPOOL_DIR = config('INGEST_SPOOL_DIR', default=str(BASE_DIR / 'var' / 'spool'))
+INGEST_SPOOL_ORPHAN_AGE = config('INGEST_SPOOL_ORPHAN_AGE', default=300, cast=int)
+
+# Срок хранения сырых событий; более старые сворачиваются в дневные агрегаты (manage.py apply_retention)
+RETENTION_PROPERTY_VIEW_DAYS = config('RETENTION_PROPERTY_VIEW_DAYS', default=90, cast=int)
+RETENTION_SEARCH_HISTORY_DAYS = config('RETENTION_SEARCH_HISTORY_DAYS', default=90, cast=int)
+RETENTION_CHUNK_SIZE = config('RETENTION_CHUNK_SIZE', default=2000, cast=int)
+
+# Рекомендации (rental/recommendations.py). Окно не длиннее срока хранения сырых
+# событий: свёрнутые агрегаты не знают пользователя
+RECOMMEND_WINDOW_DAYS = config('RECOMMEND_WINDOW_DAYS', default=90, cast=int)
+RECOMMEND_TOP_K = config('RECOMMEND_TOP_K', default=20, cast=int)
+RECOMMEND_MIN_SUPPORT = config('RECOMMEND_MIN_SUPPORT', default=2, cast=int)
+RECOMMEND_SEED_SIZE = config('RECOMMEND_SEED_SIZE', default=20, cast=int)
+RECOMMEND_LIMIT = config('RECOMMEND_LIMIT', default=20, cast=int)
+
+# Повторы POST /bookings/ с заголовком Idempotency-Key (rental/idempotency.py).
+# Ключи старше IDEMPOTENCY_KEY_TTL удаляет manage.py purge_idempotency_keys;
+# ключ, запрос по которому не завершился за IDEMPOTENCY_LOCK_TIMEOUT, можно занять снова
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=60, cast=int)
+
+# Распределение цен /properties/price-stats/ (rental/price_stats.py): снимок в памяти
+# каждого процесса, изменения объектов видны не позже чем через PRICE_STATS_MAX_AGE секунд
+PRICE_STATS_MAX_AGE = config('PRICE_STATS_MAX_AGE', default=300, cast=int)
+PRICE_STATS_BINS = config('PRICE_STATS_BINS', default=20, cast=int)
+PRICE_STATS_MAX_BINS = config('PRICE_STATS_MAX_BINS', default=100, cast=int)
+
+# Координаты и гео-фильтры ?near=/?bbox= (rental/geo.py). GEOCODER_TABLE - необязательный
+# CSV name,latitude,longitude в дополнение к встроенной таблице городов
+GEOCODER_TABLE = config('GEOCODER_TABLE', default='')
+GEOHASH_PRECISION = config('GEOHASH_PRECISION', default=9, cast=int)
+GEO_MAX_CELLS = config('GEO_MAX_CELLS', default=16, cast=int)
+GEO_DEFAULT_RADIUS_KM = config('GEO_DEFAULT_RADIUS_KM', default=10.0, cast=float)
+GEO_MAX_RADIUS_KM = config('GEO_MAX_RADIUS_KM', default=500.0, cast=float)
+
+# Полнотекстовый поиск (rental/search.py). Пустое значение - выбор по СУБД:
+# MySQL FULLTEXT, SQLite FTS5, иначе индекс в памяти процесса
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='')
+# Сколько лучших совпадений ?search= упорядочено по релевантности; остальные идут после них по id
+SEARCH_MAX_RESULTS = config('SEARCH_MAX_RESULTS', default=1000, cast=int)
+SEARCH_MAX_PREFIX_EXPANSIONS = config('SEARCH_MAX_PREFIX_EXPANSIONS', default=50, cast=int)
+SEARCH_INDEX_MAX_AGE = config('SEARCH_INDEX_MAX_AGE', default=300, cast=int)
+
+# Кэш ответов API (rental/cache.py). В production - общий бэкенд, например
+# CACHE_URL=rediscache://127.0.0.1:6379/1; по умолчанию LocMem.
+# views_count обновляется пачками без сброса кэша и может отставать на RESPONSE_CACHE_TIMEOUT.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Async API (rental/async_views.py): независимые запросы одного ответа
+# выполняются параллельно в пуле потоков, каждый со своим соединением
+ASYNC_API_FANOUT = config('ASYNC_API_FANOUT', default=True, cast=bool)
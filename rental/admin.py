@@ -1,6 +1,9 @@
 # rental/admin.py
 from django.contrib import admin
-from .models import CustomUser, Property, Booking, Review, SearchHistory, PropertyView
+from .models import (
+    CustomUser, Property, Booking, Review, SearchHistory, PropertyView, PropertyViewDaily, SearchKeywordDaily,
+    PropertyNeighbor, KeywordAffinity,
+)
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
 @admin.register(CustomUser)
@@ -37,6 +40,7 @@ class PropertyAdmin(admin.ModelAdmin):
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('property', 'user', 'start_date', 'end_date', 'status', 'created_at')
+    list_select_related = ('property', 'user')
     search_fields = ('property__title', 'user__email')
     list_filter = ('status', 'start_date', 'end_date')
     ordering = ('-created_at',)
@@ -45,6 +49,7 @@ class BookingAdmin(admin.ModelAdmin):
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('property', 'user', 'rating', 'created_at')
+    list_select_related = ('property', 'user')
     search_fields = ('property__title', 'user__email')
     list_filter = ('rating',)
     ordering = ('-created_at',)
@@ -53,13 +58,51 @@ class ReviewAdmin(admin.ModelAdmin):
 @admin.register(SearchHistory)
 class SearchHistoryAdmin(admin.ModelAdmin):
     list_display = ('user', 'keyword', 'created_at')
+    list_select_related = ('user',)
     search_fields = ('user__email', 'keyword')
     ordering = ('-created_at',)
     readonly_fields = ('created_at',)
+    show_full_result_count = False  # без второго COUNT(*) по всей таблице при поиске
 
 @admin.register(PropertyView)
 class PropertyViewAdmin(admin.ModelAdmin):
     list_display = ('user', 'property', 'viewed_at')
+    list_select_related = ('user', 'property')
     search_fields = ('user__email', 'property__title')
     ordering = ('-viewed_at',)
     readonly_fields = ('viewed_at',)
+    show_full_result_count = False
+
+# История старше срока хранения (manage.py apply_retention)
+@admin.register(PropertyViewDaily)
+class PropertyViewDailyAdmin(admin.ModelAdmin):
+    list_display = ('property', 'day', 'views')
+    list_select_related = ('property',)
+    search_fields = ('property__title',)
+    date_hierarchy = 'day'
+    ordering = ('-day',)
+
+@admin.register(SearchKeywordDaily)
+class SearchKeywordDailyAdmin(admin.ModelAdmin):
+    list_display = ('keyword', 'day', 'searches')
+    search_fields = ('keyword',)
+    date_hierarchy = 'day'
+    ordering = ('-day', '-searches')
+
+# Предрасчитанные рекомендации (manage.py build_recommendations), только для просмотра
+@admin.register(PropertyNeighbor)
+class PropertyNeighborAdmin(admin.ModelAdmin):
+    list_display = ('property', 'neighbor', 'score', 'computed_at')
+    list_select_related = ('property', 'neighbor')
+    raw_id_fields = ('property', 'neighbor')
+    ordering = ('property', '-score')
+    show_full_result_count = False
+
+@admin.register(KeywordAffinity)
+class KeywordAffinityAdmin(admin.ModelAdmin):
+    list_display = ('keyword', 'property', 'score', 'computed_at')
+    list_select_related = ('property',)
+    raw_id_fields = ('property',)
+    search_fields = ('keyword',)
+    ordering = ('keyword', '-score')
+    show_full_result_count = False
@@ -0,0 +1,211 @@
+# rental/async_views.py
+# Асинхронные read-only эндпоинты для режима ASGI (uvicorn rent_system.asgi:application).
+# DRF синхронный, поэтому здесь обычные async-представления Django поверх async ORM.
+import asyncio
+import base64
+import binascii
+from datetime import datetime, timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.request import Request
+
+from .authentication import JWTAuthenticationFromCookie
+from .availability import active_bookings
+from .facets import facet_counts, requested_facets
+from .fast_serializers import FastPlan
+from .filters import BookingFilter, PropertyFilter
+from .models import Booking, Property, Review
+from .search import get_search_backend
+from .serializers import BookingSerializer, PropertySerializer, ReviewSerializer
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+authenticator = JWTAuthenticationFromCookie()
+
+
+class BadRequest(Exception):
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail if isinstance(detail, dict) else {'detail': detail}
+
+
+def async_api_view(handler):
+    @wraps(handler)
+    async def view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        try:
+            # Кэш отзыва токенов и, без claims, запрос пользователя - синхронные
+            result = await sync_to_async(authenticator.authenticate)(request)
+        except APIException as exc:
+            return JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+        if result is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user, request.auth = result
+
+        try:
+            return await handler(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({'detail': 'No object found.'}, status=404)
+        except BadRequest as exc:
+            return JsonResponse(exc.detail, status=400)
+    return view
+
+
+def _run_isolated(func):
+    try:
+        return func()
+    finally:
+        # Соединение этого потока закрывается по тем же правилам, что и после запроса
+        close_old_connections()
+
+
+async def gather_queries(*funcs):
+    # Async ORM выполняет все запросы в одном потоке, поэтому asyncio.gather над
+    # ним ничего не распараллелит. Независимые запросы запускаем в пуле потоков,
+    # у каждого своё соединение с БД.
+    if not settings.ASYNC_API_FANOUT:
+        return [await sync_to_async(func)() for func in funcs]
+    return await asyncio.gather(*(sync_to_async(_run_isolated, thread_sensitive=False)(func) for func in funcs))
+
+
+def encode_cursor(created_at, pk):
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{pk}'.encode()).decode()
+
+
+def decode_cursor(raw):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(raw.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BadRequest('Invalid cursor.')
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('page_size', PAGE_SIZE))
+    except ValueError:
+        raise BadRequest('page_size must be an integer.')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+async def keyset_page(request, queryset, serializer_class):
+    # Та же сортировка (created_at, id), что у CreatedAtCursorPagination
+    size = page_size(request)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    queryset = queryset.order_by('-created_at', '-id')
+    context = {'request': Request(request)}
+    # Строки .values() вместо моделей, если сериализатор поддерживает быстрый путь
+    plan = FastPlan.build(serializer_class(context=context), queryset)
+    if plan is not None:
+        queryset = plan.values(queryset, ('created_at', 'id'))
+    rows = [obj async for obj in queryset[:size + 1]]
+
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor(*((last['created_at'], last['id']) if plan else (last.created_at, last.pk)))
+    return {
+        'next_cursor': next_cursor,
+        'results': plan.serialize(rows) if plan else serializer_class(rows, many=True, context=context).data,
+    }
+
+
+def _property_queryset(params):
+    # Поисковые движки выполняют SQL сразу, поэтому queryset строится синхронно
+    filterset = PropertyFilter(data=params, queryset=Property.objects.all())
+    if not filterset.is_valid():
+        raise BadRequest(dict(filterset.errors))
+    queryset = filterset.qs
+    query = params.get('search', '').strip()
+    if query:
+        queryset = get_search_backend().filter_queryset(queryset, query, ranked=False)
+    return queryset
+
+
+@async_api_view
+async def property_list(request):
+    try:
+        facets = requested_facets(request.GET)
+    except ValidationError as exc:
+        raise BadRequest(exc.detail)
+    queryset = await sync_to_async(_property_queryset)(request.GET)
+    data = await keyset_page(request, queryset, PropertySerializer)
+    if facets:
+        data['facets'] = await sync_to_async(facet_counts)(queryset, facets)
+    return JsonResponse(data)
+
+
+@async_api_view
+async def property_detail(request, pk):
+    today = timezone.localdate()
+    property, reviews, busy = await gather_queries(
+        lambda: Property.objects.filter(pk=pk).first(),
+        lambda: list(Review.objects.filter(property_id=pk).order_by('-created_at', '-id')[:5]),
+        lambda: list(
+            active_bookings()
+            .filter(property_id=pk, end_date__gt=today, start_date__lt=today + timedelta(days=90))
+            .order_by('start_date')
+            .values_list('start_date', 'end_date')
+        ),
+    )
+    if property is None:
+        raise Http404
+    context = {'request': Request(request)}
+    data = PropertySerializer(property, context=context).data
+    data['recent_reviews'] = ReviewSerializer(reviews, many=True, context=context).data
+    data['busy'] = [[start.isoformat(), end.isoformat()] for start, end in busy]
+    return JsonResponse(data)
+
+
+def _booking_queryset(user):
+    if user.is_landlord:
+        return Booking.objects.filter(property__user_id=user.pk)
+    return Booking.objects.filter(user_id=user.pk)
+
+
+def _filtered_bookings(user, params):
+    # Фильтр property проверяет существование объекта запросом к БД
+    filterset = BookingFilter(data=params, queryset=_booking_queryset(user))
+    if not filterset.is_valid():
+        raise BadRequest(dict(filterset.errors))
+    return filterset.qs
+
+
+@async_api_view
+async def booking_list(request):
+    queryset = await sync_to_async(_filtered_bookings)(request.user, request.GET)
+    return JsonResponse(await keyset_page(request, queryset, BookingSerializer))
+
+
+@async_api_view
+async def booking_detail(request, pk):
+    booking = await _booking_queryset(request.user).filter(pk=pk).afirst()
+    if booking is None:
+        raise Http404
+    return JsonResponse(BookingSerializer(booking, context={'request': Request(request)}).data)
+
+
+@async_api_view
+async def review_list(request, property_pk):
+    return JsonResponse(await keyset_page(request, Review.objects.filter(property_id=property_pk), ReviewSerializer))
+
+
+@async_api_view
+async def review_detail(request, property_pk, pk):
+    review = await Review.objects.filter(property_id=property_pk, pk=pk).afirst()
+    if review is None:
+        raise Http404
+    return JsonResponse(ReviewSerializer(review, context={'request': Request(request)}).data)
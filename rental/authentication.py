@@ -1,5 +1,123 @@
 # rental/authentication.py
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.functional import cached_property
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import TokenRevocation
+from .routers import use_primary
+
+REVOKED_KEY = 'rental:jwt:revoked:{}'
+
+
+class ClaimsUser(TokenUser):
+    # Пользователь, собранный из claims access-токена, без запроса к CustomUser
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @cached_property
+    def is_landlord(self):
+        return self.token.get('is_landlord', False)
+
+    @cached_property
+    def is_tenant(self):
+        return self.token.get('is_tenant', True)
+
+    @cached_property
+    def group_names(self):
+        return tuple(self.token.get('groups', ()))
+
+    def __str__(self):
+        return self.email
+
+
+def issue_tokens(user):
+    refresh = RefreshToken.for_user(user)
+    refresh['email'] = user.email
+    refresh['is_landlord'] = user.is_landlord
+    refresh['is_tenant'] = user.is_tenant
+    refresh['is_staff'] = user.is_staff
+    refresh['groups'] = list(user.groups.values_list('name', flat=True))
+    # iat - целые секунды; для сравнения с меткой отзыва нужно точное время
+    refresh['issued_at'] = time.time()
+    return refresh
+
+
+class RevocationCache:
+    """Отзыв токенов пользователя без обращения к таблице пользователей.
+
+    Метка "токены, выпущенные не позже этого момента, недействительны"
+    хранится в таблице TokenRevocation, общей для всех процессов, и
+    дублируется в кэше Django, если он общий (не LocMem). Чтобы не ходить
+    за ней на каждый запрос, процесс держит локальную копию на
+    JWT_REVOCATION_CACHE_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = {}
+
+    @staticmethod
+    def shared_cache():
+        # LocMem виден только своему процессу: метка в нём не дошла бы до других
+        return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+    @staticmethod
+    def timeout():
+        return int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+    def revoke(self, user_id):
+        revoked_at = time.time()
+        TokenRevocation.objects.update_or_create(user_id=user_id, defaults={'revoked_at': revoked_at})
+        if self.shared_cache():
+            cache.set(REVOKED_KEY.format(user_id), revoked_at, timeout=self.timeout())
+        with self._lock:
+            self._local.pop(user_id, None)
+
+    def revoked_before(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(user_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        shared = self.shared_cache()
+        revoked_at = cache.get(REVOKED_KEY.format(user_id)) if shared else None
+        if revoked_at is None:
+            # Реплика могла ещё не получить свежий отзыв
+            with use_primary():
+                revoked_at = TokenRevocation.objects.filter(user_id=user_id).values_list(
+                    'revoked_at', flat=True
+                ).first() or 0
+            if shared:
+                # add, а не set: не затираем метку, записанную параллельным revoke()
+                cache.add(REVOKED_KEY.format(user_id), revoked_at, timeout=self.timeout())
+        with self._lock:
+            self._local[user_id] = (now + settings.JWT_REVOCATION_CACHE_TTL, revoked_at)
+        return revoked_at
+
+    def reset(self):
+        with self._lock:
+            self._local.clear()
+
+    def is_revoked(self, user_id, issued_at):
+        # issued_at - время выпуска с дробной частью; у токенов без него iat в целых
+        # секундах, и токен, выпущенный в секунду отзыва, тоже считается отозванным
+        return issued_at <= self.revoked_before(user_id)
+
+
+revocations = RevocationCache()
+
 
 class JWTAuthenticationFromCookie(JWTAuthentication):
     def authenticate(self, request):
@@ -14,3 +132,14 @@ class JWTAuthenticationFromCookie(JWTAuthentication):
 
         validated_token = self.get_validated_token(raw_token)
         return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        # Токены, выпущенные до появления claims ролей, проверяем по базе
+        if not settings.JWT_STATELESS_USER or 'is_landlord' not in validated_token:
+            return super().get_user(validated_token)
+
+        user = ClaimsUser(validated_token)
+        issued_at = validated_token.get('issued_at', validated_token.get('iat', 0))
+        if revocations.is_revoked(user.id, issued_at):
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+        return user
@@ -0,0 +1,113 @@
+# rental/availability.py
+import bisect
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+
+from .models import Booking, Property
+
+# Бронирования - полуинтервалы [start_date, end_date): день выезда одного гостя
+# может быть днём заезда следующего.
+
+
+class BookingConflict(Exception):
+    pass
+
+
+class VersionConflict(Exception):
+    # Бронь изменили после того, как клиент (или этот запрос) её прочитал
+    def __init__(self, booking_id, current):
+        super().__init__(booking_id, current)
+        self.current = current
+
+
+def active_bookings():
+    return Booking.objects.exclude(status='cancelled')
+
+
+def overlapping(start, end):
+    return active_bookings().filter(start_date__lt=end, end_date__gt=start)
+
+
+def free_between(queryset, start, end):
+    # Один запрос с NOT EXISTS по индексу (property, start_date, end_date),
+    # сколько бы объектов ни было в выборке
+    busy = overlapping(start, end).filter(property=OuterRef('pk'))
+    return queryset.filter(~Exists(busy))
+
+
+class IntervalIndex:
+    """Занятые интервалы по объектам, построенные одним запросом.
+
+    Пересекающиеся брони объединяются, поэтому для каждого объекта хранится
+    отсортированный список непересекающихся интервалов, и поиск занятых
+    интервалов диапазона начинается с одного бинарного поиска.
+    """
+
+    def __init__(self, intervals):
+        self._starts = defaultdict(list)
+        self._ends = defaultdict(list)
+        for property_id, start, end in sorted(intervals):
+            starts, ends = self._starts[property_id], self._ends[property_id]
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+
+    @classmethod
+    def for_range(cls, start, end, property_ids=None):
+        bookings = overlapping(start, end)
+        if property_ids is not None:
+            bookings = bookings.filter(property_id__in=property_ids)
+        return cls(bookings.values_list('property_id', 'start_date', 'end_date'))
+
+    def busy(self, property_id, start, end):
+        starts, ends = self._starts.get(property_id, []), self._ends.get(property_id, [])
+        result = []
+        for i in range(bisect.bisect_right(ends, start), len(starts)):
+            if starts[i] >= end:
+                break
+            result.append((starts[i], ends[i]))
+        return result
+
+    def free_ranges(self, property_id, start, end):
+        result = []
+        cursor = start
+        for busy_start, busy_end in self.busy(property_id, start, end):
+            if busy_start > cursor:
+                result.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if cursor < end:
+            result.append((cursor, end))
+        return result
+
+
+@contextmanager
+def reserve(property_id, start, end, exclude_booking=None):
+    # Блокировка строки объекта сериализует параллельные бронирования одного
+    # объекта: проверка пересечения и запись идут в одной транзакции
+    with transaction.atomic():
+        list(Property.objects.select_for_update().filter(pk=property_id).values_list('pk', flat=True))
+        conflicts = overlapping(start, end).filter(property_id=property_id)
+        if exclude_booking is not None:
+            conflicts = conflicts.exclude(pk=exclude_booking)
+        if conflicts.exists():
+            raise BookingConflict(property_id, start, end)
+        yield
+
+
+def claim_version(booking):
+    """Увеличивает версию брони, если она всё ещё равна прочитанной.
+
+    Вызывается в транзакции перед save(): условный UPDATE держит блокировку
+    строки до коммита, поэтому из параллельных изменений одной версии
+    проходит одно, остальные получают VersionConflict.
+    """
+    expected = booking.version
+    if Booking.objects.filter(pk=booking.pk, version=expected).update(version=F('version') + 1) != 1:
+        current = Booking.objects.filter(pk=booking.pk).values_list('version', flat=True).first()
+        raise VersionConflict(booking.pk, current)
+    booking.version = expected + 1
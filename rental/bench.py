@@ -0,0 +1,79 @@
+# rental/bench.py
+import math
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment,
+)
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    # Бенчмарки работают на отдельной тестовой БД, рабочие данные не трогаются
+    setup_test_environment()
+    old_config = setup_databases(verbosity=verbosity, interactive=False)
+    try:
+        # Реплики зеркалят ту же БД; чтения оставляем на primary, чтобы их считал measure()
+        with override_settings(DATABASE_REPLICAS=[]):
+            yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * pct / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples_ms):
+    return {
+        'count': len(samples_ms),
+        'mean_ms': round(statistics.mean(samples_ms), 3),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p90_ms': round(percentile(samples_ms, 90), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'max_ms': round(max(samples_ms), 3),
+    }
+
+
+def measure(func, iterations, warmup=0):
+    for _ in range(warmup):
+        func()
+
+    timings, queries = [], []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured.captured_queries))
+
+    result = summarize(timings)
+    result['queries_per_call'] = round(statistics.mean(queries), 2)
+    return result
+
+
+def peak_memory(func, iterations=3):
+    # Пик выделенной Python-памяти за один вызов, KiB; отдельно от замера
+    # времени, потому что tracemalloc заметно замедляет код
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return round(max(peaks) / 1024, 1)
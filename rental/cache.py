@@ -0,0 +1,148 @@
+# rental/cache.py
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from .routers import read_from_replica
+
+GENERATION_KEY = 'rental:gen:{}'
+RESPONSE_KEY = 'rental:resp:{}'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def get_generations(tables):
+    # Поколение таблицы меняется при любой записи в неё; старые ключи ответов
+    # просто перестают запрашиваться и вытесняются по TTL
+    cache = get_cache()
+    keys = [GENERATION_KEY.format(table) for table in tables]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # Начальное значение от времени: после вытеснения ключа поколение
+            # не повторит уже использованное
+            cache.add(key, time.time_ns(), timeout=None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump_generation(table):
+    cache = get_cache()
+    key = GENERATION_KEY.format(table)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_generation_on_commit(table):
+    # До коммита параллельный запрос мог бы закэшировать старые данные под новым поколением
+    transaction.on_commit(lambda: bump_generation(table))
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.not_modified = 0
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses + self.not_modified
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_ratio': round((self.hits + self.not_modified) / total, 4) if total else None,
+            }
+
+
+stats = CacheStats()
+
+
+def _normalize_params(query_params):
+    params = []
+    for name in sorted(query_params):
+        values = [value.strip() for value in query_params.getlist(name) if value.strip()]
+        if name == 'fields':
+            values = [','.join(sorted({field.strip() for value in values for field in value.split(',')}))]
+        elif name == 'search':
+            values = [' '.join(value.lower().split()) for value in values]
+        if values:
+            params.append((name, tuple(sorted(values))))
+    return params
+
+
+class CachedResponseMixin:
+    # Кэширует response.data для list/retrieve. Ключ включает нормализованные
+    # параметры запроса и поколения таблиц из cache_tables.
+    cache_tables = ()
+
+    def get_cache_tables(self):
+        return self.cache_tables
+
+    def get_cache_key(self, request):
+        raw = repr((
+            self.basename,
+            self.action,
+            sorted(self.kwargs.items()),
+            request.get_host(),
+            _normalize_params(request.query_params),
+            get_generations(self.get_cache_tables()),
+        ))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve, request, *args, **kwargs)
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        # ETag выводится из ключа: он меняется вместе с поколением данных,
+        # поэтому 304 можно отдать, не читая сам кэш
+        etag = f'"{key}"'
+        if etag in _parse_etags(request.headers.get('If-None-Match', '')):
+            stats.record('not_modified')
+            return Response(status=304, headers={'ETag': etag})
+
+        cache = get_cache()
+        data = cache.get(RESPONSE_KEY.format(key))
+        if data is not None:
+            stats.record('hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+        else:
+            stats.record('misses')
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            timeout = settings.RESPONSE_CACHE_TIMEOUT
+            if read_from_replica():
+                # Ответ с реплики может отставать от поколения в ключе не больше, чем сама реплика
+                timeout = min(timeout, settings.DB_REPLICA_MAX_LAG)
+            cache.set(RESPONSE_KEY.format(key), response.data, timeout)
+            response['X-Cache'] = 'MISS'
+        response['ETag'] = etag
+        return response
+
+
+def _parse_etags(header):
+    return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
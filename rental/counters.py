@@ -0,0 +1,122 @@
+# rental/counters.py
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from .ingest import IngestBackpressure, property_view_events
+from .models import Property
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Write-behind счётчик просмотров.
+
+    Запрос только увеличивает счётчик в памяти процесса, а фоновый поток
+    периодически сбрасывает накопленное атомарными ``F()``-обновлениями
+    ``Property.views_count``. Строки ``PropertyView`` пишет конвейер событий
+    (rental/ingest.py). Блокировок строк на пути запроса нет.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None):
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        # Сумма self._counts, чтобы record() не пересчитывал её по всем объектам
+        self._pending = 0
+        self._wakeup = threading.Event()
+        self._worker = None
+
+    @property
+    def batch_size(self):
+        return self._batch_size or settings.VIEW_COUNTER_BATCH_SIZE
+
+    @property
+    def flush_interval(self):
+        return self._flush_interval or settings.VIEW_COUNTER_FLUSH_INTERVAL
+
+    def record(self, property_id, user_id):
+        try:
+            property_view_events.submit([{'property_id': property_id, 'user_id': user_id}])
+        except IngestBackpressure:
+            # Очередь событий переполнена: теряем строку истории, но не сам просмотр
+            logger.warning("Dropped property view event for property %s", property_id)
+
+        with self._lock:
+            self._counts[property_id] += 1
+            self._pending += 1
+            pending = self._pending
+
+        if not settings.VIEW_COUNTER_BUFFERED:
+            self.flush()
+            return
+
+        self._ensure_worker()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            total, self._pending = self._pending, 0
+        if not counts:
+            return 0
+
+        try:
+            self._write(counts)
+        except Exception:
+            logger.exception("Failed to flush %d buffered property views", total)
+            # Возвращаем данные в буфер, чтобы не потерять их до следующей попытки
+            with self._lock:
+                self._counts.update(counts)
+                self._pending += total
+            return 0
+        return total
+
+    def _write(self, counts):
+        # Группируем объекты с одинаковым приращением, чтобы обойтись парой UPDATE;
+        # удалённые за это время объекты UPDATE просто не найдёт
+        by_delta = defaultdict(list)
+        for property_id, delta in counts.items():
+            by_delta[delta].append(property_id)
+
+        with transaction.atomic():
+            for delta, property_ids in by_delta.items():
+                Property.objects.filter(pk__in=property_ids).update(views_count=F('views_count') + delta)
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+
+view_counter = ViewCounter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        view_counter.flush()
+    except Exception:
+        logger.exception("Failed to flush property views on shutdown")
@@ -0,0 +1,141 @@
+# rental/exports.py
+import csv
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+
+from .serializers import requested_fields
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def keyset_ordering(queryset):
+    """Запрошенная сортировка для keyset-порций: [(имя, по убыванию)], в конце pk.
+
+    Поддерживаются поля модели без NULL и аннотации: при NULL или выражении
+    в сортировке условие "строки после последней" было бы неоднозначным.
+    """
+    pk_name = queryset.model._meta.pk.name
+    keys = []
+    for item in queryset.query.order_by or queryset.model._meta.ordering:
+        if not isinstance(item, str) or item == '?':
+            raise ValidationError({'ordering': ['This ordering is not supported for exports.']})
+        descending = item.startswith('-')
+        name = item.lstrip('-')
+        if any(name == key for key, _ in keys):
+            continue
+        if name in ('pk', pk_name):
+            keys.append((pk_name, descending))
+            return keys
+        if name not in queryset.query.annotations:
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+            if field is None or field.null or field.is_relation:
+                raise ValidationError({'ordering': [f'Exports cannot be ordered by "{name}".']})
+        keys.append((name, descending))
+    keys.append((pk_name, False))
+    return keys
+
+
+def after_row(keys, values):
+    # Строки строго после values в порядке keys: (a > x) OR (a = x AND b > y) ...
+    condition = Q()
+    for position, (name, descending) in enumerate(keys):
+        equal = {key: values[key] for key, _ in keys[:position]}
+        condition |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': values[name]})
+    return condition
+
+
+def iterate_rows(queryset, fields, chunk_size):
+    # Строки читаются порциями, в памяти не больше chunk_size строк
+    if connection.vendor != 'mysql':
+        return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    # Сортировка проверяется до начала ответа, чтобы ошибка вернулась как 400
+    return keyset_rows(queryset, fields, chunk_size, keyset_ordering(queryset))
+
+
+def keyset_rows(queryset, fields, chunk_size, keys):
+    # MySQLdb без серверного курсора забирает в память весь результат,
+    # поэтому на MySQL идём keyset-порциями в запрошенном порядке с pk в конце
+    columns = list(fields) + [name for name, _ in keys if name not in fields]
+    queryset = queryset.order_by(*[f'-{name}' if descending else name for name, descending in keys])
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(after_row(keys, last))
+        rows = list(chunk.values_list(*columns)[:chunk_size])
+        for row in rows:
+            yield row[:len(fields)]
+        if len(rows) < chunk_size:
+            return
+        last = dict(zip(columns, rows[-1]))
+
+
+class _Echo:
+    # csv.writer пишет в "файл", а мы сразу забираем строку
+    def write(self, value):
+        return value
+
+
+def csv_lines(fields, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
+
+
+def ndjson_lines(fields, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def buffered(lines, size):
+    # Склеиваем строки в блоки, чтобы не отдавать серверу по одной строке
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= size:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+class ExportMixin:
+    """Потоковая выгрузка выборки viewset'а в CSV или NDJSON.
+
+    Учитывает те же фильтры, поиск и сортировку, что и список
+    (``filter_queryset``), но без пагинации; ``?fields=`` сужает набор колонок.
+    """
+
+    export_fields = ()
+    export_name = 'export'
+
+    def get_export_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<fmt>csv|ndjson)')
+    def export(self, request, fmt=None):
+        fields = list(self.export_fields)
+        requested = requested_fields(request)
+        if requested:
+            fields = [field for field in fields if field in requested or field == 'id']
+
+        rows = iterate_rows(self.get_export_queryset(), fields, settings.EXPORT_CHUNK_SIZE)
+        lines = csv_lines(fields, rows) if fmt == 'csv' else ndjson_lines(fields, rows)
+        response = StreamingHttpResponse(buffered(lines, 500), content_type=CONTENT_TYPES[fmt])
+        filename = f'{self.export_name}-{timezone.localdate():%Y%m%d}.{fmt}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,87 @@
+# rental/facets.py
+# Счётчики фасетов для списка объектов: все корзины всех фасетов считаются
+# одним агрегатным запросом с COUNT(... FILTER/CASE) по текущей выборке.
+from django.db.models import Count, Q
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .models import Property
+
+ROOM_BUCKETS = [(1, 1), (2, 2), (3, 3), (4, 4), (5, None)]
+# Полуинтервалы [min, max) цены; None - без верхней границы
+PRICE_BANDS = [(0, 500), (500, 1000), (1000, 2000), (2000, 5000), (5000, None)]
+
+
+def _buckets():
+    # facet -> [(value, extra, Q)]
+    rooms = []
+    for low, high in ROOM_BUCKETS:
+        if high is None:
+            rooms.append((f'{low}+', {}, Q(num_rooms__gte=low)))
+        else:
+            rooms.append((str(low), {}, Q(num_rooms__gte=low, num_rooms__lte=high)))
+    prices = []
+    for low, high in PRICE_BANDS:
+        condition = Q(price__gte=low) if high is None else Q(price__gte=low, price__lt=high)
+        value = f'{low}+' if high is None else f'{low}-{high}'
+        prices.append((value, {'min': low, 'max': high}, condition))
+    return {
+        'property_type': [
+            (value, {'label': label}, Q(property_type=value)) for value, label in Property.PROPERTY_TYPE_CHOICES
+        ],
+        'num_rooms': rooms,
+        'price': prices,
+    }
+
+
+FACETS = _buckets()
+
+
+def requested_facets(params):
+    # ?facets=1 - все фасеты, ?facets=price,num_rooms - только перечисленные
+    raw = params.get('facets', '').strip()
+    if not raw or raw.lower() in ('0', 'false'):
+        return []
+    if raw.lower() in ('1', 'true'):
+        return list(FACETS)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = set(names) - set(FACETS)
+    if unknown:
+        raise serializers.ValidationError({'facets': [f'Unknown facets: {", ".join(sorted(unknown))}.']})
+    return names
+
+
+def facet_counts(queryset, names):
+    aggregates = {}
+    for name in names:
+        for index, (value, extra, condition) in enumerate(FACETS[name]):
+            aggregates[f'{name}__{index}'] = Count('pk', filter=condition)
+    counts = queryset.order_by().aggregate(**aggregates)
+    return {
+        name: [
+            {'value': value, **extra, 'count': counts[f'{name}__{index}']}
+            for index, (value, extra, condition) in enumerate(FACETS[name])
+        ]
+        for name in names
+    }
+
+
+class FacetMixin:
+    """``?facets=`` добавляет к странице списка счётчики по текущим фильтрам.
+
+    Стоит после CachedResponseMixin, чтобы фасеты кэшировались вместе со страницей.
+    """
+
+    def list(self, request, *args, **kwargs):
+        names = requested_facets(request.query_params)
+        if not names:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        facets = facet_counts(queryset, names)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response({'results': self.get_serializer(queryset, many=True).data, 'facets': facets})
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response.data['facets'] = facets
+        return response
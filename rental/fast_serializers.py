@@ -0,0 +1,235 @@
+# rental/fast_serializers.py
+# Быстрый путь read-only списков. Страница читается через .values(), а каждое
+# поле сериализатора заранее сводится к (колонка, конвертер), повторяющему
+# to_representation поля DRF: Decimal, даты, choices, первичные ключи связей.
+# Вывод совпадает с обычными сериализаторами побайтно; если какое-то поле так
+# не выразить, запрос идёт обычным путём.
+import decimal
+import operator
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.db.models.query import ValuesIterable
+from rest_framework import fields, relations, serializers
+from rest_framework.settings import api_settings
+from rest_framework.utils.serializer_helpers import ReturnList
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _own(field, base):
+    # Конвертер повторяет только базовый to_representation, не переопределённый
+    return isinstance(field, base) and type(field).to_representation is base.to_representation
+
+
+def _decimal(field):
+    if not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) or field.localize:
+        raise Unsupported(field.field_name)
+    if field.decimal_places is None or field.normalize_output:
+        return lambda value: field.to_representation(value)
+    # Контекст и шаг, как в DecimalField.quantize, но один раз на запрос
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+    return convert
+
+
+def _datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    zone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != fields.ISO_8601 or zone is None:
+        raise Unsupported(field.field_name)
+
+    def convert(value):
+        if isinstance(value, str) or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(zone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _date(field):
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None or output_format.lower() != fields.ISO_8601:
+        raise Unsupported(field.field_name)
+    return lambda value: value if isinstance(value, str) else value.isoformat()
+
+
+def _choice(field):
+    choices = field.choice_strings_to_values
+    return lambda value: value if value == '' else choices.get(str(value), value)
+
+
+def converter(field):
+    # to_representation поля как функция от значения колонки; None - значение как есть
+    if _own(field, relations.PrimaryKeyRelatedField) and field.pk_field is None:
+        return None
+    if _own(field, fields.ChoiceField):
+        return _choice(field)
+    if _own(field, fields.BooleanField):
+        return bool
+    if _own(field, fields.DecimalField):
+        return _decimal(field)
+    if _own(field, fields.DateTimeField):
+        return _datetime(field)
+    if _own(field, fields.DateField):
+        return _date(field)
+    if _own(field, fields.FloatField):
+        return float
+    if _own(field, fields.IntegerField):
+        return int
+    if _own(field, fields.CharField):
+        return str
+    if _own(field, fields.ReadOnlyField):
+        return None
+    raise Unsupported(field.field_name)
+
+
+class FastPlan:
+    """Поля сериализатора в виде (имя, колонка, конвертер) для строк .values().
+
+    SerializerMethodField поддерживается, если сериализатор описал его в
+    ``fast_method_fields``: имя -> (нужные колонки, функция от строки).
+    Колонки, которых нет в выборке (аннотация не добавлена), не запрашиваются.
+    """
+
+    def __init__(self, serializer, queryset):
+        if type(serializer).to_representation is not serializers.Serializer.to_representation:
+            raise Unsupported('to_representation')
+        opts = queryset.model._meta
+        available = {field.name for field in opts.concrete_fields} | set(queryset.query.annotations)
+        method_fields = getattr(serializer, 'fast_method_fields', {})
+
+        self.fields = []
+        self.columns = []
+        for field in serializer._readable_fields:
+            name = field.field_name
+            if isinstance(field, serializers.SerializerMethodField):
+                if name not in method_fields:
+                    raise Unsupported(name)
+                columns, function = method_fields[name]
+                self.columns.extend(column for column in columns if column in available)
+                self.fields.append((name, None, function))
+                continue
+            if field.source not in available:
+                raise Unsupported(name)
+            self.columns.append(field.source)
+            self.fields.append((name, field.source, converter(field)))
+        self.available = available
+        self._serialize = None
+
+    @classmethod
+    def build(cls, serializer, queryset):
+        if not settings.FAST_SERIALIZERS:
+            return None
+        try:
+            return cls(serializer, queryset)
+        except Unsupported:
+            return None
+
+    def values(self, queryset, extra=()):
+        # .values() с колонками полей и дополнительными (например, сортировки для курсора)
+        return queryset.values(*dict.fromkeys([*self.columns, *extra]))
+
+    def serialize(self, rows):
+        if self._serialize is None:
+            self._serialize = self._compile()
+        return self._serialize(rows)
+
+    def _compile(self):
+        # Для каждого поля - функция от строки; колонки без конвертера читаются
+        # itemgetter без лишнего вызова
+        getters = []
+        for name, column, convert in self.fields:
+            if column is None:
+                getters.append((name, convert))
+            elif convert is None:
+                getters.append((name, operator.itemgetter(column)))
+            else:
+                getters.append((name, _converted(column, convert)))
+
+        def serialize(rows):
+            return [{name: get(row) for name, get in getters} for row in rows]
+        return serialize
+
+
+def _converted(column, convert):
+    def get(row):
+        value = row[column]
+        return None if value is None else convert(value)
+    return get
+
+
+class FastListSerializer:
+    # Заменяет ListSerializer в list(): тот же .data, но из строк плана.
+    # Исходный сериализатор остаётся в ReturnList для browsable API.
+    def __init__(self, plan, serializer, rows):
+        self.plan = plan
+        self.serializer = serializer
+        self.rows = rows
+
+    @property
+    def data(self):
+        rows = self.rows
+        if isinstance(rows, QuerySet) and rows._iterable_class is not ValuesIterable:
+            rows = self.plan.values(rows)
+        return ReturnList(self.plan.serialize(rows), serializer=self.serializer)
+
+
+class FastListMixin:
+    """list() строит ответ по FastPlan, если сериализатор это позволяет.
+
+    Стоит после CachedResponseMixin (в кэш попадает уже готовый ответ) и перед
+    миксинами, которые сами вызывают paginate_queryset/get_serializer.
+    """
+
+    _fast_plan = None
+
+    def list(self, request, *args, **kwargs):
+        self._fast_list = True
+        try:
+            return super().list(request, *args, **kwargs)
+        finally:
+            self._fast_list = False
+            self._fast_plan = None
+
+    def get_fast_plan(self, queryset):
+        if self._fast_plan is None:
+            self._fast_plan = FastPlan.build(self.get_serializer(), queryset)
+        return self._fast_plan
+
+    def paginate_queryset(self, queryset):
+        plan = self.get_fast_plan(queryset) if getattr(self, '_fast_list', False) else None
+        if plan is not None and self.paginator is not None:
+            # Курсору нужны значения полей сортировки в строке страницы
+            ordering = [name.lstrip('-') for name in self.paginator.get_ordering(self.request, queryset, self)]
+            if set(ordering) <= plan.available:
+                queryset = plan.values(queryset, ordering)
+            else:
+                self._fast_list = False
+        return super().paginate_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if not (getattr(self, '_fast_list', False) and kwargs.get('many') and args):
+            return serializer
+        rows = args[0]
+        if isinstance(rows, QuerySet):
+            plan = self.get_fast_plan(rows)
+        else:
+            plan = self._fast_plan
+            # Страница из моделей (быстрый путь не применился к пагинации)
+            if rows and not isinstance(rows[0], dict):
+                plan = None
+        if plan is None:
+            return serializer
+        return FastListSerializer(plan, serializer, rows)
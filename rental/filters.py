@@ -0,0 +1,119 @@
+# rental/filters.py
+import django_filters
+from django import forms
+from django.conf import settings
+from rest_framework import filters
+
+from . import geo
+from .availability import free_between
+from .models import Booking, Property
+from .search import LOCATION_COLUMNS, get_search_backend
+
+
+class PropertySearchFilter(filters.SearchFilter):
+    # ?search= обслуживает поисковый движок вместо icontains по search_fields
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return get_search_backend().filter_queryset(queryset, query)
+
+
+def parse_floats(value, count, name):
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise forms.ValidationError(f"{name} must be {count} comma-separated numbers.")
+    return numbers
+
+
+class PropertyFilterForm(forms.Form):
+    # Разобранные гео-параметры; не в cleaned_data, т.к. FilterSet ищет там только свои фильтры
+    near_point = None
+    bbox_bounds = None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get('available_from')
+        end = cleaned_data.get('available_to')
+        if bool(start) != bool(end):
+            raise forms.ValidationError("available_from and available_to must be used together.")
+        if start and end and start >= end:
+            raise forms.ValidationError("available_to must be after available_from.")
+        self.clean_geo(cleaned_data)
+        return cleaned_data
+
+    def clean_geo(self, cleaned_data):
+        # ?near=lat,lng&radius_km= и ?bbox=min_lat,min_lng,max_lat,max_lng
+        if cleaned_data.get('near'):
+            latitude, longitude = parse_floats(cleaned_data['near'], 2, 'near')
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise forms.ValidationError("near is out of range.")
+            radius = cleaned_data.get('radius_km') or settings.GEO_DEFAULT_RADIUS_KM
+            if not 0 < radius <= settings.GEO_MAX_RADIUS_KM:
+                raise forms.ValidationError(f"radius_km must be between 0 and {settings.GEO_MAX_RADIUS_KM}.")
+            self.near_point = (latitude, longitude, float(radius))
+        elif cleaned_data.get('radius_km') is not None:
+            raise forms.ValidationError("radius_km requires near.")
+
+        if cleaned_data.get('bbox'):
+            min_lat, min_lng, max_lat, max_lng = parse_floats(cleaned_data['bbox'], 4, 'bbox')
+            if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= max_lng <= 180):
+                raise forms.ValidationError("bbox must be min_lat,min_lng,max_lat,max_lng within range.")
+            self.bbox_bounds = (min_lat, min_lng, max_lat, max_lng)
+
+
+class PropertyFilter(django_filters.FilterSet):
+    location__icontains = django_filters.CharFilter(method='filter_location')
+    available_from = django_filters.DateFilter(method='filter_available')
+    available_to = django_filters.DateFilter(method='filter_available')
+    near = django_filters.CharFilter(method='filter_geo')
+    radius_km = django_filters.NumberFilter(method='filter_geo')
+    bbox = django_filters.CharFilter(method='filter_geo')
+
+    class Meta:
+        model = Property
+        form = PropertyFilterForm
+        fields = {
+            'price': ['gte', 'lte'],
+            'location': ['exact'],
+            'num_rooms': ['gte', 'lte'],
+            'property_type': ['exact'],
+        }
+
+    def filter_location(self, queryset, name, value):
+        # Поиск по словам локации через индекс, а не сканирование LIKE '%...%'
+        return get_search_backend().filter_queryset(queryset, value, columns=LOCATION_COLUMNS, ranked=False)
+
+    def filter_available(self, queryset, name, value):
+        # Обе даты применяются вместе в filter_queryset
+        return queryset
+
+    def filter_geo(self, queryset, name, value):
+        # Гео-параметры разобраны в PropertyFilterForm и применяются в filter_queryset
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        start = self.form.cleaned_data.get('available_from')
+        end = self.form.cleaned_data.get('available_to')
+        if start and end:
+            queryset = free_between(queryset, start, end)
+        if self.form.bbox_bounds:
+            queryset = geo.within_bbox(queryset, *self.form.bbox_bounds)
+        if self.form.near_point:
+            queryset = geo.within_radius(queryset, *self.form.near_point)
+        return queryset
+
+
+class BookingFilter(django_filters.FilterSet):
+    class Meta:
+        model = Booking
+        fields = {
+            'property': ['exact'],
+            'start_date': ['gte', 'lte'],
+            'end_date': ['gte', 'lte'],
+            'status': ['exact'],
+        }
@@ -0,0 +1,197 @@
+# rental/geo.py
+# Координаты объектов без PostGIS: геокодирование по локальной таблице городов
+# и geohash-колонка с обычным B-tree индексом. Запрос по кругу или прямоугольнику
+# сначала сужается диапазонами geohash (по индексу), затем проверяется точно.
+import csv
+import math
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Символ после 'z': верхняя граница диапазона всех geohash с данным префиксом
+GEOHASH_UPPER = '{'
+
+# Центры городов; ключи - нормализованные названия, включая частые написания
+CITY_COORDINATES = {
+    'kyiv': (50.4501, 30.5234), 'kiev': (50.4501, 30.5234), 'київ': (50.4501, 30.5234), 'киев': (50.4501, 30.5234),
+    'lviv': (49.8397, 24.0297), 'lvov': (49.8397, 24.0297), 'львів': (49.8397, 24.0297), 'львов': (49.8397, 24.0297),
+    'odesa': (46.4825, 30.7233), 'odessa': (46.4825, 30.7233), 'одеса': (46.4825, 30.7233), 'одесса': (46.4825, 30.7233),
+    'kharkiv': (49.9935, 36.2304), 'kharkov': (49.9935, 36.2304), 'харків': (49.9935, 36.2304), 'харьков': (49.9935, 36.2304),
+    'dnipro': (48.4647, 35.0462), 'дніпро': (48.4647, 35.0462), 'днепр': (48.4647, 35.0462),
+    'zaporizhzhia': (47.8388, 35.1396), 'запоріжжя': (47.8388, 35.1396), 'запорожье': (47.8388, 35.1396),
+    'vinnytsia': (49.2331, 28.4682), 'вінниця': (49.2331, 28.4682), 'винница': (49.2331, 28.4682),
+    'poltava': (49.5883, 34.5514), 'полтава': (49.5883, 34.5514),
+    'chernihiv': (51.4982, 31.2893), 'чернігів': (51.4982, 31.2893), 'чернигов': (51.4982, 31.2893),
+    'zhytomyr': (50.2547, 28.6587), 'житомир': (50.2547, 28.6587),
+    'rivne': (50.6199, 26.2516), 'рівне': (50.6199, 26.2516), 'ровно': (50.6199, 26.2516),
+    'lutsk': (50.7472, 25.3254), 'луцьк': (50.7472, 25.3254), 'луцк': (50.7472, 25.3254),
+    'ternopil': (49.5535, 25.5948), 'тернопіль': (49.5535, 25.5948), 'тернополь': (49.5535, 25.5948),
+    'ivano-frankivsk': (48.9226, 24.7111), 'івано-франківськ': (48.9226, 24.7111), 'ивано-франковск': (48.9226, 24.7111),
+    'uzhhorod': (48.6208, 22.2879), 'ужгород': (48.6208, 22.2879),
+    'chernivtsi': (48.2921, 25.9358), 'чернівці': (48.2921, 25.9358), 'черновцы': (48.2921, 25.9358),
+    'khmelnytskyi': (49.4230, 26.9871), 'хмельницький': (49.4230, 26.9871), 'хмельницкий': (49.4230, 26.9871),
+    'cherkasy': (49.4444, 32.0598), 'черкаси': (49.4444, 32.0598), 'черкассы': (49.4444, 32.0598),
+    'kropyvnytskyi': (48.5079, 32.2623), 'кропивницький': (48.5079, 32.2623), 'кропивницкий': (48.5079, 32.2623),
+    'mykolaiv': (46.9750, 31.9946), 'миколаїв': (46.9750, 31.9946), 'николаев': (46.9750, 31.9946),
+    'kherson': (46.6354, 32.6169), 'херсон': (46.6354, 32.6169),
+    'sumy': (50.9077, 34.7981), 'суми': (50.9077, 34.7981), 'сумы': (50.9077, 34.7981),
+    'bukovel': (48.3646, 24.4007), 'буковель': (48.3646, 24.4007),
+}
+
+
+def normalize_place(value):
+    return re.sub(r'\s+', ' ', value.strip().lower().replace('ё', 'е'))
+
+
+@lru_cache(maxsize=1)
+def lookup_table():
+    # Встроенная таблица плюс необязательный CSV (name,latitude,longitude) из GEOCODER_TABLE
+    table = dict(CITY_COORDINATES)
+    if settings.GEOCODER_TABLE:
+        with open(settings.GEOCODER_TABLE, encoding='utf-8-sig', newline='') as source:
+            for row in csv.DictReader(source):
+                table[normalize_place(row['name'])] = (float(row['latitude']), float(row['longitude']))
+    return table
+
+
+def geocode(location):
+    """Координаты (lat, lng) для свободного текста локации или None.
+
+    Сначала ищется строка целиком, затем части через запятую и отдельные
+    слова: "Lviv, Rynok Square 1" находит Львов. Сеть не используется.
+    """
+    if not location:
+        return None
+    table = lookup_table()
+    text = normalize_place(location)
+    candidates = [text]
+    candidates += [normalize_place(part) for part in text.split(',')]
+    candidates += re.findall(r"[\w'-]+", text)
+    for candidate in candidates:
+        if candidate in table:
+            return table[candidate]
+    return None
+
+
+def encode(latitude, longitude, precision=None):
+    precision = precision or settings.GEOHASH_PRECISION
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = bit_count = 0
+    even = True
+    while len(chars) < precision:
+        # Чётные биты делят долготу, нечётные - широту
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    # Высота и ширина ячейки geohash в градусах
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covering_cells(min_lat, min_lng, max_lat, max_lng, max_cells=None):
+    """Префиксы geohash, ячейки которых покрывают прямоугольник.
+
+    Берётся самая мелкая точность, при которой ячеек не больше max_cells:
+    каждая ячейка - отдельный диапазон по индексу, лишние строки по краям
+    отсекаются точной проверкой.
+    """
+    max_cells = max_cells or settings.GEO_MAX_CELLS
+    for precision in range(settings.GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(max_lat / height) - math.floor(min_lat / height) + 1
+        columns = math.floor(max_lng / width) - math.floor(min_lng / width) + 1
+        if rows * columns <= max_cells:
+            break
+    cells = set()
+    for row in range(rows):
+        latitude = min(min_lat + row * height, max_lat)
+        for column in range(columns):
+            longitude = min(min_lng + column * width, max_lng)
+            cells.add(encode(latitude, longitude, precision))
+    return sorted(cells)
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    # Прямоугольник, описанный вокруг круга на той же сфере, что и haversine_km.
+    # Наибольшее отклонение по долготе - asin(sin(r) / cos(lat)), а не r / cos(lat);
+    # если круг накрывает полюс, долгота берётся целиком
+    angular = radius_km / EARTH_RADIUS_KM
+    lat_delta = math.degrees(angular)
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    cos_lat = math.cos(math.radians(latitude))
+    if min_lat <= -90.0 or max_lat >= 90.0 or math.sin(angular) >= cos_lat:
+        lng_delta = 180.0
+    else:
+        lng_delta = math.degrees(math.asin(math.sin(angular) / cos_lat))
+    return (
+        max(min_lat, -90.0), max(longitude - lng_delta, -180.0),
+        min(max_lat, 90.0), min(longitude + lng_delta, 180.0),
+    )
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def distance_expression(latitude, longitude):
+    # Та же формула гаверсинуса в SQL; на SQLite функции регистрирует Django
+    a = (
+        Power(Sin(Radians(F('latitude') - latitude) / 2), 2)
+        + Cos(Radians(F('latitude'))) * math.cos(math.radians(latitude))
+        * Power(Sin(Radians(F('longitude') - longitude) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a), output_field=FloatField())
+
+
+def within_bbox(queryset, min_lat, min_lng, max_lat, max_lng):
+    # Диапазоны geohash идут по индексу; startswith не годится - на SQLite
+    # LIKE ... ESCAPE не использует индекс
+    cells = Q()
+    for cell in covering_cells(min_lat, min_lng, max_lat, max_lng):
+        cells |= Q(geohash__gte=cell, geohash__lt=cell + GEOHASH_UPPER)
+    return queryset.filter(cells).filter(
+        latitude__range=(min_lat, max_lat), longitude__range=(min_lng, max_lng),
+    )
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    queryset = within_bbox(queryset, *radius_bbox(latitude, longitude, radius_km))
+    return queryset.annotate(distance_km=distance_expression(latitude, longitude)).filter(distance_km__lte=radius_km)
+
+
+def locate(instance):
+    # Заполняет координаты по локации, если их не задали явно, и пересчитывает geohash.
+    # Возвращает True, если у объекта есть координаты
+    if instance.latitude is None or instance.longitude is None:
+        point = geocode(instance.location)
+        instance.latitude, instance.longitude = point if point else (None, None)
+    if instance.latitude is None:
+        instance.geohash = ''
+        return False
+    instance.geohash = encode(instance.latitude, instance.longitude)
+    return True
@@ -0,0 +1,13 @@
+# rental/hashers.py
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    # Тот же алгоритм pbkdf2_sha256, но число итераций задаётся в настройках.
+    # При успешном входе Django сам перехэширует пароль, если число итераций
+    # в хэше отличается от текущего (must_update).
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
@@ -0,0 +1,127 @@
+# rental/idempotency.py
+# Повтор POST с тем же заголовком Idempotency-Key возвращает сохранённый ответ
+# первого запроса вместо повторного создания. Ключ занимается отдельной
+# транзакцией до выполнения запроса, ответ сохраняется в одной транзакции
+# с созданным объектом. Ключи хранятся IDEMPOTENCY_KEY_TTL секунд.
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, cls=JSONEncoder, sort_keys=True)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def expired_before():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def _claim(user_id, scope, key, digest):
+    # Новая запись или занятая повторным запросом: (запись, занята_нами)
+    while True:
+        try:
+            with transaction.atomic():
+                return IdempotencyRecord.objects.create(user_id=user_id, scope=scope, key=key, fingerprint=digest), True
+        except IntegrityError:
+            pass
+        record = IdempotencyRecord.objects.filter(user_id=user_id, scope=scope, key=key).first()
+        if record is None:
+            # Запись удалили между вставкой и чтением - пробуем занять снова
+            continue
+        abandoned = record.status_code is None and (
+            record.created_at < timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        )
+        if record.created_at < expired_before() or abandoned:
+            # Ключ истёк или первый запрос оборвался, не дописав ответ: удаляем
+            # условно, чтобы из параллельных повторов запись занял один
+            IdempotencyRecord.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+            continue
+        return record, False
+
+
+class IdempotentCreateMixin:
+    """create() с поддержкой заголовка Idempotency-Key.
+
+    Сохраняются только успешные ответы: после ошибки (400, 409 и т.п.)
+    ничего не создано, и повтор с тем же ключом выполняется заново.
+    """
+
+    idempotency_scope = None
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER, '').strip()
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        digest = fingerprint(request)
+        scope = self.idempotency_scope or self.basename
+        record, claimed = _claim(request.user.pk, scope, key, digest)
+        if not claimed:
+            return self.replay(record, digest)
+
+        try:
+            with transaction.atomic():
+                response = super().create(request, *args, **kwargs)
+                if status.is_success(response.status_code):
+                    # Как в отрендеренном ответе: даты и Decimal - строками
+                    stored = IdempotencyRecord.objects.filter(pk=record.pk, status_code__isnull=True).update(
+                        status_code=response.status_code,
+                        response=json.loads(json.dumps(response.data, cls=JSONEncoder)),
+                    )
+                    if not stored:
+                        # Запрос шёл дольше IDEMPOTENCY_LOCK_TIMEOUT, и ключ занял повтор:
+                        # созданное откатываем, результатом ключа будет ответ повтора
+                        transaction.set_rollback(True)
+                        return Response(
+                            {'detail': f'The {HEADER} was taken over by a retry of this request.'},
+                            status=status.HTTP_409_CONFLICT,
+                        )
+        except BaseException:
+            record.delete()
+            raise
+        if not status.is_success(response.status_code):
+            record.delete()
+        return response
+
+    def replay(self, record, digest):
+        if record.fingerprint != digest:
+            return Response(
+                {'detail': f'{HEADER} was already used with a different request.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if record.status_code is None:
+            return Response(
+                {'detail': 'A request with this Idempotency-Key is still in progress.'},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Retry-After': '1'},
+            )
+        return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def purge_expired(chunk_size=1000):
+    # Удаление порциями по первичному ключу, без длинных блокировок таблицы
+    deleted = 0
+    cutoff = expired_before()
+    while True:
+        pks = list(IdempotencyRecord.objects.filter(created_at__lt=cutoff).values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return deleted
+        deleted += IdempotencyRecord.objects.filter(pk__in=pks).delete()[0]
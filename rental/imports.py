@@ -0,0 +1,167 @@
+# rental/imports.py
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework.parsers import BaseParser
+
+from .cache import bump_generation_on_commit
+from .geo import locate
+from .models import Property
+from .search import get_search_backend
+from .serializers import PropertyImportSerializer
+
+# Поля, которые может обновить повторный импорт: владелец, ключ и дата создания не меняются
+UPDATE_FIELDS = [name for name in PropertyImportSerializer.Meta.fields if name != 'external_ref']
+# Координаты и geohash пересчитываются по переданной локации или координатам (rental/geo.py)
+GEO_FIELDS = ('location', 'latitude', 'longitude')
+
+
+def update_fields_for(data):
+    # Обновляются только колонки, присланные в строке: пропущенная колонка
+    # сохраняет текущее значение, а не сбрасывается к умолчанию модели
+    fields = [name for name in UPDATE_FIELDS if name in data]
+    if any(name in data for name in GEO_FIELDS):
+        fields += [name for name in ('latitude', 'longitude') if name not in fields] + ['geohash']
+    return tuple(fields)
+
+
+class InvalidRow:
+    # Строка потока, которую не удалось разобрать; попадает в отчёт как ошибка
+    def __init__(self, message):
+        self.message = message
+
+
+def ndjson_rows(lines):
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8-sig')
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield InvalidRow(f'Invalid JSON: {exc}')
+
+
+def csv_rows(lines):
+    # Пустые ячейки не передаём: новый объект получит значения по умолчанию,
+    # у существующего поле не изменится
+    for row in csv.DictReader(lines):
+        yield {name: value for name, value in row.items() if name and value not in ('', None)}
+
+
+class NDJSONParser(BaseParser):
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        # Ленивый итератор: тело запроса читается построчно по мере импорта
+        return ndjson_rows(stream) if stream is not None else iter(())
+
+
+class CSVParser(BaseParser):
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return csv_rows(codecs.iterdecode(stream, 'utf-8-sig'))
+
+
+class ImportReport:
+    def __init__(self, max_errors):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.truncated = False
+
+    def error(self, row_number, row, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            external_ref = row.get('external_ref') if isinstance(row, dict) else None
+            self.errors.append({'row': row_number, 'external_ref': external_ref, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'truncated': self.truncated,
+        }
+
+
+def import_properties(user_id, rows, batch_size=None, max_rows=None):
+    """Создаёт или обновляет объекты арендодателя по external_ref.
+
+    Строки проверяются и записываются пачками: вставка с ``update_conflicts``
+    на пачку (по одной на каждый набор присланных колонок), индекс поиска и кэш
+    ответов обновляются тоже раз на пачку. У существующих объектов меняются
+    только присланные поля. Ошибочные строки попадают в отчёт и не мешают остальным.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    max_rows = max_rows or settings.IMPORT_MAX_ROWS
+    report = ImportReport(settings.IMPORT_MAX_REPORTED_ERRORS)
+
+    numbered = enumerate(rows, start=1)
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            break
+        if batch[-1][0] > max_rows:
+            batch = [(number, row) for number, row in batch if number <= max_rows]
+            report.truncated = True
+        _import_batch(user_id, batch, report)
+        if report.truncated:
+            break
+    return report
+
+
+def _import_batch(user_id, batch, report):
+    valid = {}
+    fields = {}
+    for number, row in batch:
+        if isinstance(row, InvalidRow):
+            report.error(number, None, {'non_field_errors': [row.message]})
+            continue
+        if not isinstance(row, dict):
+            report.error(number, None, {'non_field_errors': ['Expected an object.']})
+            continue
+        serializer = PropertyImportSerializer(data=row)
+        if not serializer.is_valid():
+            report.error(number, row, serializer.errors)
+            continue
+        # Повтор ключа внутри пачки: побеждает последняя строка
+        property = Property(user_id=user_id, **serializer.validated_data)
+        # bulk_create не вызывает pre_save, координаты заполняем здесь
+        locate(property)
+        valid[serializer.validated_data['external_ref']] = property
+        fields[serializer.validated_data['external_ref']] = update_fields_for(serializer.validated_data)
+    if not valid:
+        return
+
+    refs = list(valid)
+    existing = set(Property.objects.filter(user_id=user_id, external_ref__in=refs).values_list('external_ref', flat=True))
+    # MySQL сам выбирает уникальный ключ для ON DUPLICATE KEY UPDATE и не принимает unique_fields
+    unique_fields = ['user', 'external_ref'] if connection.features.supports_update_conflicts_with_target else None
+    # Одна вставка на набор присланных колонок; в обычном файле он один на всю пачку
+    groups = {}
+    for ref, property in valid.items():
+        groups.setdefault(fields[ref], []).append(property)
+    with transaction.atomic():
+        for update_fields, properties in groups.items():
+            Property.objects.bulk_create(
+                properties, update_conflicts=True, unique_fields=unique_fields, update_fields=update_fields,
+            )
+        saved = Property.objects.filter(user_id=user_id, external_ref__in=refs).only(
+            'id', 'title', 'description', 'location',
+        )
+        get_search_backend().index_many(saved)
+        bump_generation_on_commit('property')
+    report.updated += len(existing)
+    report.created += len(refs) - len(existing)
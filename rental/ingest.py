@@ -0,0 +1,277 @@
+# rental/ingest.py
+import atexit
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import landlord_stats
+from .models import PropertyView, SearchHistory
+
+logger = logging.getLogger(__name__)
+
+
+class IngestBackpressure(Exception):
+    pass
+
+
+class EventIngestor:
+    """Пакетная запись событий (поиски, просмотры) вне запроса.
+
+    ``submit()`` кладёт события в ограниченную очередь, фоновый поток собирает
+    их в пачки по INGEST_BATCH_SIZE (или раз в INGEST_FLUSH_INTERVAL секунд) и
+    пишет одним ``bulk_create``. Если места в очереди нет дольше
+    INGEST_ENQUEUE_TIMEOUT, ``submit()`` отказывает целиком, а не копит память.
+    Пачки, которые не удалось записать, дописываются в spool-файл на диске и
+    повторяются, когда база снова доступна.
+    """
+
+    def __init__(self, model, timestamp_field, on_write=()):
+        self.model = model
+        self.timestamp_field = timestamp_field
+        # Вызываются с каждой записанной пачкой в той же транзакции
+        self.on_write = list(on_write)
+        self.name = model._meta.model_name
+        self._foreign_keys = [
+            (field.attname, field.related_model) for field in model._meta.concrete_fields if field.is_relation
+        ]
+        self._pending = deque()
+        self._not_full = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._worker_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._retry_at = 0.0
+        self._stats = Counter()
+
+    @property
+    def batch_size(self):
+        return settings.INGEST_BATCH_SIZE
+
+    def submit(self, events):
+        now = timezone.now()
+        events = [dict(event) for event in events]
+        for event in events:
+            # Время события фиксируется при приёме, а не при записи пачки
+            event.setdefault(self.timestamp_field, now)
+
+        if not settings.INGEST_BUFFERED:
+            self.write(events)
+            return
+
+        self._ensure_worker()
+        with self._not_full:
+            # Пачка принимается целиком или не принимается: частичный приём
+            # при повторе клиента дал бы дубликаты
+            if not self._not_full.wait_for(
+                lambda: len(self._pending) + len(events) <= settings.INGEST_QUEUE_SIZE,
+                timeout=settings.INGEST_ENQUEUE_TIMEOUT,
+            ):
+                self._stats['rejected'] += len(events)
+                raise IngestBackpressure(len(events))
+            self._pending.extend(events)
+            self._stats['enqueued'] += len(events)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    def pending(self):
+        with self._not_full:
+            return len(self._pending)
+
+    def stats(self):
+        with self._not_full:
+            return dict(self._stats, queued=len(self._pending))
+
+    def flush(self):
+        with self._flush_lock:
+            written = self._replay_spool()
+            while True:
+                batch = self._take(self.batch_size)
+                if not batch:
+                    return written
+                if time.monotonic() < self._retry_at:
+                    # База недавно была недоступна: не ждём таймаутов соединения на каждой пачке
+                    self._spool(batch)
+                    continue
+                try:
+                    written += self.write(batch)
+                except Exception:
+                    logger.exception("Failed to write %d %s events, spooling to disk", len(batch), self.name)
+                    self._retry_at = time.monotonic() + settings.INGEST_RETRY_INTERVAL
+                    self._spool(batch)
+
+    def write(self, events):
+        # Объекты могли быть удалены, пока события ждали в очереди или в spool
+        for attname, related_model in self._foreign_keys:
+            ids = {event[attname] for event in events}
+            live = set(related_model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            events = [event for event in events if event[attname] in live]
+
+        with transaction.atomic():
+            self.model.objects.bulk_create([self.model(**event) for event in events], batch_size=self.batch_size)
+            for callback in self.on_write:
+                callback(events)
+        with self._not_full:
+            self._stats['written'] += len(events)
+        return len(events)
+
+    def _take(self, limit):
+        with self._not_full:
+            batch = [self._pending.popleft() for _ in range(min(limit, len(self._pending)))]
+            self._not_full.notify_all()
+        return batch
+
+    def _spool_path(self):
+        # Свой файл у каждого процесса: дописывания разных воркеров не перемешиваются
+        return os.path.join(settings.INGEST_SPOOL_DIR, f'{self.name}-{os.getpid()}.ndjson')
+
+    def _spool(self, events):
+        lines = []
+        for event in events:
+            lines.append(json.dumps(
+                {key: value.isoformat() if isinstance(value, datetime) else value for key, value in event.items()}
+            ))
+        with self._spool_lock:
+            os.makedirs(settings.INGEST_SPOOL_DIR, exist_ok=True)
+            with open(self._spool_path(), 'a', encoding='utf-8') as spool:
+                spool.write('\n'.join(lines) + '\n')
+        with self._not_full:
+            self._stats['spooled'] += len(events)
+
+    def _spool_files(self):
+        own = self._spool_path()
+        orphan_before = time.time() - settings.INGEST_SPOOL_ORPHAN_AGE
+        for path in glob.glob(os.path.join(settings.INGEST_SPOOL_DIR, f'{self.name}-*.ndjson')):
+            # Файлы других процессов забираем, только если их давно не дописывали
+            try:
+                if path == own or os.path.getmtime(path) < orphan_before:
+                    yield path
+            except FileNotFoundError:
+                continue
+
+    def _replay_spool(self):
+        if time.monotonic() < self._retry_at:
+            return 0
+        written = 0
+        for path in self._spool_files():
+            claimed = os.path.join(settings.INGEST_SPOOL_DIR, f'{self.name}-{uuid.uuid4().hex}.replay')
+            try:
+                with self._spool_lock:
+                    os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # файл забрал другой процесс
+
+            with open(claimed, encoding='utf-8') as spool:
+                events = [self._load_event(line) for line in spool if line.strip()]
+            for start in range(0, len(events), self.batch_size):
+                batch = events[start:start + self.batch_size]
+                try:
+                    written += self.write(batch)
+                except Exception:
+                    logger.exception("Failed to replay %s spool, keeping %d events", self.name, len(events) - start)
+                    self._retry_at = time.monotonic() + settings.INGEST_RETRY_INTERVAL
+                    self._spool(events[start:])
+                    os.remove(claimed)
+                    return written
+            os.remove(claimed)
+            with self._not_full:
+                self._stats['replayed'] += len(events)
+        return written
+
+    def _load_event(self, line):
+        event = json.loads(line)
+        event[self.timestamp_field] = parse_datetime(event[self.timestamp_field])
+        return event
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name=f'ingest-{self.name}', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(settings.INGEST_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Ingestion worker for %s failed", self.name)
+
+
+search_history_events = EventIngestor(SearchHistory, 'created_at')
+property_view_events = EventIngestor(PropertyView, 'viewed_at', on_write=[landlord_stats.record_views])
+ingestors = (search_history_events, property_view_events)
+
+
+@atexit.register
+def _flush_on_exit():
+    for ingestor in ingestors:
+        try:
+            ingestor.flush()
+        except Exception:
+            logger.exception("Failed to flush %s events on shutdown", ingestor.name)
+
+
+class IngestCreateMixin:
+    # create() и bulk только ставят события в очередь и отвечают 202:
+    # id записи на момент ответа ещё неизвестен
+    ingestor = None
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.enqueue([serializer.validated_data])
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of events.']})
+        if len(request.data) > settings.INGEST_BULK_MAX_EVENTS:
+            raise ValidationError({
+                'non_field_errors': [f'At most {settings.INGEST_BULK_MAX_EVENTS} events per request.']
+            })
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        return self.enqueue(serializer.validated_data)
+
+    def enqueue(self, items):
+        events = [self.to_event(item) for item in items]
+        try:
+            self.ingestor.submit(events)
+        except IngestBackpressure:
+            return Response(
+                {'detail': 'Event queue is full, retry later.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(math.ceil(settings.INGEST_FLUSH_INTERVAL))},
+            )
+        return Response({'accepted': len(events)}, status=status.HTTP_202_ACCEPTED)
+
+    def to_event(self, validated_data):
+        event = {'user_id': self.request.user.pk}
+        for name, value in validated_data.items():
+            if isinstance(value, models.Model):
+                event[f'{name}_id'] = value.pk
+            else:
+                event[name] = value
+        return event
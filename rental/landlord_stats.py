@@ -0,0 +1,191 @@
+# rental/landlord_stats.py
+# Дневная статистика арендодателя по объектам (LandlordDailyStat).
+# Поддерживается инкрементально: брони и отзывы - из сигналов (rental/signals.py),
+# просмотры - при записи пачки событий (rental/ingest.py). Полный пересчёт -
+# manage.py rebuild_landlord_stats. Property.price считается ценой за ночь.
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import LandlordDailyStat, Property
+
+STAT_FIELDS = ('views', 'booking_requests', 'cancellations', 'booked_nights', 'revenue', 'reviews', 'rating_sum')
+
+
+def new_deltas():
+    # (property_id, day) -> Counter(поле -> приращение)
+    return defaultdict(Counter)
+
+
+def add_stay(deltas, property_id, start, end, price, sign=1):
+    # Каждая ночь подтверждённой брони: +1 ночь и цена ночи к выручке
+    for offset in range((end - start).days):
+        changes = deltas[(property_id, start + timedelta(days=offset))]
+        changes['booked_nights'] += sign
+        changes['revenue'] += sign * price
+
+
+def apply_deltas(deltas):
+    """Прибавляет приращения к строкам статистики.
+
+    Недостающие строки сначала вставляются с игнором конфликтов, потом все
+    прибавляются через UPDATE ... = поле + приращение: параллельные записи
+    одного дня не теряют друг друга. Строки с одинаковыми приращениями
+    обновляются одним запросом.
+    """
+    deltas = {
+        key: {field: value for field, value in changes.items() if value}
+        for key, changes in deltas.items()
+    }
+    deltas = {key: changes for key, changes in deltas.items() if changes}
+    if not deltas:
+        return
+
+    property_ids = {property_id for property_id, _ in deltas}
+    landlords = dict(Property.objects.filter(pk__in=property_ids).values_list('pk', 'user_id'))
+    LandlordDailyStat.objects.bulk_create(
+        [
+            LandlordDailyStat(landlord_id=landlords[property_id], property_id=property_id, day=day)
+            for property_id, day in deltas if property_id in landlords
+        ],
+        ignore_conflicts=True,
+    )
+    rows = {
+        (property_id, day): pk
+        for pk, property_id, day in LandlordDailyStat.objects.filter(
+            property_id__in=property_ids, day__in={day for _, day in deltas},
+        ).values_list('pk', 'property_id', 'day')
+    }
+    by_changes = defaultdict(list)
+    for key, changes in deltas.items():
+        if key in rows:
+            by_changes[tuple(sorted(changes.items()))].append(rows[key])
+    for changes, pks in by_changes.items():
+        LandlordDailyStat.objects.filter(pk__in=pks).update(**{field: F(field) + value for field, value in changes})
+
+
+def record_views(events):
+    # Пачка событий PropertyView из EventIngestor
+    deltas = new_deltas()
+    for event in events:
+        deltas[(event['property_id'], timezone.localdate(event['viewed_at']))]['views'] += 1
+    apply_deltas(deltas)
+
+
+def rebuild(apps=None, batch_size=1000):
+    """Пересчитывает всю таблицу по броням, отзывам и просмотрам.
+
+    Правила те же, что у сигналов: отмена - в день cancelled_at, выручка - по
+    цене ночи из брони. У строк без этих полей (bulk_create) - день создания
+    и текущая цена объекта. Свёрнутые просмотры берутся из PropertyViewDaily.
+    """
+    # apps - реестр моделей миграции; по умолчанию текущие модели
+    apps = apps or global_apps
+    Property, Booking, Review, PropertyView, PropertyViewDaily, LandlordDailyStat = (
+        apps.get_model('rental', name)
+        for name in ('Property', 'Booking', 'Review', 'PropertyView', 'PropertyViewDaily', 'LandlordDailyStat')
+    )
+
+    deltas = new_deltas()
+    raw_views = (
+        PropertyView.objects.annotate(day=TruncDate('viewed_at')).values('property_id', 'day')
+        .annotate(total=Count('id')).values_list('property_id', 'day', 'total')
+    )
+    for property_id, day, total in raw_views:
+        deltas[(property_id, day)]['views'] += total
+    for property_id, day, total in PropertyViewDaily.objects.values_list('property_id', 'day', 'views'):
+        deltas[(property_id, day)]['views'] += total
+
+    created = (
+        Booking.objects.annotate(day=TruncDate('created_at')).values('property_id', 'day')
+        .annotate(total=Count('id')).values_list('property_id', 'day', 'total')
+    )
+    for property_id, day, total in created:
+        deltas[(property_id, day)]['booking_requests'] += total
+    cancelled = (
+        Booking.objects.filter(status='cancelled')
+        .annotate(day=TruncDate(Coalesce('cancelled_at', 'created_at'))).values('property_id', 'day')
+        .annotate(total=Count('id')).values_list('property_id', 'day', 'total')
+    )
+    for property_id, day, total in cancelled:
+        deltas[(property_id, day)]['cancellations'] += total
+    stays = Booking.objects.filter(status='confirmed').values_list(
+        'property_id', 'start_date', 'end_date', Coalesce('night_price', 'property__price'),
+    )
+    for property_id, start, end, price in stays.iterator(chunk_size=batch_size):
+        add_stay(deltas, property_id, start, end, price)
+
+    reviews = (
+        Review.objects.annotate(day=TruncDate('created_at')).values('property_id', 'day')
+        .annotate(total=Count('id'), ratings=Sum('rating')).values_list('property_id', 'day', 'total', 'ratings')
+    )
+    for property_id, day, total, ratings in reviews:
+        deltas[(property_id, day)]['reviews'] += total
+        deltas[(property_id, day)]['rating_sum'] += ratings
+
+    landlords = dict(Property.objects.values_list('pk', 'user_id'))
+    with transaction.atomic():
+        LandlordDailyStat.objects.all().delete()
+        LandlordDailyStat.objects.bulk_create(
+            (
+                LandlordDailyStat(landlord_id=landlords[property_id], property_id=property_id, day=day, **changes)
+                for (property_id, day), changes in deltas.items() if property_id in landlords
+            ),
+            batch_size=batch_size,
+        )
+    return len(deltas)
+
+
+def _ratios(totals, property_days):
+    totals['revenue'] = str(totals['revenue'] or Decimal('0.00'))
+    totals['occupancy'] = round(totals['booked_nights'] / property_days, 4) if property_days else None
+    totals['conversion'] = round(totals['booking_requests'] / totals['views'], 4) if totals['views'] else None
+    totals['rating_avg'] = round(totals['rating_sum'] / totals['reviews'], 2) if totals['reviews'] else None
+    return totals
+
+
+def summary(landlord_id, start, end):
+    """Сводка за [start, end): итоги, ряд по дням и разбивка по объектам.
+
+    Три запроса по индексу (landlord, day) и число объектов арендодателя.
+    """
+    rows = LandlordDailyStat.objects.filter(landlord_id=landlord_id, day__gte=start, day__lt=end)
+    # Имена агрегатов не должны совпадать с полями модели
+    sums = {f'{field}_sum': Sum(field) for field in STAT_FIELDS}
+
+    def unpack(values):
+        return {field: values[f'{field}_sum'] or 0 for field in STAT_FIELDS}
+
+    by_day = {values['day']: unpack(values) for values in rows.values('day').annotate(**sums).order_by()}
+    properties = [
+        {'property': values['property_id'], 'title': values['property__title'], **unpack(values)}
+        for values in rows.values('property_id', 'property__title').annotate(**sums).order_by()
+    ]
+    property_count = Property.objects.filter(user_id=landlord_id).count()
+    days_count = (end - start).days
+
+    days = []
+    totals = dict.fromkeys(STAT_FIELDS, 0)
+    day = start
+    while day < end:
+        values = by_day.get(day, dict.fromkeys(STAT_FIELDS, 0))
+        for field in STAT_FIELDS:
+            totals[field] += values[field]
+        days.append({'day': day, **_ratios(dict(values), property_count)})
+        day += timedelta(days=1)
+
+    properties.sort(key=lambda values: (-values['revenue'], values['property']))
+    return {
+        'from': start,
+        'to': end,
+        'properties_count': property_count,
+        'totals': _ratios(totals, property_count * days_count),
+        'days': days,
+        'properties': [_ratios(values, days_count) for values in properties],
+    }
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rental.retention import day_start, property_view_rollup, search_history_rollup
+
+
+class Command(BaseCommand):
+    help = 'Roll PropertyView and SearchHistory rows older than the retention period into daily aggregates and delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view-days', type=int, default=settings.RETENTION_PROPERTY_VIEW_DAYS)
+        parser.add_argument('--search-days', type=int, default=settings.RETENTION_SEARCH_HISTORY_DAYS)
+        parser.add_argument('--chunk-size', type=int, default=settings.RETENTION_CHUNK_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between chunks')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be rolled up')
+
+    def handle(self, *args, **options):
+        # Граница - начало дня, чтобы день не оказался частично в агрегатах, частично в сырых строках
+        today = day_start(timezone.localdate())
+        jobs = (
+            ('property views', property_view_rollup, options['view_days']),
+            ('search history', search_history_rollup, options['search_days']),
+        )
+        for label, rollup, days in jobs:
+            cutoff = today - timedelta(days=days)
+            if options['dry_run']:
+                self.stdout.write(f'{label}: {rollup.expired(cutoff).count()} rows older than {cutoff:%Y-%m-%d}')
+                continue
+            processed = rollup.run(cutoff, options['chunk_size'], options['pause'])
+            self.stdout.write(self.style.SUCCESS(f'{label}: rolled up and deleted {processed} rows older than {cutoff:%Y-%m-%d}'))
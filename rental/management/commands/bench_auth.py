@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from rental.authentication import issue_tokens
+from rental.bench import measure, scratch_database
+from rental.models import CustomUser, Property
+
+
+class Command(BaseCommand):
+    help = 'Compare queries and latency per request for DB-backed and claims-based JWT users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            landlord = CustomUser.objects.create_user(
+                email='bench@example.com', username='bench', password='bench-password', is_landlord=True,
+            )
+            Property.objects.create(
+                title='Bench flat', description='-', location='Kyiv', price='100.00', num_rooms=2,
+                property_type='apartment', user=landlord,
+            )
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {issue_tokens(landlord).access_token}')
+
+            results = {}
+            for label, stateless in (('database user', False), ('token claims', True)):
+                with override_settings(JWT_STATELESS_USER=stateless):
+                    results[label] = measure(lambda: client.get('/api/bookings/'), options['requests'], warmup=10)
+                result = results[label]
+                self.stdout.write(
+                    f"{label:<14} queries/request={result['queries_per_call']:<5} "
+                    f"mean={result['mean_ms']}ms p99={result['p99_ms']}ms"
+                )
+
+            saved = results['database user']['queries_per_call'] - results['token claims']['queries_per_call']
+            self.stdout.write(self.style.SUCCESS(f'Queries saved per request: {saved:g}'))
@@ -0,0 +1,66 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+from rental.bench import scratch_database, summarize
+from rental.models import CustomUser
+
+PASSWORD = 'bench-password-1'
+
+
+def login(email):
+    try:
+        started = time.perf_counter()
+        response = Client().post('/api/login/', {'email': email, 'password': PASSWORD})
+        elapsed = (time.perf_counter() - started) * 1000
+        assert response.status_code == 200, response.content
+        return elapsed
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Measure login throughput (logins/sec) at one or more PBKDF2 iteration counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--iterations', default='870000,260000,100000',
+                            help='Comma-separated PBKDF2 iteration counts to compare')
+
+    def handle(self, *args, **options):
+        costs = [int(value) for value in options['iterations'].split(',')]
+        with scratch_database():
+            # Все пользователи получают хэш с первой стоимостью; хэшируем один раз
+            with override_settings(PASSWORD_HASH_ITERATIONS=costs[0]):
+                password_hash = make_password(PASSWORD)
+            emails = [f'bench{i}@example.com' for i in range(options['users'])]
+            CustomUser.objects.bulk_create([
+                CustomUser(email=email, username=email, password=password_hash) for email in emails
+            ])
+
+            for cost in costs:
+                with override_settings(PASSWORD_HASH_ITERATIONS=cost):
+                    # Первый вход каждого пользователя перехэширует пароль под новую стоимость
+                    rehash_started = time.perf_counter()
+                    for email in emails:
+                        login(email)
+                    rehash_seconds = time.perf_counter() - rehash_started
+
+                    targets = [emails[i % len(emails)] for i in range(options['logins'])]
+                    started = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                        timings = list(pool.map(login, targets))
+                    elapsed = time.perf_counter() - started
+
+                result = summarize(timings)
+                self.stdout.write(
+                    f"iterations={cost:<8} logins/sec={len(targets) / elapsed:8.1f} "
+                    f"p50={result['p50_ms']}ms p99={result['p99_ms']}ms "
+                    f"(rehash pass {rehash_seconds:.2f}s for {len(emails)} users)"
+                )
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from rental.bench import measure, scratch_database
+from rental.fast_serializers import FastPlan
+from rental.models import Booking, Property, Review
+from rental.renderers import FastJSONRenderer, orjson
+from rental.serializers import BookingSerializer, PropertySerializer, ReviewSerializer
+from rental.synthetic import SyntheticData
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare DRF serializers + JSONRenderer with the .values() fast path + FastJSONRenderer '
+        'on large lists and check that both produce identical bytes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        # Явно включаем быстрый путь, даже если он выключен в окружении
+        with scratch_database(), override_settings(FAST_SERIALIZERS=True):
+            SyntheticData(seed=options['seed']).generate(
+                landlords=10, tenants=200, properties=rows, bookings_per_property=1, reviews=rows,
+                views=0, searches=0,
+            )
+            context = {'request': Request(RequestFactory().get('/'))}
+            cases = (
+                ('property', PropertySerializer, Property.objects.order_by('-created_at', '-id')[:rows]),
+                ('booking', BookingSerializer, Booking.objects.order_by('-created_at', '-id')[:rows]),
+                ('review', ReviewSerializer, Review.objects.order_by('-created_at', '-id')[:rows]),
+            )
+            self.stdout.write(f'JSON encoder: {"orjson" if orjson else "json (orjson is not installed)"}')
+
+            mismatched = []
+            for name, serializer_class, queryset in cases:
+                plan = FastPlan.build(serializer_class(context=context), queryset)
+                if plan is None:
+                    raise CommandError(f'{serializer_class.__name__} has fields the fast path cannot express')
+
+                def drf():
+                    return JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+
+                def fast():
+                    return FastJSONRenderer().render(plan.serialize(plan.values(queryset)))
+
+                if drf() != fast():
+                    mismatched.append(name)
+                slow = measure(drf, options['iterations'], warmup=1)
+                quick = measure(fast, options['iterations'], warmup=1)
+                self.stdout.write(
+                    f"{name:<9} rows={queryset.count():<6} drf mean={slow['mean_ms']}ms "
+                    f"fast mean={quick['mean_ms']}ms speedup={slow['mean_ms'] / quick['mean_ms']:.1f}x"
+                )
+
+        if mismatched:
+            raise CommandError(f'Fast path output differs from DRF serializers: {", ".join(mismatched)}')
+        self.stdout.write(self.style.SUCCESS('Fast path output is byte-identical to the DRF serializers'))
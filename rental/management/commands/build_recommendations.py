@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from rental.recommendations import RecommendationBuilder
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild property neighbours and keyword affinities from recent PropertyView and SearchHistory rows. '
+        'With --incremental only properties and keywords with new events since the last build are refreshed; '
+        'schedule it often and a full rebuild nightly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true')
+        parser.add_argument('--window-days', type=int)
+        parser.add_argument('--top-k', type=int)
+        parser.add_argument('--min-support', type=int)
+
+    def handle(self, *args, **options):
+        builder = RecommendationBuilder(
+            window_days=options['window_days'], top_k=options['top_k'], min_support=options['min_support'],
+        )
+        since = builder.last_build() if options['incremental'] else None
+        if options['incremental'] and since is None:
+            self.stdout.write('No previous build, running a full rebuild')
+        stats = builder.build(since=since)
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Refreshed' if since else 'Rebuilt'} recommendations from {stats['views']} user/property views "
+            f"and {stats['searches']} user/keyword searches: "
+            f"{stats['neighbors']} neighbour rows, {stats['affinities']} keyword rows"
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from rental.authentication import issue_tokens
+from rental.bench import scratch_database
+from rental.models import CustomUser, Property
+from rental.testing import (
+    NO_CACHE, QUERY_BUDGETS, assert_constant_queries, budget_endpoints, query_budget, seed_budget_data,
+)
+
+
+class Command(BaseCommand):
+    help = 'Check that list endpoints stay within QUERY_BUDGETS and do not grow with the number of rows (N+1)'
+
+    def handle(self, *args, **options):
+        failures = []
+        with scratch_database(), override_settings(CACHES=NO_CACHE, INGEST_BUFFERED=False):
+            self.landlord = CustomUser.objects.create_user(
+                email='landlord@example.com', username='landlord', password='budget-password', is_landlord=True,
+            )
+            self.tenant = CustomUser.objects.create_user(
+                email='tenant@example.com', username='tenant', password='budget-password', is_tenant=True,
+            )
+            self.seed(3)
+            property_pk = Property.objects.order_by('pk').values_list('pk', flat=True).first()
+
+            for name, user, url in budget_endpoints(self.landlord, self.tenant, property_pk):
+                client = Client(headers={'Authorization': f'Bearer {issue_tokens(user).access_token}'})
+                # Первый запрос читает метку отзыва токенов, она не входит в бюджет
+                client.get(url)
+                try:
+                    with query_budget(QUERY_BUDGETS[name]) as captured:
+                        client.get(url)
+                    count = assert_constant_queries(lambda: client.get(url), lambda: self.seed(10))
+                except AssertionError as exc:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f'{name}: {exc}'))
+                else:
+                    self.stdout.write(f'{name:<24} {count} queries (budget {QUERY_BUDGETS[name]}), constant')
+
+        if failures:
+            raise CommandError(f'Query budget exceeded: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All endpoints are within their query budgets'))
+
+    def seed(self, count):
+        seed_budget_data(self.landlord, self.tenant, count)
@@ -0,0 +1,110 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from rental.filters import PropertyFilter
+from rental.models import Booking, Property, PropertyView, Review, SearchHistory
+
+PAGE = 21  # размер страницы курсорной пагинации + 1
+
+
+def query_shapes():
+    # Запросы в том виде, в каком их строят вьюсеты API; значения параметров
+    # не важны, EXPLAIN смотрит только на план
+    today = date.today()
+
+    def properties(**params):
+        return PropertyFilter(data=params, queryset=Property.objects.all()).qs.order_by('-created_at', '-id')[:PAGE]
+
+    return [
+        ('properties: first page', properties()),
+        ('properties: price range', properties(price__gte='50', price__lte='200')),
+        ('properties: type + price', properties(property_type='apartment', price__lte='200')),
+        ('properties: rooms', properties(num_rooms__gte='2', num_rooms__lte='3')),
+        ('properties: exact location', properties(location='Kyiv')),
+        ('properties: location words', properties(location__icontains='kyiv')),
+        ('bookings: overlap check',
+         Booking.objects.filter(property_id=1, start_date__lt=today, end_date__gt=today).values('pk')[:1]),
+        ('bookings: review eligibility',
+         Booking.objects.filter(property_id=1, user_id=1, end_date__lt=today).values('pk')[:1]),
+        ('bookings: tenant list', Booking.objects.filter(user_id=1).order_by('-created_at', '-id')[:PAGE]),
+        ('bookings: landlord list',
+         Booking.objects.filter(property__user_id=1).order_by('-created_at', '-id')[:PAGE]),
+        ('reviews: by property', Review.objects.filter(property_id=1).order_by('-created_at', '-id')[:PAGE]),
+        ('search history: by user',
+         SearchHistory.objects.filter(user_id=1).order_by('-created_at', '-id')[:PAGE]),
+        ('property views: by user',
+         PropertyView.objects.filter(user_id=1).order_by('-viewed_at', '-id')[:PAGE]),
+    ]
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [{'detail': row[-1]} for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def find_scans(plan):
+    # -> [(severity, описание шага плана)]
+    problems = []
+    for step in plan:
+        if connection.vendor == 'sqlite':
+            detail = step['detail']
+            if detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail:
+                if 'USING' in detail:
+                    problems.append(('index scan', detail))
+                else:
+                    problems.append(('FULL SCAN', detail))
+            elif 'TEMP B-TREE' in detail:
+                problems.append(('filesort', detail))
+        else:
+            access = (step.get('type') or '').lower()
+            table = step.get('table')
+            if access == 'all':
+                problems.append(('FULL SCAN', f"{table} (type=ALL, rows={step.get('rows')})"))
+            elif access == 'index':
+                problems.append(('index scan', f"{table} (type=index, key={step.get('key')})"))
+            if 'filesort' in (step.get('Extra') or ''):
+                problems.append(('filesort', f'{table}: {step["Extra"]}'))
+    return problems
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN over the API's hot query shapes and flag full table scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error if any query does a full table scan')
+        parser.add_argument('--plans', action='store_true', help='Print the full plan for every query')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'mysql'):
+            raise CommandError(f'EXPLAIN parsing is not implemented for {connection.vendor}')
+
+        full_scans = 0
+        for name, queryset in query_shapes():
+            plan = explain(queryset)
+            problems = find_scans(plan)
+            full_scans += sum(1 for severity, _ in problems if severity == 'FULL SCAN')
+
+            if any(severity == 'FULL SCAN' for severity, _ in problems):
+                status = self.style.ERROR('FULL SCAN')
+            elif problems:
+                status = self.style.WARNING('warning')
+            else:
+                status = self.style.SUCCESS('ok')
+            self.stdout.write(f'{status:<20} {name}')
+            for severity, detail in problems:
+                self.stdout.write(f'    {severity}: {detail}')
+            if options['plans']:
+                for step in plan:
+                    self.stdout.write(f'    | {step}')
+
+        if full_scans and options['fail_on_scan']:
+            raise CommandError(f'{full_scans} full table scan(s) found')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rental.synthetic import SyntheticData
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with reproducible synthetic landlords, listings, bookings, reviews, views and searches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--landlords', type=int, default=10)
+        parser.add_argument('--tenants', type=int, default=100)
+        parser.add_argument('--properties', type=int, default=1000)
+        parser.add_argument('--bookings-per-property', type=int, default=5)
+        parser.add_argument('--reviews', type=int, default=2000)
+        parser.add_argument('--views', type=int, default=10000)
+        parser.add_argument('--searches', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        generator = SyntheticData(seed=options['seed'], batch_size=options['batch_size'])
+        with transaction.atomic():
+            counts = generator.generate(
+                landlords=options['landlords'],
+                tenants=options['tenants'],
+                properties=options['properties'],
+                bookings_per_property=options['bookings_per_property'],
+                reviews=options['reviews'],
+                views=options['views'],
+                searches=options['searches'],
+            )
+        summary = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Generated {summary}'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from rental.cache import bump_generation
+from rental.geo import locate
+from rental.models import Property
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill latitude, longitude and geohash of properties from their location using the local lookup table. '
+        'By default only properties without a geohash are processed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-geocode every property, replacing stored coordinates')
+        parser.add_argument('--keep-coordinates', action='store_true',
+                            help='With --all, keep explicit coordinates and only recompute the geohash')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        queryset = Property.objects.only('id', 'location', 'latitude', 'longitude', 'geohash').order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(geohash='')
+
+        located = missing = 0
+        last_pk = 0
+        while True:
+            # Keyset-порции по ключу: обновлённые строки выпадают из фильтра geohash=''
+            batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            for property in batch:
+                if options['all'] and not options['keep_coordinates']:
+                    property.latitude = property.longitude = None
+                if locate(property):
+                    located += 1
+                else:
+                    missing += 1
+            Property.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+            last_pk = batch[-1].pk
+
+        if located:
+            bump_generation('property')
+        self.stdout.write(self.style.SUCCESS(f'Located {located} properties, {missing} without known location'))
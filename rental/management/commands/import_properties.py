@@ -0,0 +1,43 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rental.imports import csv_rows, import_properties, ndjson_rows
+from rental.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Create or update a landlord\'s properties by external_ref from a JSON, NDJSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--landlord', required=True, help='Email of the owning landlord')
+        parser.add_argument('--format', choices=['json', 'ndjson', 'csv'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--max-rows', type=int, default=10 ** 9)
+
+    def handle(self, *args, **options):
+        try:
+            landlord = CustomUser.objects.get(email=options['landlord'], is_landlord=True)
+        except CustomUser.DoesNotExist:
+            raise CommandError(f'No landlord with email {options["landlord"]}')
+
+        fmt = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if fmt not in ('json', 'ndjson', 'csv'):
+            raise CommandError('Cannot guess the format, pass --format')
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as source:
+            if fmt == 'json':
+                rows = json.load(source)
+            elif fmt == 'ndjson':
+                rows = ndjson_rows(source)
+            else:
+                rows = csv_rows(source)
+            report = import_properties(landlord.pk, rows, options['batch_size'], options['max_rows'])
+
+        for error in report.errors:
+            self.stderr.write(f"row {error['row']} ({error['external_ref']}): {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.created} created, {report.updated} updated, {report.failed} failed'
+        ))
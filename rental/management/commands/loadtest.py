@@ -0,0 +1,125 @@
+import asyncio
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import AsyncClient, Client
+
+from rental.authentication import issue_tokens
+from rental.bench import scratch_database, summarize
+from rental.models import CustomUser, Property
+
+
+def run_threads(call, total, concurrency):
+    def timed(_):
+        started = time.perf_counter()
+        try:
+            ok = call()
+        finally:
+            close_old_connections()
+        return (time.perf_counter() - started) * 1000, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, range(total)))
+    return samples, time.perf_counter() - started
+
+
+async def run_coroutines(call, total, concurrency):
+    samples = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            ok = await call()
+            samples.append(((time.perf_counter() - started) * 1000, ok))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def http_get(url, token):
+    request = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            return response.status == 200
+    except urllib.error.URLError:
+        return False
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/sec and latency of the WSGI (DRF) and ASGI (async) read endpoints. '
+        'Without --wsgi-url/--asgi-url both stacks are driven in-process through the Django '
+        'test clients on a scratch database; point it at real gunicorn/uvicorn servers for '
+        'numbers that include the server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--properties', type=int, default=200, help='Listings to seed in in-process mode')
+        parser.add_argument('--wsgi-url', help='Base URL of a running WSGI server, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--asgi-url', help='Base URL of a running ASGI server, e.g. http://127.0.0.1:8001')
+        parser.add_argument('--token', help='Access token for external servers')
+        parser.add_argument('--wsgi-path', default='/api/properties/')
+        parser.add_argument('--asgi-path', default='/api/async/properties/')
+
+    def handle(self, *args, **options):
+        total, concurrency = options['requests'], options['concurrency']
+        wsgi_path, asgi_path = options['wsgi_path'], options['asgi_path']
+
+        if options['wsgi_url'] or options['asgi_url']:
+            if not (options['wsgi_url'] and options['asgi_url'] and options['token']):
+                raise CommandError('--wsgi-url, --asgi-url and --token must be used together')
+            token = options['token']
+            results = {
+                'wsgi': run_threads(lambda: http_get(options['wsgi_url'] + wsgi_path, token), total, concurrency),
+                'asgi': run_threads(lambda: http_get(options['asgi_url'] + asgi_path, token), total, concurrency),
+            }
+        else:
+            with scratch_database():
+                token = self.seed(options['properties'])
+                headers = {'Authorization': f'Bearer {token}'}
+
+                def wsgi_call():
+                    return Client(headers=headers).get(wsgi_path).status_code == 200
+
+                async_client = AsyncClient()
+
+                async def asgi_call():
+                    # Заголовки конструктора AsyncClient попадают в scope, а не в META
+                    return (await async_client.get(asgi_path, headers=headers)).status_code == 200
+
+                results = {
+                    'wsgi': run_threads(wsgi_call, total, concurrency),
+                    'asgi': asyncio.run(run_coroutines(asgi_call, total, concurrency)),
+                }
+
+        for label, (samples, elapsed) in results.items():
+            timings = [ms for ms, _ in samples]
+            errors = sum(1 for _, ok in samples if not ok)
+            summary = summarize(timings)
+            self.stdout.write(
+                f"{label}: {len(samples) / elapsed:8.1f} req/s  p50={summary['p50_ms']}ms "
+                f"p99={summary['p99_ms']}ms  errors={errors}"
+            )
+
+    def seed(self, count):
+        user = CustomUser.objects.create_user(
+            email='loadtest@example.com', username='loadtest', password='loadtest-password', is_landlord=True,
+        )
+        Property.objects.bulk_create([
+            Property(
+                title=f'Listing {i}', description='Load test listing', location='Kyiv',
+                price=100 + i % 400, num_rooms=1 + i % 5, property_type='apartment', user=user,
+            )
+            for i in range(count)
+        ])
+        return str(issue_tokens(user).access_token)
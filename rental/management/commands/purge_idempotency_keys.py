@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rental.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} idempotency keys older than {settings.IDEMPOTENCY_KEY_TTL} seconds'
+        ))
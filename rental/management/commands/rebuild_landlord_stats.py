@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from rental.landlord_stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the landlord daily statistics from bookings, reviews and property views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Landlord statistics rebuilt: {rows} property/day rows'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from rental.cache import bump_generation
+from rental.ratings import rebuild_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating_avg, rating_count and the rating histogram on every property'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = rebuild_aggregates(batch_size=options['batch_size'])
+        bump_generation('property')
+        self.stdout.write(self.style.SUCCESS(f'Rating aggregates rebuilt for {updated} reviewed properties'))
@@ -0,0 +1,189 @@
+import itertools
+import json
+import platform
+import subprocess
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from rental.authentication import issue_tokens
+from rental.bench import measure, peak_memory, scratch_database
+from rental.models import Booking, CustomUser, Property
+from rental.synthetic import PASSWORD, SyntheticData
+from rental.testing import NO_CACHE
+
+SCALES = {
+    'small': {'landlords': 5, 'tenants': 50, 'properties': 500, 'reviews': 1000, 'views': 5000, 'searches': 2000},
+    'medium': {'landlords': 20, 'tenants': 500, 'properties': 5000, 'reviews': 10000, 'views': 50000, 'searches': 20000},
+    'large': {'landlords': 100, 'tenants': 5000, 'properties': 50000, 'reviews': 100000, 'views': 500000, 'searches': 200000},
+}
+COMPARED = ('p50_ms', 'p99_ms', 'queries_per_call', 'peak_kib')
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic data in a scratch database and benchmark the real API routes through the test client. '
+        'Runs on SQLite with DB_ENGINE=sqlite. Results are written as JSON and can be compared across commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--scenario', action='append', help='Run only these scenarios (repeatable)')
+        parser.add_argument('--with-cache', action='store_true', help='Keep the response cache enabled')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--compare', help='Compare with an earlier JSON result file')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as previous:
+                    baseline = json.load(previous)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Cannot read {options["compare"]}: {exc}')
+
+        overrides = {'INGEST_BUFFERED': False, 'VIEW_COUNTER_BUFFERED': False}
+        if not options['with_cache']:
+            overrides['CACHES'] = NO_CACHE
+
+        with scratch_database(), override_settings(**overrides):
+            self.stdout.write(f"Generating '{options['scale']}' data set...")
+            counts = SyntheticData(seed=options['seed']).generate(**SCALES[options['scale']])
+            scenarios = self.scenarios()
+            selected = options['scenario'] or list(scenarios)
+            unknown = set(selected) - set(scenarios)
+            if unknown:
+                raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}. Available: {", ".join(scenarios)}')
+
+            results = {}
+            for name in selected:
+                func, iterations = scenarios[name]
+                iterations = iterations or options['iterations']
+                result = measure(func, iterations, warmup=options['warmup'])
+                result['peak_kib'] = peak_memory(func)
+                results[name] = result
+                self.stdout.write(
+                    f"{name:<24} p50={result['p50_ms']:>8}ms p99={result['p99_ms']:>8}ms "
+                    f"queries={result['queries_per_call']:<6} peak={result['peak_kib']}KiB"
+                )
+            vendor = connection.vendor
+
+        report = {
+            'meta': {
+                'revision': git_revision(),
+                'created_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': vendor,
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'response_cache': options['with_cache'],
+                'rows': counts,
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+        if baseline:
+            self.compare(baseline, report)
+
+    def scenarios(self):
+        landlord = CustomUser.objects.filter(is_landlord=True).order_by('pk').first()
+        tenant = CustomUser.objects.filter(is_landlord=False).order_by('pk').first()
+        landlord_client = Client(headers={'Authorization': f'Bearer {issue_tokens(landlord).access_token}'})
+        tenant_client = Client(headers={'Authorization': f'Bearer {issue_tokens(tenant).access_token}'})
+
+        today = timezone.localdate()
+        free_from, free_to = today + timedelta(days=400), today + timedelta(days=407)
+        property_pk = Property.objects.filter(user=landlord).order_by('pk').values_list('pk', flat=True).first()
+
+        # Каждая бронь - на новые даты далеко в будущем, чтобы проверка пересечений проходила
+        booking_dates = (today + timedelta(days=1000 + 3 * i) for i in itertools.count())
+
+        def create_booking():
+            start = next(booking_dates)
+            response = tenant_client.post('/api/bookings/', {
+                'property': property_pk, 'start_date': start, 'end_date': start + timedelta(days=2),
+            }, content_type='application/json')
+            assert response.status_code == 201, response.content
+
+        taken = Booking.objects.create(
+            property_id=property_pk, user=tenant, start_date=today + timedelta(days=900), end_date=today + timedelta(days=905),
+        )
+
+        def create_booking_conflict():
+            response = tenant_client.post('/api/bookings/', {
+                'property': property_pk, 'start_date': taken.start_date, 'end_date': taken.end_date,
+            }, content_type='application/json')
+            assert response.status_code == 400, response.content
+
+        stay = Booking.objects.filter(end_date__lt=today).exclude(status='cancelled').order_by('pk').first()
+        reviewer = Client(headers={'Authorization': f'Bearer {issue_tokens(stay.user).access_token}'})
+
+        def post_review():
+            response = reviewer.post(f'/api/properties/{stay.property_id}/reviews/', {
+                'property': stay.property_id, 'rating': 4, 'comment': 'Benchmark review',
+            }, content_type='application/json')
+            assert response.status_code == 201, response.content
+
+        def login():
+            response = Client().post('/api/login/', {'email': tenant.email, 'password': PASSWORD}, content_type='application/json')
+            assert response.status_code == 200, response.content
+
+        def get(client, url):
+            def call():
+                response = client.get(url)
+                assert response.status_code == 200, response.content
+            return call
+
+        # name -> (callable, iterations; None - значение --iterations)
+        return {
+            'property_list': (get(landlord_client, '/api/properties/'), None),
+            'property_list_filtered': (get(
+                landlord_client, '/api/properties/?property_type=apartment&price__gte=500&price__lte=2500&num_rooms__gte=2',
+            ), None),
+            'property_list_available': (get(
+                landlord_client, f'/api/properties/?available_from={free_from}&available_to={free_to}',
+            ), None),
+            'property_search': (get(landlord_client, '/api/properties/?search=cozy+balcony'), None),
+            'property_near': (get(landlord_client, '/api/properties/?near=49.8397,24.0297&radius_km=5'), None),
+            'property_detail': (get(landlord_client, f'/api/properties/{property_pk}/'), None),
+            'booking_list': (get(landlord_client, '/api/bookings/'), None),
+            'booking_create': (create_booking, None),
+            'booking_create_conflict': (create_booking_conflict, None),
+            'review_create': (post_review, None),
+            # Хэширование пароля намеренно дорогое, поэтому итераций меньше
+            'login': (login, 20),
+        }
+
+    def compare(self, baseline, report):
+        self.stdout.write(f"\nCompared with {baseline['meta'].get('revision')} ({baseline['meta'].get('created_at')}):")
+        for name, result in report['results'].items():
+            previous = baseline['results'].get(name)
+            if not previous:
+                continue
+            changes = []
+            for metric in COMPARED:
+                old, new = previous.get(metric), result.get(metric)
+                if old:
+                    changes.append(f'{metric} {old} -> {new} ({(new - old) / old:+.0%})')
+            self.stdout.write(f'{name:<24} ' + ', '.join(changes))
@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the SQLite primary database into the SQLite replica file(s) configured with DB_REPLICA_NAME. '
+        'Stands in for replication when trying primary/replica routing locally; '
+        'reads from the replica lag until the next sync.'
+    )
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        if primary['ENGINE'] != 'django.db.backends.sqlite3' or not settings.DATABASE_REPLICAS:
+            raise CommandError('Requires DB_ENGINE=sqlite and DB_REPLICA_NAME.')
+
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                connections[alias].close()
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    # Онлайн-копия через backup API: primary не блокируется на время копирования
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(self.style.SUCCESS(f'{alias} <- default ({settings.DATABASES[alias]["NAME"]})'))
+        finally:
+            source.close()
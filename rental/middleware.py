@@ -0,0 +1,161 @@
+# rental/middleware.py
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .routers import routing
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'\((?:%s|\?)(?:,\s*(?:%s|\?))*\)')
+
+
+def query_shape(sql):
+    # Запросы, отличающиеся только длиной списка IN (...), считаем одинаковыми
+    return _IN_LIST.sub('(...)', sql)
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, threshold):
+        # Один и тот же запрос много раз за запрос - почти всегда N+1
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class AsyncCapableMiddleware:
+    # Как MiddlewareMixin Django: под ASGI цепочка остаётся асинхронной и
+    # async-представления (rental/async_views.py) не переводятся в async_to_sync
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.handle(request)
+
+    async def __acall__(self, request):
+        return await self.ahandle(request)
+
+
+class QueryCountMiddleware(AsyncCapableMiddleware):
+    """Считает SQL-запросы и время в БД на каждый HTTP-запрос.
+
+    Результат отдаётся в заголовках X-Query-Count / X-Query-Time-Ms, а при
+    превышении QUERY_COUNT_WARN_THRESHOLD или повторе одного запроса
+    QUERY_COUNT_REPEAT_THRESHOLD раз пишется предупреждение в лог.
+    Запросы стримингового тела ответа сюда не попадают. Для async-представлений
+    считаются запросы потока sync_to_async запроса (async ORM), но не пула
+    gather_queries.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_COUNT_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @staticmethod
+    def wrap_connections(stack, stats):
+        # Соединения свои у каждого потока: оборачиваем соединения текущего
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+
+    def handle(self, request):
+        stats = QueryStats()
+        with ExitStack() as stack:
+            self.wrap_connections(stack, stats)
+            response = self.get_response(request)
+        return self.report(request, response, stats)
+
+    async def ahandle(self, request):
+        # Async ORM выполняет запросы в потоке sync_to_async этого запроса;
+        # обёртки ставятся и снимаются в нём же
+        stats = QueryStats()
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, stats)
+
+    def report(self, request, response, stats):
+        response['X-Query-Count'] = str(stats.count)
+        response['X-Query-Time-Ms'] = f'{stats.duration * 1000:.1f}'
+
+        repeated = stats.repeated(settings.QUERY_COUNT_REPEAT_THRESHOLD)
+        if repeated:
+            shape, count = repeated[0]
+            logger.warning(
+                "Possible N+1 on %s %s: query repeated %d times: %s",
+                request.method, request.path, count, shape,
+            )
+        elif stats.count > settings.QUERY_COUNT_WARN_THRESHOLD:
+            logger.warning(
+                "%s %s executed %d queries (%.1f ms)",
+                request.method, request.path, stats.count, stats.duration * 1000,
+            )
+        return response
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """Включает чтение с реплик для GET/HEAD/OPTIONS (rental/routers.py).
+
+    Изменяющие запросы целиком работают с primary. После записи клиент
+    получает cookie и DB_REPLICA_PIN_SECONDS секунд тоже читает с primary,
+    чтобы следующий запрос увидел свои изменения несмотря на отставание реплики.
+    """
+
+    pin_cookie = 'db_pin_primary'
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def use_replica(self, request):
+        return request.method in ('GET', 'HEAD', 'OPTIONS') and self.pin_cookie not in request.COOKIES
+
+    def handle(self, request):
+        with routing(self.use_replica(request)) as state:
+            response = self.get_response(request)
+        return self.pin(response, state)
+
+    async def ahandle(self, request):
+        # contextvar ставится в контексте, в котором выполняется async-представление;
+        # sync_to_async копирует контекст в поток, а RoutingState общий
+        with routing(self.use_replica(request)) as state:
+            response = await self.get_response(request)
+        return self.pin(response, state)
+
+    def pin(self, response, state):
+        if state.wrote and settings.DB_REPLICA_PIN_SECONDS:
+            response.set_cookie(
+                self.pin_cookie, '1', max_age=settings.DB_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0002_property_available'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:05
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE rental_property '
+            'ADD FULLTEXT INDEX rental_property_text_ft (title, description), '
+            'ADD FULLTEXT INDEX rental_property_location_ft (location)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE rental_property_fts USING fts5("
+            "title, description, location, tokenize='unicode61', prefix='2 3')"
+        )
+        schema_editor.execute(
+            'INSERT INTO rental_property_fts (rowid, title, description, location) '
+            'SELECT id, title, description, location FROM rental_property'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE rental_property '
+            'DROP INDEX rental_property_text_ft, DROP INDEX rental_property_location_ft'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS rental_property_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0003_property_views_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0007_event_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchKeywordDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyword', models.CharField(max_length=255)),
+                ('day', models.DateField()),
+                ('searches', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='searchkeyworddaily_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('keyword', 'day'), name='searchkeyworddaily_keyword_day_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PropertyViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='rental.property')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('property', 'day'), name='propertyviewdaily_property_day_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0008_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='external_ref',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='property',
+            constraint=models.UniqueConstraint(fields=('user', 'external_ref'), name='property_user_external_ref_uniq'),
+        ),
+    ]
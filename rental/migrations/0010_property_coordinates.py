@@ -0,0 +1,48 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:05
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def backfill_coordinates(apps, schema_editor):
+    from rental.geo import locate
+
+    Property = apps.get_model('rental', 'Property')
+    batch = []
+    for property in Property.objects.only('id', 'location', 'latitude', 'longitude', 'geohash').iterator(chunk_size=1000):
+        if locate(property):
+            batch.append(property)
+        if len(batch) >= 1000:
+            Property.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+            batch = []
+    Property.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0009_property_external_ref'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['geohash', 'latitude', 'longitude'], name='property_geohash_idx'),
+        ),
+        migrations.RunPython(backfill_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 19:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0010_property_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeywordAffinity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyword', models.CharField(max_length=255)),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rental.property')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['computed_at'], name='keywordaffinity_computed_idx')],
+                'constraints': [models.UniqueConstraint(fields=('keyword', 'property'), name='keywordaffinity_pair_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PropertyNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rental.property')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='rental.property')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['computed_at'], name='propertyneighbor_computed_idx')],
+                'constraints': [models.UniqueConstraint(fields=('property', 'neighbor'), name='propertyneighbor_pair_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-18 20:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_landlord_stats(apps, schema_editor):
+    # rebuild() читает поля брони из 0015_booking_stat_fields, статистика
+    # заполняется там
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0011_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LandlordDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.IntegerField(default=0)),
+                ('booking_requests', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('booked_nights', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('reviews', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('landlord', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rental.property')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['landlord', 'day'], name='landlorddailystat_landlord_idx')],
+                'constraints': [models.UniqueConstraint(fields=('property', 'day'), name='landlorddailystat_property_day_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_landlord_stats, migrations.RunPython.noop),
+    ]
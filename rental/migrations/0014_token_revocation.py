@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0013_booking_version_idempotency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenRevocation',
+            fields=[
+                ('user_id', models.PositiveBigIntegerField(primary_key=True, serialize=False)),
+                ('revoked_at', models.FloatField()),
+            ],
+        ),
+    ]
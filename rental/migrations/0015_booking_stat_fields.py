@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-18 21:20
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_night_price(apps, schema_editor):
+    Booking = apps.get_model('rental', 'Booking')
+    Property = apps.get_model('rental', 'Property')
+    Booking.objects.filter(night_price__isnull=True).update(
+        night_price=Subquery(Property.objects.filter(pk=OuterRef('property_id')).values('price')[:1])
+    )
+
+
+def rebuild_landlord_stats(apps, schema_editor):
+    # Пересчёт по новым правилам: отмены - по дню отмены, выручка - по цене брони
+    from rental.landlord_stats import rebuild
+
+    rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rental', '0014_token_revocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='cancelled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='night_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_night_price, migrations.RunPython.noop),
+        migrations.RunPython(rebuild_landlord_stats, migrations.RunPython.noop),
+    ]
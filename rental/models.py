@@ -2,6 +2,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, Group
 from django.contrib.auth import get_user_model
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 
 
@@ -25,6 +26,15 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.email
 
+    def check_password(self, raw_password):
+        # При входе Django пересохраняет хэш в новом формате (например, с другим
+        # числом итераций). Пароль тот же - токены не отзываются (rental/signals.py)
+        self._rehashing_password = True
+        try:
+            return super().check_password(raw_password)
+        finally:
+            self._rehashing_password = False
+
 class Property(models.Model):
     PROPERTY_TYPE_CHOICES = [
         ('apartment', 'Квартира'),
@@ -41,7 +51,40 @@ class Property(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     available = models.BooleanField(default=True)
+    # Денормализованный счётчик, обновляется пачками из rental.counters
+    views_count = models.PositiveIntegerField(default=0)
+    # Агрегаты отзывов, поддерживаются инкрементально из rental.ratings
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    # Ключ объекта во внешней системе арендодателя, по нему идёт массовый импорт (rental/imports.py)
+    external_ref = models.CharField(max_length=100, null=True, blank=True)
+    # Координаты: задаются явно или геокодируются по location (rental/geo.py)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # Geohash координат для поиска по кругу и прямоугольнику; пустой, если координат нет
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'external_ref'], name='property_user_external_ref_uniq'),
+        ]
+        indexes = [
+            # Фильтры PropertyFilter и курсорная пагинация по created_at
+            models.Index(fields=['property_type', 'price'], name='property_type_price_idx'),
+            models.Index(fields=['num_rooms', 'price'], name='property_rooms_price_idx'),
+            models.Index(fields=['price'], name='property_price_idx'),
+            models.Index(fields=['location'], name='property_location_idx'),
+            models.Index(fields=['created_at', 'id'], name='property_created_idx'),
+            models.Index(fields=['rating_avg', 'id'], name='property_rating_idx'),
+            # Диапазоны geohash, координаты проверяются прямо по индексу
+            models.Index(fields=['geohash', 'latitude', 'longitude'], name='property_geohash_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -59,6 +102,21 @@ class Booking(models.Model):
     end_date = models.DateField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Оптимистическая блокировка: растёт при каждом изменении через API (rental/availability.py)
+    version = models.PositiveIntegerField(default=1)
+    # Для статистики арендодателя (rental/signals.py): цена ночи на момент брони
+    # и время отмены. Пустые у строк из bulk_create - тогда цена объекта и created_at
+    night_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Проверка пересечения дат в BookingViewSet.perform_create
+            models.Index(fields=['property', 'start_date', 'end_date'], name='booking_property_dates_idx'),
+            # Проверка "жил ли пользователь" в ReviewViewSet.perform_create
+            models.Index(fields=['property', 'user', 'end_date'], name='booking_property_user_end_idx'),
+            models.Index(fields=['user', 'created_at'], name='booking_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.property.title} - {self.user.email} ({self.start_date} to {self.end_date})"
@@ -71,6 +129,11 @@ class Review(models.Model):
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['property', 'created_at'], name='review_property_created_idx'),
+        ]
+
     def __str__(self):
         return f"Review for {self.property.title} by {self.user.email}"
 
@@ -80,7 +143,13 @@ class Review(models.Model):
 class SearchHistory(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     keyword = models.CharField(max_length=255)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Время приёма события; пишется пачкой позже (rental/ingest.py)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='searchhistory_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} searched for {self.keyword}"
@@ -89,8 +158,151 @@ class SearchHistory(models.Model):
 class PropertyView(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     property = models.ForeignKey(Property, on_delete=models.CASCADE)
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    viewed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'viewed_at'], name='propertyview_user_viewed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} viewed {self.property.title}"
 
+
+
+# Дневные агрегаты, в которые сворачиваются старые PropertyView и SearchHistory (rental/retention.py)
+
+class PropertyViewDaily(models.Model):
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='daily_views')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'day'], name='propertyviewdaily_property_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} on {self.day}: {self.views} views"
+
+
+class SearchKeywordDaily(models.Model):
+    keyword = models.CharField(max_length=255)
+    day = models.DateField()
+    searches = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['keyword', 'day'], name='searchkeyworddaily_keyword_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='searchkeyworddaily_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"'{self.keyword}' on {self.day}: {self.searches} searches"
+
+
+# Предрасчитанные рекомендации (rental/recommendations.py, manage.py build_recommendations)
+
+class PropertyNeighbor(models.Model):
+    # Top-K похожих объектов по совместным просмотрам
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'neighbor'], name='propertyneighbor_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['computed_at'], name='propertyneighbor_computed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+
+class KeywordAffinity(models.Model):
+    # Top-K объектов, которые смотрят искавшие этот запрос
+    keyword = models.CharField(max_length=255)
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['keyword', 'property'], name='keywordaffinity_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['computed_at'], name='keywordaffinity_computed_idx'),
+        ]
+
+    def __str__(self):
+        return f"'{self.keyword}' -> {self.property_id} ({self.score:.3f})"
+
+
+# Дневная статистика арендодателя по объектам (rental/landlord_stats.py)
+
+class LandlordDailyStat(models.Model):
+    landlord = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    views = models.IntegerField(default=0)
+    # Брони, созданные и отменённые в этот день
+    booking_requests = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    # Занятость и выручка подтверждённых броней - по дням проживания
+    booked_nights = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    reviews = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'day'], name='landlorddailystat_property_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['landlord', 'day'], name='landlorddailystat_landlord_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} on {self.day}"
+
+
+# Сохранённые ответы на запросы с Idempotency-Key (rental/idempotency.py)
+
+class IdempotencyRecord(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    scope = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    # Отпечаток тела запроса: тот же ключ с другим телом - ошибка клиента
+    fingerprint = models.CharField(max_length=64)
+    # Пока status_code пуст, запрос с этим ключом выполняется
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='idempotencyrecord_key_uniq'),
+        ]
+        indexes = [
+            # Очистка устаревших ключей (manage.py purge_idempotency_keys)
+            models.Index(fields=['created_at'], name='idempotencyrecord_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.status_code or 'in progress'})"
+
+
+class TokenRevocation(models.Model):
+    # Метка отзыва JWT (rental/authentication.py). Без внешнего ключа: метка
+    # удалённого пользователя должна пережить удаление строки CustomUser
+    user_id = models.PositiveBigIntegerField(primary_key=True)
+    # Секунды эпохи с дробной частью, как time.time()
+    revoked_at = models.FloatField()
+
+    def __str__(self):
+        return f'{self.user_id} revoked at {self.revoked_at}'
@@ -0,0 +1,26 @@
+# rental/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    # Keyset-пагинация: новые записи не сдвигают уже выданные страницы.
+    # id добавлен для однозначного порядка при совпадающем created_at.
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ViewedAtCursorPagination(CreatedAtCursorPagination):
+    ordering = ('-viewed_at', '-id')
+
+
+class PropertyCursorPagination(CreatedAtCursorPagination):
+    # Результаты ?search= без явного ?ordering= идут по релевантности
+    def get_ordering(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get('ordering'):
+            return ('search_rank',)
+        # ?near= без явного ?ordering= - сначала ближайшие
+        if 'distance_km' in queryset.query.annotations and not request.query_params.get('ordering'):
+            return ('distance_km', 'id')
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,152 @@
+# rental/price_stats.py
+# Распределение цен для ?price__gte/lte: снимок (price, num_rooms, property_type,
+# location) в массивах NumPy в памяти процесса. Запрос - векторная маска и
+# np.quantile/np.histogram по отобранным ценам, без агрегатов SQL по Property.
+# Снимок перестраивается не чаще раза в PRICE_STATS_MAX_AGE секунд.
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Property
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+PROPERTY_TYPES = [value for value, label in Property.PROPERTY_TYPE_CHOICES]
+
+
+class PriceSnapshot:
+    # Неизменяемый снимок: обновление собирает новый и подменяет ссылку
+    def __init__(self, rows):
+        prices, rooms, types, locations = zip(*rows) if rows else ((), (), (), ())
+        self.price = np.array(prices, dtype=np.float64)
+        self.num_rooms = np.array(rooms, dtype=np.int32)
+        type_codes = {value: code for code, value in enumerate(PROPERTY_TYPES)}
+        self.property_type = np.array([type_codes.get(value, -1) for value in types], dtype=np.int8)
+        # Словарь локаций отсортирован, location - номер в нём
+        self.locations, location_codes = np.unique(np.array(locations, dtype=object), return_inverse=True)
+        self.location = location_codes.astype(np.int32)
+        self.location_index = {value: code for code, value in enumerate(self.locations.tolist())}
+        self.built_at = timezone.now()
+
+    @classmethod
+    def load(cls):
+        rows = list(
+            Property.objects.values_list('price', 'num_rooms', 'property_type', 'location').iterator(chunk_size=5000)
+        )
+        return cls(rows)
+
+    def mask(self, location=None, property_type=None, num_rooms_gte=None, num_rooms_lte=None,
+             price_gte=None, price_lte=None):
+        selected = np.ones(len(self.price), dtype=bool)
+        if location is not None:
+            code = self.location_index.get(location)
+            if code is None:
+                return np.zeros(len(self.price), dtype=bool)
+            selected &= self.location == code
+        if property_type is not None:
+            selected &= self.property_type == PROPERTY_TYPES.index(property_type)
+        if num_rooms_gte is not None:
+            selected &= self.num_rooms >= num_rooms_gte
+        if num_rooms_lte is not None:
+            selected &= self.num_rooms <= num_rooms_lte
+        if price_gte is not None:
+            selected &= self.price >= price_gte
+        if price_lte is not None:
+            selected &= self.price <= price_lte
+        return selected
+
+    def stats(self, bins, **filters):
+        prices = self.price[self.mask(**filters)]
+        result = {'count': int(prices.size), 'snapshot_at': self.built_at}
+        if not prices.size:
+            return {**result, 'min': None, 'max': None, 'mean': None, 'quantiles': {}, 'histogram': []}
+
+        low, high = float(prices.min()), float(prices.max())
+        if low == high:
+            # np.histogram расширил бы вырожденный диапазон на ±0.5
+            histogram = [{'min': low, 'max': high, 'count': int(prices.size)}]
+        else:
+            counts, edges = np.histogram(prices, bins=bins, range=(low, high))
+            edges = np.round(edges, 2).tolist()
+            histogram = [
+                {'min': edges[i], 'max': edges[i + 1], 'count': count}
+                for i, count in enumerate(counts.tolist())
+            ]
+        quantiles = np.round(np.quantile(prices, QUANTILES), 2).tolist()
+        return {
+            **result,
+            'min': low,
+            'max': high,
+            'mean': round(float(prices.mean()), 2),
+            'quantiles': {f'p{round(q * 100)}': value for q, value in zip(QUANTILES, quantiles)},
+            'histogram': histogram,
+        }
+
+
+class PriceStats:
+    """Снимок цен процесса с ленивым обновлением.
+
+    Устаревший снимок перестраивает один поток; остальные в это время
+    отвечают по прежнему снимку. Изменения объектов видны после перестроения.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = None
+
+    def snapshot(self):
+        max_age = settings.PRICE_STATS_MAX_AGE
+        stale = self._loaded_at is None or time.monotonic() - self._loaded_at > max_age
+        if stale and self._lock.acquire(blocking=self._snapshot is None):
+            try:
+                # Пока ждали блокировку, снимок мог собрать другой поток
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > max_age:
+                    self.refresh()
+            finally:
+                self._lock.release()
+        return self._snapshot
+
+    def refresh(self):
+        snapshot = PriceSnapshot.load()
+        self._snapshot, self._loaded_at = snapshot, time.monotonic()
+        return snapshot
+
+    def reset(self):
+        self._snapshot = self._loaded_at = None
+
+
+price_stats = PriceStats()
+
+
+def _number(params, name, cast):
+    if name not in params:
+        return None
+    try:
+        return cast(params[name])
+    except ValueError:
+        raise serializers.ValidationError({name: ['A valid number is required.']})
+
+
+def parse_filters(params):
+    # Те же имена, что у фильтров списка объектов (PropertyFilter)
+    property_type = params.get('property_type') or None
+    if property_type is not None and property_type not in PROPERTY_TYPES:
+        raise serializers.ValidationError({'property_type': [f'Unknown property type "{property_type}".']})
+    try:
+        bins = int(params.get('bins', settings.PRICE_STATS_BINS))
+    except ValueError:
+        raise serializers.ValidationError({'bins': ['A valid integer is required.']})
+    if not 1 <= bins <= settings.PRICE_STATS_MAX_BINS:
+        raise serializers.ValidationError({'bins': [f'Must be between 1 and {settings.PRICE_STATS_MAX_BINS}.']})
+    return bins, {
+        'location': params.get('location') or None,
+        'property_type': property_type,
+        'num_rooms_gte': _number(params, 'num_rooms__gte', int),
+        'num_rooms_lte': _number(params, 'num_rooms__lte', int),
+        'price_gte': _number(params, 'price__gte', float),
+        'price_lte': _number(params, 'price__lte', float),
+    }
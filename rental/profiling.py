@@ -0,0 +1,237 @@
+# rental/profiling.py
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .middleware import AsyncCapableMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Фаза определяется по самому глубокому кадру стека, попавшему под правило:
+# ORM внутри сериализатора считается ORM, JSON внутри рендерера - рендерингом
+PHASE_RULES = (
+    ('orm', ('/django/db/',), ()),
+    ('auth', (
+        '/rest_framework_simplejwt/', '/rest_framework/authentication.py', '/rental/authentication.py',
+        '/rental/hashers.py', '/django/contrib/auth/hashers.py',
+    ), ('perform_authentication',)),
+    ('permissions', ('/rest_framework/permissions.py',), (
+        'check_permissions', 'check_object_permissions', 'has_permission', 'has_object_permission',
+    )),
+    ('filters', (
+        '/django_filters/', '/rest_framework/filters.py', '/rest_framework/pagination.py',
+        '/rental/filters.py', '/rental/search.py', '/rental/pagination.py',
+    ), ('filter_queryset', 'paginate_queryset')),
+    ('serialization', (
+        '/rest_framework/serializers.py', '/rest_framework/fields.py', '/rest_framework/relations.py',
+        '/rental/serializers.py',
+    ), ()),
+    ('rendering', ('/rest_framework/renderers.py', '/json/'), ('finalize_response',)),
+)
+OTHER = 'view'
+# Простой потока: event loop ждёт событий, поток sync_to_async - задачи
+IDLE_FRAMES = (('selectors.py', 'select'), ('threading.py', 'wait'), ('concurrent/futures/thread.py', '_worker'))
+
+
+def classify(filename, function):
+    filename = filename.replace('\\', '/')
+    for phase, paths, functions in PHASE_RULES:
+        if function in functions or any(path in filename for path in paths):
+            return phase
+    return None
+
+
+def frame_label(code):
+    filename = code.co_filename.replace('\\', '/')
+    for marker in ('/site-packages/', '/lib/python'):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        relative = os.path.relpath(code.co_filename, settings.BASE_DIR).replace('\\', '/')
+        filename = os.path.basename(filename) if relative.startswith('..') else relative
+    return f'{filename}:{code.co_name}'
+
+
+def is_idle(code):
+    filename = code.co_filename.replace('\\', '/')
+    return any(filename.endswith('/' + name) and code.co_name == function for name, function in IDLE_FRAMES)
+
+
+class StackSampler:
+    """Сэмплирующий профилировщик потоков запроса.
+
+    Отдельный поток раз в PROFILING_INTERVAL секунд снимает стеки потоков
+    запроса через ``sys._current_frames()`` и копит свёрнутые стеки
+    (collapsed stacks, формат flamegraph.pl / speedscope) и счётчики фаз.
+    С skip_idle сэмплы простаивающих потоков пропускаются.
+    """
+
+    def __init__(self, thread_ids, interval, skip_idle=False):
+        self.thread_ids = tuple(thread_ids)
+        self.interval = interval
+        self.skip_idle = skip_idle
+        self.stacks = Counter()
+        self.phases = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.thread_ids:
+                self.sample(frames.get(thread_id))
+
+    def sample(self, frame):
+        if frame is None or (self.skip_idle and is_idle(frame.f_code)):
+            return
+        labels = []
+        phase = None
+        while frame is not None:
+            code = frame.f_code
+            if phase is None:
+                phase = classify(code.co_filename, code.co_name)
+            labels.append(frame_label(code))
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(labels))] += 1
+        self.phases[phase or OTHER] += 1
+
+    def phase_durations(self, total_ms):
+        # Сэмплы распределяются по фазам пропорционально времени запроса
+        samples = sum(self.phases.values())
+        if not samples:
+            return {OTHER: total_ms}
+        return {phase: total_ms * count / samples for phase, count in self.phases.items()}
+
+
+def cprofile_phases(profile):
+    phases = Counter()
+    for (filename, _, function), (_, _, own_time, _, _) in pstats.Stats(profile).stats.items():
+        phases[classify(filename, function) or OTHER] += own_time * 1000
+    return phases
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """Профилирование отдельных запросов по заголовку или с заданной вероятностью.
+
+    При PROFILING_ENABLED=False Django исключает middleware из цепочки
+    (MiddlewareNotUsed), так что выключенный профилировщик ничего не стоит.
+    Трассы пишутся в PROFILING_DIR, разбивка по фазам - в Server-Timing.
+    Под ASGI сэмплируются поток event loop и поток sync_to_async запроса;
+    в стеки event loop могут попасть корутины параллельных запросов.
+    """
+
+    # cProfile не может работать в нескольких потоках одновременно
+    _cprofile_lock = threading.Lock()
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def should_profile(self, request):
+        if request.headers.get(settings.PROFILING_HEADER):
+            return True
+        return settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+    def handle(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        started = time.perf_counter()
+        if settings.PROFILING_MODE == 'cprofile':
+            with self.cprofiling() as profile:
+                response = self.get_response(request)
+            return self.finish_cprofile(request, response, profile, started)
+        with self.sampling([threading.get_ident()]) as sampler:
+            response = self.get_response(request)
+        return self.finish_sampling(request, response, sampler, started)
+
+    async def ahandle(self, request):
+        if not self.should_profile(request):
+            return await self.get_response(request)
+        started = time.perf_counter()
+        if settings.PROFILING_MODE == 'cprofile':
+            with self.cprofiling() as profile:
+                response = await self.get_response(request)
+            return self.finish_cprofile(request, response, profile, started)
+        # Синхронный код запроса (DRF, ORM) выполняется в потоке sync_to_async
+        worker = await sync_to_async(threading.get_ident)()
+        with self.sampling([threading.get_ident(), worker], skip_idle=True) as sampler:
+            response = await self.get_response(request)
+        return self.finish_sampling(request, response, sampler, started)
+
+    @contextmanager
+    def sampling(self, thread_ids, skip_idle=False):
+        sampler = StackSampler(thread_ids, settings.PROFILING_INTERVAL, skip_idle)
+        sampler.start()
+        try:
+            yield sampler
+        finally:
+            sampler.stop()
+
+    def finish_sampling(self, request, response, sampler, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        name = self.trace_name(request, total_ms)
+        # Запрос быстрее интервала выборки даёт пустой файл, а не пустую строку
+        self.write(f'{name}.collapsed', ''.join(f'{stack} {count}\n' for stack, count in sampler.stacks.most_common()))
+        return self.annotate(response, name, total_ms, sampler.phase_durations(total_ms))
+
+    @contextmanager
+    def cprofiling(self):
+        # Профиль уже снимается другим запросом - этот идёт без профилирования
+        if not self._cprofile_lock.acquire(blocking=False):
+            yield None
+            return
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield profile
+            finally:
+                profile.disable()
+        finally:
+            self._cprofile_lock.release()
+
+    def finish_cprofile(self, request, response, profile, started):
+        if profile is None:
+            return response
+        total_ms = (time.perf_counter() - started) * 1000
+        name = self.trace_name(request, total_ms)
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        profile.dump_stats(os.path.join(settings.PROFILING_DIR, f'{name}.prof'))
+        return self.annotate(response, name, total_ms, cprofile_phases(profile))
+
+    def trace_name(self, request, total_ms):
+        path = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+        return f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{path}-{total_ms:.0f}ms-{os.getpid()}'
+
+    def write(self, filename, content):
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        with open(os.path.join(settings.PROFILING_DIR, filename), 'w', encoding='utf-8') as trace:
+            trace.write(content)
+
+    def annotate(self, response, name, total_ms, phases):
+        timings = [f'{phase};dur={duration:.1f}' for phase, duration in sorted(phases.items(), key=lambda item: -item[1])]
+        response['Server-Timing'] = ', '.join(timings + [f'total;dur={total_ms:.1f}'])
+        response['X-Profile-Id'] = name
+        logger.info("Profiled %s %s in %.1f ms: %s", response.status_code, name, total_ms, ', '.join(timings))
+        return response
@@ -0,0 +1,75 @@
+# rental/ratings.py
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, Exists, F, FloatField, OuterRef, Q, Sum, Value, When
+from django.db.models.functions import Cast, Round
+
+from .models import Property, Review
+
+RATINGS = range(1, 6)
+HISTOGRAM_FIELDS = tuple(f'rating_{rating}' for rating in RATINGS)
+
+RATING_AVG = Case(
+    When(rating_count=0, then=Value(0)),
+    default=Round(Cast('rating_sum', FloatField()) / F('rating_count'), 2),
+    output_field=DecimalField(max_digits=3, decimal_places=2),
+)
+
+
+def apply_rating(property_id, rating, sign=1):
+    # sign=1 - отзыв добавлен, sign=-1 - удалён; обновление атомарное через F()
+    if rating not in RATINGS:
+        return
+    properties = Property.objects.filter(pk=property_id)
+    with transaction.atomic():
+        properties.update(
+            rating_count=F('rating_count') + sign,
+            rating_sum=F('rating_sum') + sign * rating,
+            **{f'rating_{rating}': F(f'rating_{rating}') + sign},
+        )
+        # Среднее отдельным UPDATE: MySQL вычисляет присваивания слева направо
+        # по уже обновлённым значениям, остальные СУБД - по старым
+        properties.update(rating_avg=RATING_AVG)
+
+
+def histogram(property):
+    return {str(rating): getattr(property, f'rating_{rating}') for rating in RATINGS}
+
+
+def rebuild_aggregates(property_model=Property, review_model=Review, batch_size=1000):
+    # Пересчёт с нуля одним GROUP BY; модели передаются параметрами, чтобы
+    # функцию можно было вызвать из миграции с историческими моделями
+    stats = (
+        review_model.objects.filter(rating__in=RATINGS)
+        .values('property_id')
+        .annotate(
+            count=Count('id'),
+            total=Sum('rating'),
+            **{field: Count('id', filter=Q(rating=rating)) for rating, field in zip(RATINGS, HISTOGRAM_FIELDS)},
+        )
+        .order_by('property_id')
+    )
+    fields = ['rating_count', 'rating_sum', *HISTOGRAM_FIELDS]
+
+    updated = 0
+    batch = []
+    for row in stats.iterator(chunk_size=batch_size):
+        batch.append(property_model(
+            pk=row['property_id'],
+            rating_count=row['count'],
+            rating_sum=row['total'],
+            **{field: row[field] for field in HISTOGRAM_FIELDS},
+        ))
+        if len(batch) >= batch_size:
+            property_model.objects.bulk_update(batch, fields)
+            updated += len(batch)
+            batch = []
+    if batch:
+        property_model.objects.bulk_update(batch, fields)
+        updated += len(batch)
+
+    has_reviews = review_model.objects.filter(property=OuterRef('pk'), rating__in=RATINGS)
+    property_model.objects.filter(~Exists(has_reviews)).exclude(rating_count=0).update(
+        rating_count=0, rating_sum=0, **{field: 0 for field in HISTOGRAM_FIELDS},
+    )
+    property_model.objects.update(rating_avg=RATING_AVG)
+    return updated
@@ -0,0 +1,268 @@
+# rental/recommendations.py
+# Рекомендации объектов по просмотрам и поисковым запросам.
+# Офлайн-задача (manage.py build_recommendations) строит разреженные матрицы
+# пользователь x объект и запрос x пользователь, считает косинусную близость
+# объектов по совместным просмотрам и связь запрос -> объект, и сохраняет
+# top-K в PropertyNeighbor/KeywordAffinity. В запросе - только выборка по
+# индексу для недавних просмотров и запросов пользователя и слияние весов.
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CharField, F, IntegerField, Max, Value, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from scipy import sparse
+
+from .models import KeywordAffinity, Property, PropertyNeighbor, PropertyView, SearchHistory
+from .retention import normalize_keyword
+
+# Вес i-го по свежести просмотра или запроса: RECENCY_DECAY ** i
+RECENCY_DECAY = 0.85
+# События пишутся пачками с опозданием (rental/ingest.py), поэтому
+# инкрементальный пересчёт захватывает и немного времени до прошлого
+INCREMENTAL_OVERLAP = timedelta(minutes=5)
+
+
+def _index(values, keys):
+    # Позиции значений в отсортированном массиве ключей
+    return np.searchsorted(keys, np.asarray(values))
+
+
+def _known(values, keys):
+    # Позиции только тех значений, что есть среди ключей
+    values = np.fromiter(values, dtype=np.int64)
+    return np.unique(_index(values[np.isin(values, keys)], keys))
+
+
+def binary_matrix(rows, cols, shape):
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape)
+    # Повторы пары суммируются при сборке; нам важен только факт
+    matrix.data[:] = 1
+    return matrix
+
+
+def scale(matrix, row_counts, col_counts, min_support):
+    # Совместные счётчики -> косинусная близость; редкие пары отбрасываются
+    matrix = matrix.tocsr().astype(np.float32)
+    matrix.data[matrix.data < min_support] = 0
+    matrix.eliminate_zeros()
+    rows = sparse.diags(1 / np.sqrt(np.maximum(row_counts, 1)))
+    cols = sparse.diags(1 / np.sqrt(np.maximum(col_counts, 1)))
+    return (rows @ matrix @ cols).tocsr()
+
+
+def top_k(matrix, row_indices, k):
+    # (строка, [(столбец, вес)...]) для заданных строк CSR-матрицы
+    for row in row_indices:
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        cols = matrix.indices[start:end]
+        scores = matrix.data[start:end]
+        if end - start > k:
+            best = np.argpartition(-scores, k)[:k]
+            cols, scores = cols[best], scores[best]
+        yield row, sorted(zip(cols.tolist(), scores.tolist()), key=lambda pair: -pair[1])
+
+
+class RecommendationBuilder:
+    """Пересчёт таблиц рекомендаций по событиям за последние window_days.
+
+    С ``since`` пересчитываются только объекты, просмотренные после since,
+    объекты, у которых они уже в соседях, и запросы, искавшиеся после since;
+    матрицы при этом всё равно строятся по всему окну. Новые пары у прочих
+    объектов появятся при следующем полном пересчёте.
+    """
+
+    def __init__(self, window_days=None, top_k=None, min_support=None, batch_size=500):
+        self.window_days = window_days or settings.RECOMMEND_WINDOW_DAYS
+        self.top_k = top_k or settings.RECOMMEND_TOP_K
+        self.min_support = min_support or settings.RECOMMEND_MIN_SUPPORT
+        self.batch_size = batch_size
+
+    def last_build(self):
+        last = PropertyNeighbor.objects.aggregate(last=Max('computed_at'))['last']
+        return last - INCREMENTAL_OVERLAP if last else None
+
+    def build(self, since=None):
+        started = timezone.now()
+        window_start = started - timedelta(days=self.window_days)
+        views = list(
+            PropertyView.objects.filter(viewed_at__gte=window_start)
+            .values_list('user_id', 'property_id').distinct().iterator(chunk_size=5000)
+        )
+        searches = {
+            (user_id, normalize_keyword(keyword))
+            for user_id, keyword in SearchHistory.objects.filter(created_at__gte=window_start)
+            .values_list('user_id', 'keyword').iterator(chunk_size=5000)
+        }
+        stats = {'views': len(views), 'searches': len(searches), 'neighbors': 0, 'affinities': 0}
+        if not views:
+            return stats
+
+        view_users, view_items = (np.array(column, dtype=np.int64) for column in zip(*views))
+        users = np.unique(np.concatenate([view_users, np.array([user for user, _ in searches], dtype=np.int64)]))
+        items = np.unique(view_items)
+        viewed = binary_matrix(_index(view_users, users), _index(view_items, items), (len(users), len(items)))
+        item_counts = np.asarray(viewed.sum(axis=0)).ravel()
+
+        # Близость объектов: X^T X без диагонали, нормированная на число зрителей
+        coviews = (viewed.T @ viewed).tocsr()
+        coviews.setdiag(0)
+        similarity = scale(coviews, item_counts, item_counts, self.min_support)
+
+        rows = range(len(items))
+        if since:
+            touched = _known(
+                PropertyView.objects.filter(viewed_at__gte=since).values_list('property_id', flat=True).distinct(), items,
+            )
+            # Объекты, у которых затронутые уже в соседях: оценка пары изменилась
+            dependent = _known(
+                PropertyNeighbor.objects.filter(neighbor_id__in=items[touched].tolist())
+                .values_list('property_id', flat=True).distinct(), items,
+            )
+            rows = np.union1d(touched, dependent).tolist()
+        stats['neighbors'] = self._store(
+            PropertyNeighbor, 'property_id', 'neighbor_id', top_k(similarity, rows, self.top_k), items, items, started,
+            full=since is None,
+        )
+
+        if searches:
+            keywords = np.array(sorted({keyword for _, keyword in searches}), dtype=object)
+            search_users, search_keywords = zip(*searches)
+            searched = binary_matrix(
+                _index(search_keywords, keywords), _index(search_users, users), (len(keywords), len(users)),
+            )
+            keyword_counts = np.asarray(searched.sum(axis=1)).ravel()
+            affinity = scale(searched @ viewed, keyword_counts, item_counts, self.min_support)
+            rows = range(len(keywords))
+            if since:
+                recent = {
+                    normalize_keyword(keyword)
+                    for keyword in SearchHistory.objects.filter(created_at__gte=since).values_list('keyword', flat=True)
+                }
+                rows = [row for row, keyword in enumerate(keywords) if keyword in recent]
+            stats['affinities'] = self._store(
+                KeywordAffinity, 'keyword', 'property_id', top_k(affinity, rows, self.top_k), keywords, items, started,
+                full=since is None,
+            )
+        return stats
+
+    def _store(self, model, key_field, target_field, ranked, keys, targets, started, full):
+        # Строки ключа заменяются целиком: удаление и вставка в одной транзакции на пачку
+        written = 0
+        batch_keys, batch_rows = [], []
+
+        def flush():
+            with transaction.atomic():
+                model.objects.filter(**{f'{key_field}__in': batch_keys}).delete()
+                model.objects.bulk_create(batch_rows, batch_size=1000)
+
+        for row, pairs in ranked:
+            key = keys[row].item() if hasattr(keys[row], 'item') else keys[row]
+            batch_keys.append(key)
+            batch_rows.extend(
+                model(**{key_field: key, target_field: targets[col].item(), 'score': score, 'computed_at': started})
+                for col, score in pairs
+            )
+            written += len(pairs)
+            if len(batch_keys) >= self.batch_size:
+                flush()
+                batch_keys, batch_rows = [], []
+        if batch_keys:
+            flush()
+        if full:
+            # Ключи, выпавшие из окна, при полном пересчёте удаляются
+            model.objects.filter(computed_at__lt=started).delete()
+        return written
+
+
+def _distinct(values, size):
+    # Первые size различных значений в исходном порядке
+    seen = []
+    for value in values:
+        if value not in seen:
+            seen.append(value)
+            if len(seen) == size:
+                break
+    return seen
+
+
+def _latest(queryset, order_field, size, *columns):
+    # Последние size строк запроса; ROW_NUMBER вместо LIMIT, чтобы части
+    # UNION ALL работали и в SQLite. Все колонки - выражения: порядок колонок
+    # в частях UNION совпадает
+    return (
+        queryset.annotate(recency=Window(RowNumber(), order_by=F(order_field).desc()))
+        .filter(recency__lte=size).values_list(*columns)
+    )
+
+
+def _seeds(user_id, size):
+    # Недавние просмотры и запросы пользователя одним запросом, самые свежие первыми
+    views = _latest(
+        PropertyView.objects.filter(user_id=user_id), 'viewed_at', size * 3,
+        F('property_id'), Value('', output_field=CharField()), F('viewed_at'),
+    )
+    searches = _latest(
+        SearchHistory.objects.filter(user_id=user_id), 'created_at', size * 3,
+        Value(None, output_field=IntegerField()), F('keyword'), F('created_at'),
+    )
+    rows = sorted(views.union(searches, all=True), key=lambda row: row[2], reverse=True)
+    viewed = _distinct((property_id for property_id, _, _ in rows if property_id is not None), size)
+    keywords = _distinct(
+        (normalize_keyword(keyword) for property_id, keyword, _ in rows if property_id is None), size,
+    )
+    return viewed, keywords
+
+
+def _scores(viewed, keywords):
+    # Соседи просмотренных и связи запросов одним запросом, слияние весов в Python
+    parts = []
+    if viewed:
+        parts.append(
+            PropertyNeighbor.objects.filter(property_id__in=viewed)
+            .values_list(F('neighbor_id'), F('score'), F('property_id'), Value('', output_field=CharField()))
+        )
+    if keywords:
+        parts.append(
+            KeywordAffinity.objects.filter(keyword__in=keywords)
+            .values_list(F('property_id'), F('score'), Value(None, output_field=IntegerField()), F('keyword'))
+        )
+    scores = defaultdict(float)
+    if not parts:
+        return scores
+    view_weights = {property_id: RECENCY_DECAY ** i for i, property_id in enumerate(viewed)}
+    keyword_weights = {keyword: RECENCY_DECAY ** i for i, keyword in enumerate(keywords)}
+    for property_id, score, source_id, keyword in parts[0].union(*parts[1:], all=True):
+        weight = view_weights[source_id] if source_id is not None else keyword_weights[keyword]
+        scores[property_id] += score * weight
+    return scores
+
+
+def recommend(user_id, limit):
+    """Объекты для пользователя по убыванию оценки и источник ('personal'/'popular').
+
+    Оценка - сумма близостей к недавно просмотренным объектам и связей с
+    недавними запросами, каждая с весом по свежести. Если персональных
+    кандидатов не хватает, список добирается популярными объектами.
+    Запросы: затравка, веса, кандидаты и, если их не хватило, популярные.
+    """
+    viewed, keywords = _seeds(user_id, settings.RECOMMEND_SEED_SIZE)
+    scores = _scores(viewed, keywords)
+    for property_id in viewed:
+        scores.pop(property_id, None)
+
+    # Часть кандидатов может оказаться неактивной или своей, поэтому берём с запасом
+    candidates = sorted(scores, key=scores.get, reverse=True)[:limit * 2]
+    available = Property.objects.filter(is_active=True).exclude(user_id=user_id)
+    found = available.in_bulk(candidates) if candidates else {}
+    properties = [found[pk] for pk in candidates if pk in found][:limit]
+    source = 'personal' if properties else 'popular'
+    if len(properties) < limit:
+        properties += list(
+            available.exclude(pk__in=[property.pk for property in properties] + viewed)
+            .order_by('-views_count', '-id')[:limit - len(properties)]
+        )
+    return properties, source
@@ -0,0 +1,53 @@
+# rental/renderers.py
+# JSONRenderer, который пишет компактный JSON через orjson, если он установлен.
+# Байты ответа те же, что у JSONRenderer: orjson иначе пишет только числа с
+# экспонентой и дроби меньше 1e-4, такие ответы (и всё, что orjson не умеет)
+# рендерятся обычным json.dumps. Без orjson - обычный JSONRenderer.
+# Отличие одно: NaN и бесконечность JSONRenderer отказывается писать, а orjson
+# пишет null; в наших ответах таких значений нет.
+import re
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Следы чисел, которые json.dumps записал бы иначе: 1e16 вместо 1e+16,
+# 0.00001 вместо 1e-05. Совпадение внутри строки лишь отправляет ответ
+# обычным путём. Шаблоны начинаются с литерала, чтобы поиск по мегабайтам
+# ответа не проверял каждую позицию.
+EXPONENT = re.compile(rb'e(?<=[0-9]e)')
+SMALL_FRACTION = re.compile(rb'0\.0000(?<![0-9]0\.0000)')
+
+
+def float_mismatch(rendered):
+    return EXPONENT.search(rendered) is not None or (
+        b'0.0000' in rendered and SMALL_FRACTION.search(rendered) is not None
+    )
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.encoder_class is not encoders.JSONEncoder:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Даты и dataclass - через default, как у JSONEncoder DRF
+            rendered = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except TypeError:
+            # Ключи не-строки, int больше 64 бит и прочее, что orjson не пишет
+            return super().render(data, accepted_media_type, renderer_context)
+        if float_mismatch(rendered):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как JSONRenderer: U+2028/U+2029 экранируются для встраивания в JavaScript
+        return rendered.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,143 @@
+# rental/retention.py
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, time as dt_time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import PropertyView, PropertyViewDaily, SearchHistory, SearchKeywordDaily
+
+
+def normalize_keyword(keyword):
+    return ' '.join(keyword.lower().split())[:255]
+
+
+class Rollup:
+    """Сворачивание сырых событий старше срока хранения в дневные агрегаты.
+
+    Строки обрабатываются пачками по первичному ключу: старые события лежат в
+    начале таблицы, поэтому выборка пачки дешёвая. Добавление к агрегатам и
+    удаление пачки идут в одной короткой транзакции, так что событие не может
+    быть посчитано дважды или потеряно, а блокировки держатся недолго.
+    """
+
+    def __init__(self, source, timestamp_field, source_key, target, target_key, count_field, normalize=None):
+        self.source = source
+        self.timestamp_field = timestamp_field
+        self.source_key = source_key
+        self.target = target
+        self.target_key = target_key
+        self.count_field = count_field
+        self.normalize = normalize or (lambda key: key)
+
+    def expired(self, cutoff):
+        return self.source.objects.filter(**{f'{self.timestamp_field}__lt': cutoff})
+
+    def run(self, cutoff, chunk_size, pause=0.0):
+        total = 0
+        while True:
+            processed = self.run_chunk(cutoff, chunk_size)
+            total += processed
+            if processed < chunk_size:
+                return total
+            if pause:
+                time.sleep(pause)
+
+    def run_chunk(self, cutoff, chunk_size):
+        with transaction.atomic():
+            rows = list(
+                self.expired(cutoff)
+                .order_by('pk')
+                .values_list('pk', self.source_key, self.timestamp_field)[:chunk_size]
+            )
+            if not rows:
+                return 0
+            totals = Counter(
+                (self.normalize(key), timezone.localdate(created)) for _, key, created in rows
+            )
+            self._add(totals)
+            self.source.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+        return len(rows)
+
+    def _add(self, totals):
+        existing = {
+            (key, day): pk
+            for pk, key, day in self.target.objects.filter(
+                **{f'{self.target_key}__in': {key for key, _ in totals}},
+                day__in={day for _, day in totals},
+            ).values_list('pk', self.target_key, 'day')
+        }
+
+        # Как в счётчике просмотров: строки с одинаковым приращением - одним UPDATE
+        by_delta = defaultdict(list)
+        new_rows = []
+        for (key, day), count in totals.items():
+            pk = existing.get((key, day))
+            if pk is None:
+                new_rows.append(self.target(**{self.target_key: key, 'day': day, self.count_field: count}))
+            else:
+                by_delta[count].append(pk)
+        for delta, pks in by_delta.items():
+            self.target.objects.filter(pk__in=pks).update(**{self.count_field: F(self.count_field) + delta})
+        self.target.objects.bulk_create(new_rows)
+
+
+property_view_rollup = Rollup(
+    PropertyView, 'viewed_at', 'property_id', PropertyViewDaily, 'property_id', 'views',
+)
+search_history_rollup = Rollup(
+    SearchHistory, 'created_at', 'keyword', SearchKeywordDaily, 'keyword', 'searches', normalize=normalize_keyword,
+)
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, dt_time.min))
+
+
+def daily_views(property_id, start, end):
+    # Просмотры по дням в [start, end): свёрнутые дни берутся из агрегатов,
+    # ещё не свёрнутые - из сырых строк; одна и та же строка не бывает в обоих местах
+    counts = Counter(dict(
+        PropertyViewDaily.objects.filter(property_id=property_id, day__gte=start, day__lt=end)
+        .values_list('day', 'views')
+    ))
+    raw = (
+        PropertyView.objects.filter(property_id=property_id, viewed_at__gte=day_start(start), viewed_at__lt=day_start(end))
+        .annotate(day=TruncDate('viewed_at'))
+        .values('day')
+        .annotate(views=Count('id'))
+        .values_list('day', 'views')
+    )
+    for day, views in raw:
+        counts[day] += views
+
+    days = []
+    day = start
+    while day < end:
+        days.append({'day': day, 'views': counts.get(day, 0)})
+        day += timedelta(days=1)
+    return days
+
+
+def top_keywords(start, end, limit):
+    counts = Counter()
+    rolled = (
+        SearchKeywordDaily.objects.filter(day__gte=start, day__lt=end)
+        .values('keyword')
+        .annotate(searches=Sum('searches'))
+        .values_list('keyword', 'searches')
+    )
+    for keyword, searches in rolled:
+        counts[keyword] += searches
+    raw = (
+        SearchHistory.objects.filter(created_at__gte=day_start(start), created_at__lt=day_start(end))
+        .values('keyword')
+        .annotate(searches=Count('id'))
+        .values_list('keyword', 'searches')
+    )
+    for keyword, searches in raw:
+        counts[normalize_keyword(keyword)] += searches
+    return [{'keyword': keyword, 'searches': searches} for keyword, searches in counts.most_common(limit)]
@@ -0,0 +1,146 @@
+# rental/routers.py
+# Чтение с реплик, запись - в primary. На реплики уходят только чтения внутри
+# безопасных HTTP-запросов (ReplicaRoutingMiddleware) до первой записи;
+# команды, фоновые потоки и транзакции читают с primary.
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingState:
+    # Маршрутизация одного HTTP-запроса; изменяется на месте, чтобы запись,
+    # сделанная в другом потоке (sync_to_async), была видна всему запросу
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+        self.replica = None
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+
+@contextmanager
+def routing(use_replica):
+    token = _state.set(RoutingState(use_replica))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    # Участок запроса, которому нужны самые свежие данные
+    state = _state.get()
+    if state is None or not state.use_replica:
+        yield
+        return
+    state.use_replica = False
+    try:
+        yield
+    finally:
+        state.use_replica = True
+
+
+def read_from_replica():
+    # Читал ли текущий запрос с реплики
+    state = _state.get()
+    return state is not None and state.replica is not None
+
+
+class ReplicaHealth:
+    """Доступность реплик с кэшем на DB_REPLICA_CHECK_INTERVAL секунд.
+
+    Проверка - чтение из django_migrations (есть ли схема) и, на MySQL,
+    отставание из SHOW REPLICA STATUS.
+    Недоступная или отставшая реплика исключается до следующей проверки.
+    """
+
+    def __init__(self):
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(alias)
+        if checked and now - checked[0] < settings.DB_REPLICA_CHECK_INTERVAL:
+            return checked[1]
+        healthy = self.check(alias)
+        with self._lock:
+            previous = self._checked.get(alias)
+            self._checked[alias] = (now, healthy)
+        if not healthy and (previous is None or previous[1]):
+            logger.warning("Replica %s is unavailable or lagging, reading from primary", alias)
+        return healthy
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+        except DatabaseError:
+            # Сломанное соединение закрываем, следующая проверка подключится заново
+            connection.close()
+            return False
+        if connection.vendor != 'mysql':
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SHOW REPLICA STATUS')
+                row = cursor.fetchone()
+                columns = [column[0] for column in cursor.description or ()]
+        except DatabaseError:
+            # Нет прав REPLICATION CLIENT: отставание неизвестно, реплика доступна
+            return True
+        if row is None:
+            return True
+        lag = dict(zip(columns, row)).get('Seconds_Behind_Source')
+        # NULL - репликация остановлена
+        return lag is not None and lag <= settings.DB_REPLICA_MAX_LAG
+
+    def reset(self):
+        with self._lock:
+            self._checked.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or state.wrote or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        # Чтение внутри транзакции должно видеть её же изменения
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        # Весь запрос читает с одной реплики, чтобы не видеть разные моменты времени
+        if state.replica is None or not replica_health.healthy(state.replica):
+            replicas = [alias for alias in settings.DATABASE_REPLICAS if replica_health.healthy(alias)]
+            if not replicas:
+                return DEFAULT_DB_ALIAS
+            state.replica = random.choice(replicas)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Дальше запрос читает с primary: read-after-write
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,293 @@
+# rental/search.py
+import bisect
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+TEXT_COLUMNS = ('title', 'description')
+LOCATION_COLUMNS = ('location',)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class BaseSearchBackend:
+    # Все движки ищут по префиксам слов и объединяют слова запроса через AND
+
+    def index(self, property):
+        pass
+
+    def index_many(self, properties):
+        for property in properties:
+            self.index(property)
+
+    def remove(self, property_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query, columns=TEXT_COLUMNS, limit=None):
+        # -> [(property_id, score), ...], лучшие совпадения первыми
+        raise NotImplementedError
+
+    def matching_ids(self, query, columns=TEXT_COLUMNS):
+        # Множество id или подзапрос для pk__in, без ранжирования и лимита
+        return [property_id for property_id, _ in self.search(query, columns)]
+
+    def filter_queryset(self, queryset, query, columns=TEXT_COLUMNS, ranked=True):
+        if not tokenize(query):
+            return queryset
+        if not ranked:
+            return queryset.filter(pk__in=self.matching_ids(query, columns))
+
+        limit = settings.SEARCH_MAX_RESULTS
+        ids = [property_id for property_id, _ in self.search(query, columns, limit=limit)]
+        if not ids:
+            return queryset.none()
+        # Ранжируются лучшие SEARCH_MAX_RESULTS совпадений, остальные идут после
+        # них по id: ранг уникален, и курсорная пагинация доходит до конца выдачи
+        rank = Case(
+            *[When(pk=property_id, then=Value(position)) for position, property_id in enumerate(ids)],
+            default=F('pk') + len(ids),
+            output_field=IntegerField(),
+        )
+        matches = self.matching_ids(query, columns) if len(ids) >= limit else ids
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('search_rank')
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """Инвертированный индекс в памяти процесса.
+
+    Подходит для разработки и одного воркера: изменения, сделанные другими
+    процессами, подхватываются только при перестроении (SEARCH_INDEX_MAX_AGE).
+    """
+
+    column_weights = {'title': 2.0, 'description': 1.0, 'location': 1.0}
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._reset()
+
+    def _reset(self):
+        # postings[column][token] = {property_id: tf}
+        self._postings = defaultdict(dict)
+        self._vocabulary = defaultdict(list)
+        self._documents = {}
+
+    def _ensure_built(self):
+        max_age = settings.SEARCH_INDEX_MAX_AGE
+        if self._built_at is None or (max_age and time.monotonic() - self._built_at > max_age):
+            self.rebuild()
+
+    def rebuild(self):
+        from .models import Property
+
+        rows = Property.objects.values_list('pk', *self.column_weights).iterator(chunk_size=2000)
+        with self._lock:
+            self._reset()
+            for pk, *values in rows:
+                self._add(pk, dict(zip(self.column_weights, values)))
+            self._built_at = time.monotonic()
+
+    def index(self, property):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._discard(property.pk)
+            self._add(property.pk, {column: getattr(property, column) for column in self.column_weights})
+
+    def index_many(self, properties):
+        with self._lock:
+            if self._built_at is None:
+                return
+            for property in properties:
+                self._discard(property.pk)
+                self._add(property.pk, {column: getattr(property, column) for column in self.column_weights})
+
+    def remove(self, property_id):
+        with self._lock:
+            if self._built_at is not None:
+                self._discard(property_id)
+
+    def _add(self, pk, values):
+        document = {}
+        for column, text in values.items():
+            counts = defaultdict(int)
+            for token in tokenize(text):
+                counts[token] += 1
+            postings = self._postings[column]
+            for token, tf in counts.items():
+                if token not in postings:
+                    postings[token] = {}
+                    bisect.insort(self._vocabulary[column], token)
+                postings[token][pk] = tf
+            document[column] = list(counts)
+        self._documents[pk] = document
+
+    def _discard(self, pk):
+        document = self._documents.pop(pk, None)
+        if not document:
+            return
+        for column, tokens in document.items():
+            postings = self._postings[column]
+            for token in tokens:
+                docs = postings.get(token)
+                if docs is None:
+                    continue
+                docs.pop(pk, None)
+                if not docs:
+                    del postings[token]
+                    vocabulary = self._vocabulary[column]
+                    del vocabulary[bisect.bisect_left(vocabulary, token)]
+
+    def _expand(self, column, prefix):
+        vocabulary = self._vocabulary[column]
+        start = bisect.bisect_left(vocabulary, prefix)
+        for token in vocabulary[start:start + settings.SEARCH_MAX_PREFIX_EXPANSIONS]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def search(self, query, columns=TEXT_COLUMNS, limit=None):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            self._ensure_built()
+            total = max(len(self._documents), 1)
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for column in columns:
+                    weight = self.column_weights.get(column, 1.0)
+                    for token in self._expand(column, term):
+                        docs = self._postings[column][token]
+                        idf = math.log(1 + total / len(docs))
+                        for pk, tf in docs.items():
+                            term_scores[pk] += weight * tf * idf
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pk: score + term_scores[pk] for pk, score in scores.items() if pk in term_scores}
+                if not scores:
+                    return []
+        hits = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return hits[:limit] if limit else hits
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    # Таблица rental_property_fts создаётся миграцией 0004 и синхронизируется сигналами
+    table = 'rental_property_fts'
+
+    def _match_expression(self, query, columns):
+        terms = ' AND '.join('"%s"*' % token.replace('"', '""') for token in tokenize(query))
+        return '{%s} : (%s)' % (' '.join(columns), terms)
+
+    def index(self, property):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [property.pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, description, location) VALUES (%s, %s, %s, %s)',
+                [property.pk, property.title, property.description, property.location],
+            )
+
+    def index_many(self, properties):
+        # Пачка объектов - один DELETE и один executemany вместо пары запросов на объект
+        rows = [(property.pk, property.title, property.description, property.location) for property in properties]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid IN ({", ".join(["%s"] * len(rows))})',
+                [row[0] for row in rows],
+            )
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, title, description, location) VALUES (%s, %s, %s, %s)', rows,
+            )
+
+    def remove(self, property_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [property_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, description, location) '
+                f'SELECT id, title, description, location FROM rental_property'
+            )
+
+    def search(self, query, columns=TEXT_COLUMNS, limit=None):
+        if not tokenize(query):
+            return []
+        # bm25: чем меньше, тем релевантнее; заголовок весит вдвое больше
+        sql = (
+            f'SELECT rowid, bm25({self.table}, 2.0, 1.0, 1.0) AS score FROM {self.table} '
+            f'WHERE {self.table} MATCH %s ORDER BY score, rowid'
+        )
+        params = [self._match_expression(query, columns)]
+        if limit:
+            sql += ' LIMIT %s'
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(rowid, -score) for rowid, score in cursor.fetchall()]
+
+    def matching_ids(self, query, columns=TEXT_COLUMNS):
+        return RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [self._match_expression(query, columns)],
+        )
+
+
+class MySQLFulltextBackend(BaseSearchBackend):
+    # FULLTEXT-индексы создаются миграцией 0004, MySQL поддерживает их сам.
+    # Слова короче innodb_ft_min_token_size (по умолчанию 3) не индексируются.
+
+    def _against(self, query):
+        return ' '.join('+%s*' % token for token in tokenize(query))
+
+    def _match(self, columns):
+        return 'MATCH(%s) AGAINST (%%s IN BOOLEAN MODE)' % ', '.join(columns)
+
+    def search(self, query, columns=TEXT_COLUMNS, limit=None):
+        if not tokenize(query):
+            return []
+        match = self._match(columns)
+        against = self._against(query)
+        sql = f'SELECT id, {match} AS score FROM rental_property WHERE {match} ORDER BY score DESC, id'
+        params = [against, against]
+        if limit:
+            sql += ' LIMIT %s'
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def matching_ids(self, query, columns=TEXT_COLUMNS):
+        return RawSQL(f'SELECT id FROM rental_property WHERE {self._match(columns)}', [self._against(query)])
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    if settings.SEARCH_BACKEND:
+        return import_string(settings.SEARCH_BACKEND)()
+    if connection.vendor == 'mysql':
+        return MySQLFulltextBackend()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5Backend()
+    return InvertedIndexBackend()
@@ -1,11 +1,48 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
 from .models import CustomUser, Property, Booking, Review, SearchHistory, PropertyView
+from .ratings import HISTOGRAM_FIELDS, RATINGS, histogram
 from django.contrib.auth.models import Group
 
 CustomUser = get_user_model()  # Получаем кастомную модель пользователя
 
+
+def requested_fields(request, param='fields'):
+    # ?fields=id,title,price -> {'id', 'title', 'price'}; None, если параметр не передан
+    if request is None:
+        return None
+    raw = request.query_params.get(param)
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    # Оставляет в ответе только поля из ?fields=, неизвестные имена игнорируются.
+    # Колонки модели, нужные вычисляемым полям, перечисляются в sparse_field_columns.
+    sparse_field_columns = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        fields = requested_fields(request)
+        if fields:
+            for name in set(self.fields) - fields - {'id'}:
+                self.fields.pop(name)
+
+    @classmethod
+    def sparse_columns(cls, fields):
+        model = cls.Meta.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        columns = {'id'}
+        for name in fields:
+            if name in concrete:
+                columns.add(name)
+            columns.update(cls.sparse_field_columns.get(name, ()))
+        return columns
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
@@ -51,7 +88,8 @@ class LoginSerializer(serializers.Serializer):
     user = UserSerializer(read_only=True)  # Дополнительное поле для передачи информации о пользователе
 
     def validate(self, data):
-        email = data['email']
+        # create_user нормализует домен email, поэтому ищем так же; email уникален и проиндексирован
+        email = CustomUser.objects.normalize_email(data['email'])
         password = data['password']
 
         try:
@@ -59,34 +97,90 @@ class LoginSerializer(serializers.Serializer):
         except CustomUser.DoesNotExist:
             raise serializers.ValidationError("User not found.")
 
+        # check_password перехэширует пароль, если изменилась стоимость хэшера
         if not user.check_password(password):
             raise serializers.ValidationError("Incorrect password.")
 
-        refresh = RefreshToken.for_user(user)
-        return {
-            'user': UserSerializer(user).data,  # Возвращаем информацию о пользователе
-            'access': str(refresh.access_token),
-            'refresh': str(refresh),
-        }
+        if not user.is_active:
+            raise serializers.ValidationError("User account is disabled.")
+
+        # Токены выпускает LoginView, здесь только проверка учётных данных
+        data['user'] = user
+        return data
+
+
+def validate_coordinates(data):
+    # Широта и долгота задаются только парой
+    if ('latitude' in data) != ('longitude' in data) or (data.get('latitude') is None) != (data.get('longitude') is None):
+        raise serializers.ValidationError("latitude and longitude must be set together.")
+    return data
 
 
-class PropertySerializer(serializers.ModelSerializer):
+class PropertySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    rating_histogram = serializers.SerializerMethodField()
+    # Расстояние до точки ?near=, в остальных запросах null
+    distance_km = serializers.SerializerMethodField()
+
+    sparse_field_columns = {'rating_histogram': HISTOGRAM_FIELDS}
+    # Те же методы для строк .values() в быстром пути списков (rental/fast_serializers.py)
+    fast_method_fields = {
+        'rating_histogram': (
+            HISTOGRAM_FIELDS, lambda row: {str(rating): row[f'rating_{rating}'] for rating in RATINGS},
+        ),
+        'distance_km': (
+            ('distance_km',),
+            lambda row: round(row['distance_km'], 3) if row.get('distance_km') is not None else None,
+        ),
+    }
+
     class Meta:
         model = Property
         fields = [
             'id', 'title', 'description', 'location', 'price', 'num_rooms',
-            'property_type', 'is_active', 'available', 'created_at'
+            'property_type', 'is_active', 'available', 'created_at', 'views_count',
+            'rating_avg', 'rating_count', 'rating_histogram', 'latitude', 'longitude', 'distance_km'
         ]
-        read_only_fields = ['created_at']
+        read_only_fields = ['created_at', 'views_count', 'rating_avg', 'rating_count']
+
+    def validate(self, data):
+        return validate_coordinates(data)
+
+    def update(self, instance, validated_data):
+        # Новая локация без новых координат - координаты геокодируются заново
+        if 'location' in validated_data and validated_data['location'] != instance.location:
+            validated_data.setdefault('latitude', None)
+            validated_data.setdefault('longitude', None)
+        return super().update(instance, validated_data)
+
+    def get_rating_histogram(self, obj):
+        return histogram(obj)
+
+    def get_distance_km(self, obj):
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 3) if distance is not None else None
+
+
+class PropertyImportSerializer(serializers.ModelSerializer):
+    # Строка массового импорта: владелец задаётся вызывающим кодом, объект ищется по external_ref
+    class Meta:
+        model = Property
+        fields = [
+            'external_ref', 'title', 'description', 'location', 'price', 'num_rooms',
+            'property_type', 'is_active', 'available', 'latitude', 'longitude',
+        ]
+        extra_kwargs = {'external_ref': {'required': True, 'allow_null': False, 'allow_blank': False}}
+
+    def validate(self, data):
+        return validate_coordinates(data)
 
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = [
-            'id', 'property', 'user', 'start_date', 'end_date', 'status', 'created_at'
+            'id', 'property', 'user', 'start_date', 'end_date', 'status', 'created_at', 'version'
         ]
-        read_only_fields = ['user', 'status', 'created_at']
+        read_only_fields = ['user', 'status', 'created_at', 'version']
 
     def validate(self, data):
         start_date = data.get('start_date')
@@ -110,14 +204,14 @@ class ReviewSerializer(serializers.ModelSerializer):
         return value
 
 
-class SearchHistorySerializer(serializers.ModelSerializer):
+class SearchHistorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = SearchHistory
         fields = ['id', 'user', 'keyword', 'created_at']
         read_only_fields = ['user', 'created_at']
 
 
-class PropertyViewSerializer(serializers.ModelSerializer):
+class PropertyViewSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = PropertyView
         fields = ['id', 'user', 'property', 'viewed_at']
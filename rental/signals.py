@@ -1,6 +1,15 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.db import transaction
 from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth.models import User, Group
+from .models import Booking, CustomUser, Property, Review
+from .authentication import revocations
+from .cache import bump_generation_on_commit
+from .geo import locate
+from .landlord_stats import add_stay, apply_deltas, new_deltas
+from .ratings import apply_rating
+from .search import get_search_backend
 
 
 
@@ -22,3 +31,187 @@ def assign_user_group(sender, instance, created, **kwargs):
         else:
             instance.groups.add(tenant_group)
 
+
+@receiver([post_save, post_delete], sender=Property)
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_property_responses(sender, **kwargs):
+    # Отзывы меняют rating_* у объекта, поэтому тоже сбрасывают кэш объектов
+    bump_generation_on_commit('property')
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def invalidate_booking_responses(sender, **kwargs):
+    bump_generation_on_commit('booking')
+
+
+@receiver(pre_save, sender=Property)
+def locate_property(sender, instance, update_fields=None, **kwargs):
+    # Координаты и geohash нужны только при изменении локации или координат
+    if update_fields is not None and not {'location', 'latitude', 'longitude'} & set(update_fields):
+        return
+    locate(instance)
+
+
+@receiver(post_save, sender=Property)
+def index_property(sender, instance, update_fields=None, **kwargs):
+    # Сохранения, не затрагивающие текстовые поля, индекс не трогают
+    if update_fields is not None and not {'title', 'description', 'location'} & set(update_fields):
+        return
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Property)
+def unindex_property(sender, instance, **kwargs):
+    get_search_backend().remove(instance.pk)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = Review.objects.filter(pk=instance.pk).values_list('property_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def update_rating_aggregates(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if created or previous is None:
+        apply_rating(instance.property_id, instance.rating)
+    elif previous != (instance.property_id, instance.rating):
+        apply_rating(*previous, sign=-1)
+        apply_rating(instance.property_id, instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def remove_rating_from_aggregates(sender, instance, **kwargs):
+    apply_rating(instance.property_id, instance.rating, sign=-1)
+
+
+# Статистика арендодателя (rental/landlord_stats.py)
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, **kwargs):
+    deltas = new_deltas()
+    changes = deltas[(instance.property_id, timezone.localdate(instance.created_at))]
+    previous = getattr(instance, '_previous_rating', None)
+    if created or previous is None:
+        changes['reviews'] += 1
+        changes['rating_sum'] += instance.rating
+    elif previous != (instance.property_id, instance.rating):
+        before = deltas[(previous[0], timezone.localdate(instance.created_at))]
+        before['rating_sum'] -= previous[1]
+        changes['rating_sum'] += instance.rating
+        if previous[0] != instance.property_id:
+            # Отзыв перенесён на другой объект: переносится и сам счётчик
+            before['reviews'] -= 1
+            changes['reviews'] += 1
+    apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    deltas = new_deltas()
+    changes = deltas[(instance.property_id, timezone.localdate(instance.created_at))]
+    changes['reviews'] -= 1
+    changes['rating_sum'] -= instance.rating
+    # После коммита: при каскадном удалении объекта его строки статистики уже удалены
+    # и не должны создаваться заново
+    transaction.on_commit(lambda: apply_deltas(deltas))
+
+
+BOOKING_STAT_FIELDS = ('property_id', 'status', 'start_date', 'end_date', 'night_price', 'cancelled_at', 'created_at')
+
+
+def _night_price(property_id):
+    return Property.objects.filter(pk=property_id).values_list('price', flat=True).first() or 0
+
+
+@receiver(pre_save, sender=Booking)
+def remember_previous_booking(sender, instance, **kwargs):
+    instance._previous_booking = None
+    if instance.pk:
+        instance._previous_booking = Booking.objects.filter(pk=instance.pk).values_list(*BOOKING_STAT_FIELDS).first()
+    previous = instance._previous_booking
+    # Цена ночи фиксируется при создании и при переносе на другой объект:
+    # статистика снимает бронь по той же цене, по которой её добавила
+    if instance.night_price is None or (previous and previous[0] != instance.property_id):
+        instance.night_price = _night_price(instance.property_id)
+    if instance.status != 'cancelled':
+        instance.cancelled_at = None
+    elif instance.cancelled_at is None:
+        instance.cancelled_at = timezone.now()
+
+
+def _booking_stats(deltas, values, sign):
+    # Вклад брони в статистику, как его считает rebuild(): заявка - в день
+    # создания, отмена - в день cancelled_at, ночи - по цене ночи из брони
+    property_id, status, start_date, end_date, night_price, cancelled_at, created_at = values
+    deltas[(property_id, timezone.localdate(created_at))]['booking_requests'] += sign
+    if status == 'cancelled':
+        deltas[(property_id, timezone.localdate(cancelled_at or created_at))]['cancellations'] += sign
+    if status == 'confirmed':
+        price = night_price if night_price is not None else _night_price(property_id)
+        add_stay(deltas, property_id, start_date, end_date, price, sign=sign)
+
+
+@receiver(post_save, sender=Booking)
+def count_booking(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_booking', None)
+    current = tuple(getattr(instance, field) for field in BOOKING_STAT_FIELDS)
+    if not created and previous == current:
+        return
+    deltas = new_deltas()
+    # Снимаем прежний вклад брони и добавляем новый
+    if previous:
+        _booking_stats(deltas, previous, sign=-1)
+    _booking_stats(deltas, current, sign=1)
+    apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Booking)
+def uncount_booking(sender, instance, **kwargs):
+    deltas = new_deltas()
+    _booking_stats(deltas, tuple(getattr(instance, field) for field in BOOKING_STAT_FIELDS), sign=-1)
+    transaction.on_commit(lambda: apply_deltas(deltas))
+
+
+# Поля, которые попадают в claims токена или делают его недействительным
+TOKEN_USER_FIELDS = ('is_active', 'is_landlord', 'is_tenant', 'is_staff', 'email', 'password')
+
+
+@receiver(pre_save, sender=CustomUser)
+def remember_token_fields(sender, instance, **kwargs):
+    instance._token_fields = None
+    if instance.pk:
+        instance._token_fields = CustomUser.objects.filter(pk=instance.pk).values_list(*TOKEN_USER_FIELDS).first()
+
+
+@receiver(post_save, sender=CustomUser)
+def revoke_stale_tokens(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_token_fields', None)
+    if created or previous is None:
+        return
+    current = tuple(getattr(instance, field) for field in TOKEN_USER_FIELDS)
+    changed = {field for field, old, new in zip(TOKEN_USER_FIELDS, previous, current) if old != new}
+    if changed == {'password'} and getattr(instance, '_rehashing_password', False):
+        # Только новая кодировка того же пароля внутри check_password
+        return
+    if changed:
+        revocations.revoke(instance.pk)
+
+
+@receiver(post_delete, sender=CustomUser)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    revocations.revoke(instance.pk)
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def revoke_tokens_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # instance - группа, pk_set - пользователи (для post_clear не передаётся)
+        for user_id in pk_set or ():
+            revocations.revoke(user_id)
+    else:
+        revocations.revoke(instance.pk)
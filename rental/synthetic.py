@@ -0,0 +1,167 @@
+# rental/synthetic.py
+# Генератор синтетических данных для бенчмарков: детерминированный (seed) и
+# только на bulk_create, поэтому сигналы не срабатывают и агрегаты, статистика
+# арендодателей и поисковый индекс пересчитываются в конце одним проходом.
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from .cache import bump_generation_on_commit
+from .geo import geocode, locate
+from .landlord_stats import rebuild as rebuild_landlord_stats
+from .models import Booking, CustomUser, Property, PropertyView, Review, SearchHistory
+from .ratings import rebuild_aggregates
+from .search import get_search_backend
+
+CITIES = ['Kyiv', 'Lviv', 'Odesa', 'Kharkiv', 'Dnipro', 'Uzhhorod', 'Chernivtsi', 'Ivano-Frankivsk']
+ADJECTIVES = ['Cozy', 'Bright', 'Spacious', 'Modern', 'Quiet', 'Central', 'Renovated', 'Sunny']
+NOUNS = ['flat', 'studio', 'loft', 'apartment', 'house', 'cottage', 'penthouse']
+FEATURES = ['balcony', 'parking', 'river view', 'garden', 'fireplace', 'workspace', 'sauna', 'terrace']
+
+# Пароль всех синтетических пользователей; хэш считается один раз
+PASSWORD = 'synthetic-password'
+
+
+class SyntheticData:
+    def __init__(self, seed=0, batch_size=1000):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.counts = {}
+
+    def generate(self, landlords=10, tenants=100, properties=1000, bookings_per_property=5, reviews=2000,
+                 views=10000, searches=5000):
+        password = make_password(PASSWORD)
+        offset = CustomUser.objects.count()
+        landlord_users = self._users(landlords, offset, password, is_landlord=True)
+        tenant_users = self._users(tenants, offset + landlords, password, is_landlord=False)
+
+        property_objects = self._bulk_create(
+            Property, [self._property(self.random.choice(landlord_users)) for _ in range(properties)],
+        )
+        stays = self._bookings(property_objects, tenant_users, bookings_per_property)
+        self._reviews(stays, reviews)
+        self._views(property_objects, tenant_users, views)
+        self._searches(tenant_users, searches)
+
+        rebuild_aggregates(batch_size=self.batch_size)
+        rebuild_landlord_stats(batch_size=self.batch_size)
+        get_search_backend().rebuild()
+        # Команда генерирует данные в транзакции: кэш сбрасывается после коммита
+        for table in ('property', 'booking'):
+            bump_generation_on_commit(table)
+        return self.counts
+
+    def _users(self, count, offset, password, is_landlord):
+        role = 'landlord' if is_landlord else 'tenant'
+        users = self._bulk_create(
+            CustomUser,
+            [
+                CustomUser(
+                    email=f'{role}{offset + i}@example.com', username=f'{role}{offset + i}', password=password,
+                    is_landlord=is_landlord, is_tenant=not is_landlord,
+                )
+                for i in range(count)
+            ],
+        )
+        self.counts[f'{role}s'] = len(users)
+        return users
+
+    def _bulk_create(self, model, objects):
+        if connection.features.can_return_rows_from_bulk_insert:
+            return model.objects.bulk_create(objects, batch_size=self.batch_size)
+        # MySQL не возвращает id из bulk_create: дочитываем вставленные строки по диапазону ключей
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        return list(model.objects.filter(pk__gt=last).order_by('pk'))
+
+    def _property(self, landlord):
+        city = self.random.choice(CITIES)
+        noun = self.random.choice(NOUNS)
+        features = self.random.sample(FEATURES, 2)
+        # Объекты разбросаны в пределах ~10 км от центра города
+        latitude, longitude = geocode(city)
+        property = Property(
+            title=f'{self.random.choice(ADJECTIVES)} {noun} in {city}',
+            description=f'{noun.capitalize()} with {features[0]} and {features[1]}, close to the centre of {city}.',
+            location=city,
+            price=self.random.randrange(300, 5000),
+            num_rooms=self.random.randint(1, 6),
+            property_type='house' if noun in ('house', 'cottage') else 'apartment',
+            user=landlord,
+            latitude=latitude + self.random.uniform(-0.09, 0.09),
+            longitude=longitude + self.random.uniform(-0.13, 0.13),
+        )
+        locate(property)
+        return property
+
+    def _bookings(self, property_objects, tenant_users, per_property):
+        # Брони одного объекта идут подряд без пересечений: прошлые и будущие
+        today = timezone.localdate()
+        bookings = []
+        for property in property_objects:
+            start = today - timedelta(days=self.random.randint(30, 365))
+            for _ in range(per_property):
+                start += timedelta(days=self.random.randint(0, 20))
+                end = start + timedelta(days=self.random.randint(1, 14))
+                bookings.append(Booking(
+                    property=property, user=self.random.choice(tenant_users), start_date=start, end_date=end,
+                    status=self.random.choice(['pending', 'confirmed', 'confirmed', 'cancelled']),
+                ))
+                start = end
+        Booking.objects.bulk_create(bookings, batch_size=self.batch_size)
+        self.counts['bookings'] = len(bookings)
+        return [booking for booking in bookings if booking.end_date < today and booking.status != 'cancelled']
+
+    def _reviews(self, stays, count):
+        # Отзывы только от тех, кто действительно жил, как требует ReviewViewSet
+        reviews = []
+        if stays:
+            for _ in range(count):
+                stay = self.random.choice(stays)
+                reviews.append(Review(
+                    property_id=stay.property_id, user_id=stay.user_id,
+                    rating=self.random.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 6, 8])[0],
+                    comment=self.random.choice(['Great stay', 'As described', 'Noisy street', 'Would come back']),
+                ))
+        Review.objects.bulk_create(reviews, batch_size=self.batch_size)
+        self.counts['reviews'] = len(reviews)
+
+    def _views(self, property_objects, tenant_users, count):
+        now = timezone.now()
+        # Популярность объектов неравномерна, как в жизни
+        weights = [1 / (rank + 1) for rank in range(len(property_objects))]
+        viewed = self.random.choices(property_objects, weights=weights, k=count) if tenant_users else []
+        PropertyView.objects.bulk_create(
+            [
+                PropertyView(
+                    property=property, user=self.random.choice(tenant_users),
+                    viewed_at=now - timedelta(minutes=self.random.randint(0, 60 * 24 * 180)),
+                )
+                for property in viewed
+            ],
+            batch_size=self.batch_size,
+        )
+        for property, views_count in Counter(viewed).items():
+            property.views_count = views_count
+        Property.objects.bulk_update(set(viewed), ['views_count'], batch_size=self.batch_size)
+        self.counts['views'] = len(viewed)
+
+    def _searches(self, tenant_users, count):
+        now = timezone.now()
+        keywords = CITIES + NOUNS + FEATURES
+        SearchHistory.objects.bulk_create(
+            [
+                SearchHistory(
+                    user=self.random.choice(tenant_users), keyword=self.random.choice(keywords),
+                    created_at=now - timedelta(minutes=self.random.randint(0, 60 * 24 * 180)),
+                )
+                for _ in range(count)
+            ] if tenant_users else [],
+            batch_size=self.batch_size,
+        )
+        self.counts['searches'] = count if tenant_users else 0
@@ -0,0 +1,124 @@
+# rental/testing.py
+# Помощники для тестов: бюджет SQL-запросов на эндпоинт и проверка на N+1.
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .middleware import query_shape
+from .models import Booking, KeywordAffinity, Property, PropertyView, Review, SearchHistory
+
+# Кэш ответов отключён, иначе повторный запрос не дошёл бы до БД
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+# Сколько запросов может сделать список при любом числе строк (JWT с claims,
+# без запроса пользователя). Превышение - это N+1 или лишний запрос. Метка
+# отзыва токенов читается раз в JWT_REVOCATION_CACHE_TTL и в бюджет не входит:
+# измеряйте после первого запроса того же пользователя.
+QUERY_BUDGETS = {
+    'property-list': 1,
+    # Страница и один агрегатный запрос на все фасеты
+    'property-list-facets': 2,
+    # Запрос только при перестроении снимка цен в памяти
+    'property-price-stats': 1,
+    'property-detail': 1,
+    'booking-list': 1,
+    'property-reviews-list': 1,
+    'search-history-list': 1,
+    'property-views-list': 1,
+    # Затравка (просмотры и запросы одним UNION), веса, кандидаты и добор популярными
+    'property-recommended': 4,
+}
+
+
+def budget_endpoints(landlord, tenant, property_pk):
+    # Эндпоинты из QUERY_BUDGETS: (имя, пользователь, адрес); общий список
+    # для QueryBudgetTests и команды check_query_budgets
+    return (
+        ('property-list', landlord, reverse('property-list')),
+        ('property-list-facets', landlord, reverse('property-list') + '?facets=1'),
+        ('property-price-stats', tenant, reverse('property-price-stats') + '?location=Kyiv'),
+        ('property-detail', landlord, reverse('property-detail', args=[property_pk])),
+        ('booking-list', landlord, reverse('booking-list')),
+        ('property-reviews-list', tenant, reverse('property-reviews-list', args=[property_pk])),
+        ('search-history-list', tenant, reverse('search-history-list')),
+        ('property-views-list', tenant, reverse('property-views-list')),
+        ('property-recommended', tenant, reverse('property-recommended')),
+    )
+
+
+def _format_queries(context):
+    return '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, 1))
+
+
+@contextmanager
+def query_budget(limit, using='default'):
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) > limit:
+        raise AssertionError(
+            f'{len(context)} queries executed, the budget is {limit}:\n{_format_queries(context)}'
+        )
+
+
+def assert_constant_queries(request, grow, using='default'):
+    # Число запросов не должно зависеть от числа строк: выполняем запрос,
+    # добавляем данные через grow() и сравниваем
+    connection = connections[using]
+    with CaptureQueriesContext(connection) as before:
+        request()
+    grow()
+    with CaptureQueriesContext(connection) as after:
+        request()
+    if len(after) != len(before):
+        shapes = {query_shape(query['sql']) for query in before.captured_queries}
+        extra = [query['sql'] for query in after.captured_queries if query_shape(query['sql']) not in shapes]
+        raise AssertionError(
+            f'Query count grew with the data: {len(before)} -> {len(after)}\n'
+            f'{_format_queries(after)}' + (f'\nNew query shapes:\n' + '\n'.join(extra) if extra else '')
+        )
+    return len(after)
+
+
+class QueryBudgetMixin:
+    """Для TestCase: ``with self.assertQueryBudget('property-list'): ...``."""
+
+    query_budgets = QUERY_BUDGETS
+
+    def assertQueryBudget(self, name_or_limit, using='default'):
+        limit = self.query_budgets[name_or_limit] if isinstance(name_or_limit, str) else name_or_limit
+        return query_budget(limit, using=using)
+
+    def assertConstantQueries(self, request, grow, using='default'):
+        return assert_constant_queries(request, grow, using=using)
+
+
+def seed_budget_data(landlord, tenant, count):
+    # count объектов арендодателя с бронью, просмотром и поиском арендатора;
+    # повторный вызов добавляет строки - для assert_constant_queries
+    start = Property.objects.count()
+    properties = Property.objects.bulk_create([
+        Property(
+            title=f'Listing {i}', description='-', location='Kyiv', price=100 + i, num_rooms=2,
+            property_type='apartment', user=landlord,
+        )
+        for i in range(start, start + count)
+    ])
+    today = date.today()
+    Booking.objects.bulk_create([
+        Booking(property=p, user=tenant, start_date=today - timedelta(days=10), end_date=today - timedelta(days=5))
+        for p in properties
+    ])
+    first = Property.objects.order_by('pk').first()
+    Review.objects.bulk_create([
+        Review(property=first, user=tenant, rating=1 + i % 5, comment='-') for i in range(count)
+    ])
+    SearchHistory.objects.bulk_create([SearchHistory(user=tenant, keyword=f'k{i}') for i in range(count)])
+    # Половина объектов не просмотрена: рекомендациям есть что предложить, но не на всю страницу
+    PropertyView.objects.bulk_create([PropertyView(property=p, user=tenant) for p in properties[::2]])
+    KeywordAffinity.objects.bulk_create([
+        KeywordAffinity(keyword=f'k{i}', property=p, score=1.0, computed_at=p.created_at)
+        for i, p in enumerate(properties)
+    ])
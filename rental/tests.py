@@ -1,3 +1,1349 @@
-from django.test import TestCase
+import csv
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import transaction
+from django.test import AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+
+from .authentication import RevocationCache, issue_tokens, revocations
+from .bench import measure, percentile
+from .cache import get_generations
+from .counters import ViewCounter
+from .exports import iterate_rows, keyset_ordering, keyset_rows
+from .facets import FACETS
+from .fast_serializers import FastPlan
+from .geo import EARTH_RADIUS_KM, haversine_km, within_bbox, within_radius
+from .imports import import_properties
+from .ingest import EventIngestor, search_history_events
+from .landlord_stats import STAT_FIELDS, rebuild
+from .management.commands.explain_queries import explain, find_scans, query_shapes
+from .middleware import QueryCountMiddleware, ReplicaRoutingMiddleware
+from .models import (
+    Booking, CustomUser, IdempotencyRecord, LandlordDailyStat, Property, PropertyNeighbor, PropertyView,
+    PropertyViewDaily, Review,
+    SearchHistory, SearchKeywordDaily, TokenRevocation,
+)
+from .price_stats import QUANTILES, price_stats
+from .profiling import ProfilingMiddleware, classify
+from .ratings import HISTOGRAM_FIELDS, rebuild_aggregates
+from .recommendations import RecommendationBuilder, recommend
+from .renderers import FastJSONRenderer
+from .retention import daily_views, top_keywords
+from .routers import PrimaryReplicaRouter, _state, replica_health, routing, use_primary
+from .search import InvertedIndexBackend, SQLiteFTS5Backend
+from .synthetic import SyntheticData
+from .testing import NO_CACHE, QUERY_BUDGETS, QueryBudgetMixin, budget_endpoints, seed_budget_data
+from . import views
+from .views import BookingViewSet
+
+
+@override_settings(CACHES=NO_CACHE, INGEST_BUFFERED=False)
+class APITestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.landlord = CustomUser.objects.create_user(
+            email='landlord@example.com', username='landlord', password=None, is_landlord=True,
+        )
+        cls.tenant = CustomUser.objects.create_user(
+            email='tenant@example.com', username='tenant', password=None, is_tenant=True,
+        )
+
+    def setUp(self):
+        # Кэши процесса переживают откат транзакции теста
+        revocations.reset()
+        price_stats.reset()
+
+    def client_for(self, user):
+        return Client(headers={'Authorization': f'Bearer {issue_tokens(user).access_token}'})
+
+    def create_property(self, **fields):
+        defaults = {
+            'title': 'Flat', 'description': '-', 'location': 'Kyiv', 'price': 100, 'num_rooms': 2,
+            'property_type': 'apartment', 'user': self.landlord,
+        }
+        return Property.objects.create(**{**defaults, **fields})
+
+    def stay(self, days_from_now, nights):
+        start = date.today() + timedelta(days=days_from_now)
+        return start, start + timedelta(days=nights)
+
+    def walk(self, client, url):
+        # Все страницы курсорной пагинации
+        results = []
+        while url:
+            page = client.get(url).json()
+            results += page['results']
+            url = page['next']
+        return results
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.seed(3)
+        self.property_pk = Property.objects.order_by('pk').values_list('pk', flat=True).first()
+
+    def seed(self, count):
+        seed_budget_data(self.landlord, self.tenant, count)
+
+    def check_endpoint(self, name, user, url):
+        client = self.client_for(user)
+        # Первый запрос читает метку отзыва токенов, она не входит в бюджет
+        self.assertEqual(client.get(url).status_code, 200)
+        with self.assertQueryBudget(name):
+            self.assertEqual(client.get(url).status_code, 200)
+        self.assertConstantQueries(lambda: client.get(url), lambda: self.seed(10))
+
+    def test_every_budget_has_an_endpoint(self):
+        names = [name for name, _, _ in budget_endpoints(self.landlord, self.tenant, self.property_pk)]
+        self.assertEqual(sorted(names), sorted(QUERY_BUDGETS))
+
+    def test_endpoints_stay_within_budget(self):
+        for name, user, url in budget_endpoints(self.landlord, self.tenant, self.property_pk):
+            with self.subTest(name):
+                self.check_endpoint(name, user, url)
+
+
+class IdempotentBookingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.property = self.create_property()
+        self.tenant_client = self.client_for(self.tenant)
+        start, end = self.stay(10, 2)
+        self.body = {'property': self.property.pk, 'start_date': str(start), 'end_date': str(end)}
+
+    def post(self, body, key='key-1'):
+        return self.tenant_client.post(
+            reverse('booking-list'), body, content_type='application/json', headers={'Idempotency-Key': key},
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post(self.body)
+        retry = self.post(self.body)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_same_key_with_another_body_is_rejected(self):
+        self.post(self.body)
+        start, end = self.stay(20, 2)
+        response = self.post({**self.body, 'start_date': str(start), 'end_date': str(end)})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_request_in_progress_returns_conflict(self):
+        self.post(self.body)
+        IdempotencyRecord.objects.update(status_code=None, response=None)
+        response = self.post(self.body)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_failed_request_releases_the_key(self):
+        start, end = self.stay(10, 2)
+        Booking.objects.create(property=self.property, user=self.landlord, start_date=start, end_date=end)
+        self.assertEqual(self.post(self.body).status_code, 400)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    def test_request_that_lost_its_claim_rolls_back(self):
+        perform_create = BookingViewSet.perform_create
+
+        def slow_create(view, serializer):
+            perform_create(view, serializer)
+            # Повтор занял ключ после IDEMPOTENCY_LOCK_TIMEOUT, пока шёл этот запрос
+            IdempotencyRecord.objects.all().delete()
+
+        with mock.patch.object(BookingViewSet, 'perform_create', slow_create):
+            response = self.post(self.body)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Booking.objects.exists())
+
+
+class BookingVersionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        start, end = self.stay(10, 2)
+        self.booking = Booking.objects.create(
+            property=self.create_property(), user=self.tenant, start_date=start, end_date=end,
+        )
+        self.url = reverse('booking-detail', args=[self.booking.pk])
+        self.landlord_client = self.client_for(self.landlord)
+
+    def patch(self, body, version=None):
+        headers = {'If-Match': f'"{version}"'} if version is not None else {}
+        return self.landlord_client.patch(self.url, body, content_type='application/json', headers=headers)
+
+    def test_change_bumps_the_version(self):
+        response = self.patch({'end_date': str(self.booking.end_date + timedelta(days=1))}, version=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], 2)
+
+    def test_stale_version_is_rejected(self):
+        self.patch({'end_date': str(self.booking.end_date + timedelta(days=1))}, version=1)
+        response = self.patch({'end_date': str(self.booking.end_date + timedelta(days=2))}, version=1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 2)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.end_date, self.stay(10, 3)[1])
+
+    def test_no_op_update_keeps_the_version(self):
+        response = self.patch({'start_date': str(self.booking.start_date)}, version=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], 1)
+
+
+class TokenRevocationTests(APITestCase):
+    def test_role_change_revokes_issued_tokens(self):
+        client = self.client_for(self.tenant)
+        self.assertEqual(client.get(reverse('booking-list')).status_code, 200)
+        self.tenant.is_landlord = True
+        self.tenant.save()
+        response = client.get(reverse('booking-list'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_revoked')
+
+    def test_revocation_is_visible_to_other_processes(self):
+        # Отдельный RevocationCache - как кэш другого воркера с LocMem
+        other = RevocationCache()
+        self.assertFalse(other.is_revoked(self.tenant.pk, int(time.time())))
+        revocations.revoke(self.tenant.pk)
+        self.assertTrue(TokenRevocation.objects.filter(user_id=self.tenant.pk).exists())
+        self.assertTrue(RevocationCache().is_revoked(self.tenant.pk, int(time.time())))
+
+    def test_token_issued_in_the_revocation_second_is_revoked(self):
+        with mock.patch('rental.authentication.time.time', return_value=1000.9):
+            revocations.revoke(self.tenant.pk)
+        self.assertTrue(revocations.is_revoked(self.tenant.pk, 1000))
+        self.assertFalse(revocations.is_revoked(self.tenant.pk, 1001))
+
+    def test_first_token_of_a_new_user_is_accepted(self):
+        # Регистрация добавляет группу (m2m_changed -> revoke) в ту же секунду, что и вход
+        Group.objects.create(name='Tenant')
+        credentials = {'email': 'new@example.com', 'password': 'new-password-1'}
+        client = Client()
+        self.assertEqual(client.post(reverse('register'), {**credentials, 'username': 'new'}).status_code, 201)
+        login = client.post(reverse('login'), credentials)
+        self.assertEqual(login.status_code, 200)
+        response = Client(headers={'Authorization': f"Bearer {login.json()['access']}"}).get(reverse('booking-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_token_after_revocation_is_accepted(self):
+        with mock.patch('rental.authentication.time.time', return_value=time.time() - 5):
+            revocations.revoke(self.tenant.pk)
+        self.assertEqual(self.client_for(self.tenant).get(reverse('booking-list')).status_code, 200)
+
+
+class BookingOverlapTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.property = self.create_property()
+        start, end = self.stay(10, 3)
+        self.existing = Booking.objects.create(property=self.property, user=self.landlord, start_date=start, end_date=end)
+        self.tenant_client = self.client_for(self.tenant)
+
+    def book(self, days_from_now, nights):
+        start, end = self.stay(days_from_now, nights)
+        return self.tenant_client.post(
+            reverse('booking-list'),
+            {'property': self.property.pk, 'start_date': str(start), 'end_date': str(end)},
+            content_type='application/json',
+        )
+
+    def test_overlapping_dates_are_rejected(self):
+        for days_from_now, nights in ((9, 2), (11, 1), (12, 5), (8, 10)):
+            with self.subTest(days_from_now=days_from_now, nights=nights):
+                response = self.book(days_from_now, nights)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('overlap', str(response.json()))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_checkout_day_can_be_next_checkin(self):
+        self.assertEqual(self.book(13, 2).status_code, 201)
+        self.assertEqual(self.book(8, 2).status_code, 201)
+
+    def test_cancelled_booking_frees_the_dates(self):
+        self.existing.status = 'cancelled'
+        self.existing.save()
+        self.assertEqual(self.book(10, 3).status_code, 201)
+
+    def test_moving_a_booking_onto_taken_dates_is_rejected(self):
+        start, end = self.stay(20, 2)
+        other = Booking.objects.create(property=self.property, user=self.tenant, start_date=start, end_date=end)
+        start, end = self.stay(11, 2)
+        response = self.client_for(self.landlord).patch(
+            reverse('booking-detail', args=[other.pk]),
+            {'start_date': str(start), 'end_date': str(end)},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        other.refresh_from_db()
+        self.assertEqual(other.start_date, self.stay(20, 2)[0])
+
+
+class LandlordStatsTests(APITestCase):
+    def assertMatchesRebuild(self):
+        # Строки, где все приращения сократились до нуля, rebuild() не создаёт
+        def table():
+            return sorted(
+                (row['property_id'], row['day'], *(row[field] for field in STAT_FIELDS))
+                for row in LandlordDailyStat.objects.values()
+                if any(row[field] for field in STAT_FIELDS)
+            )
+        live = table()
+        rebuild()
+        self.assertEqual(live, table())
+        return live
+
+    def test_booking_changes_match_rebuild(self):
+        first, second = self.create_property(price=100), self.create_property(price=200)
+        start, end = self.stay(3, 2)
+        moved = Booking.objects.create(property=first, user=self.tenant, start_date=start, end_date=end)
+        start, end = self.stay(10, 2)
+        cancelled = Booking.objects.create(property=first, user=self.tenant, start_date=start, end_date=end)
+        for booking in (moved, cancelled):
+            booking.status = 'confirmed'
+            booking.save()
+        first.price = 150
+        first.save()
+        moved.property = second
+        moved.save()
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=2)):
+            cancelled.status = 'cancelled'
+            cancelled.save()
+        start, end = self.stay(20, 1)
+        deleted = Booking.objects.create(property=second, user=self.tenant, start_date=start, end_date=end, status='confirmed')
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted.delete()
+
+        live = self.assertMatchesRebuild()
+        self.assertEqual(sum(row[2 + STAT_FIELDS.index('revenue')] for row in live), 400)
+        self.assertEqual(sum(row[2 + STAT_FIELDS.index('cancellations')] for row in live), 1)
+
+    def test_review_changes_match_rebuild(self):
+        first, second = self.create_property(), self.create_property()
+        review = Review.objects.create(property=first, user=self.tenant, rating=4, comment='-')
+        Review.objects.create(property=first, user=self.tenant, rating=2, comment='-')
+        review.property = second
+        review.rating = 5
+        review.save()
+        removed = Review.objects.create(property=second, user=self.tenant, rating=1, comment='-')
+        with self.captureOnCommitCallbacks(execute=True):
+            removed.delete()
+
+        live = self.assertMatchesRebuild()
+        by_property = {row[0]: row[2 + STAT_FIELDS.index('reviews')] for row in live}
+        self.assertEqual(by_property, {first.pk: 1, second.pk: 1})
+
+
+class FastPathTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        seed_budget_data(self.landlord, self.tenant, 5)
+        self.create_property(title='Кв. \u2028 "центр"', price='1234.50', latitude=50.4501, longitude=30.5234)
+        self.property_pk = Property.objects.order_by('pk').values_list('pk', flat=True).first()
+
+    def test_list_responses_are_byte_identical(self):
+        urls = (
+            (self.landlord, reverse('property-list')),
+            (self.landlord, reverse('property-list') + '?fields=id,title,price'),
+            (self.landlord, reverse('booking-list')),
+            (self.tenant, reverse('property-reviews-list', args=[self.property_pk])),
+        )
+        for user, url in urls:
+            with self.subTest(url=url):
+                client = self.client_for(user)
+                with mock.patch.object(FastPlan, 'serialize', autospec=True, side_effect=FastPlan.serialize) as serialize:
+                    fast = client.get(url)
+                serialize.assert_called()
+                with override_settings(FAST_SERIALIZERS=False):
+                    slow = client.get(url)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+
+    def test_renderer_matches_json_renderer(self):
+        data = [
+            {'price': '10.00', 'score': 0.1, 'tiny': 0.00001, 'huge': 1e16, 'ratio': 0.5, 'none': None},
+            {'text': 'line\u2028break\u2029', 'when': timezone.now(), 'day': date.today(), 'ok': True},
+        ]
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class AsyncMiddlewareTests(APITestCase):
+    @override_settings(QUERY_COUNT_ENABLED=True)
+    async def test_query_count_stays_async(self):
+        async def view(request):
+            await Property.objects.acount()
+            await Property.objects.filter(price__gt=0).aexists()
+            return HttpResponse()
+
+        middleware = QueryCountMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+        self.assertEqual(response['X-Query-Count'], '2')
+
+    @override_settings(DATABASE_REPLICAS=['replica'], DB_REPLICA_PIN_SECONDS=5)
+    async def test_replica_routing_reaches_the_async_view(self):
+        seen = []
+
+        async def view(request):
+            seen.append(_state.get())
+            # Запись из потока sync_to_async видна состоянию запроса
+            await sync_to_async(PrimaryReplicaRouter().db_for_write)(Property)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+        self.assertTrue(seen[0].use_replica)
+        self.assertIn(ReplicaRoutingMiddleware.pin_cookie, response.cookies)
+        self.assertIsNone(_state.get())
+
+    async def test_profiling_samples_the_sync_to_async_thread(self):
+        def slow_sync_part():
+            time.sleep(0.05)
+
+        async def view(request):
+            await sync_to_async(slow_sync_part)()
+            return HttpResponse()
+
+        with tempfile.TemporaryDirectory() as profiles:
+            with self.settings(PROFILING_ENABLED=True, PROFILING_MODE='sample', PROFILING_DIR=profiles):
+                middleware = ProfilingMiddleware(view)
+                self.assertTrue(iscoroutinefunction(middleware))
+                response = await middleware(RequestFactory().get('/', headers={'X-Profile': '1'}))
+                self.assertIn('total;dur=', response['Server-Timing'])
+                with open(os.path.join(profiles, f"{response['X-Profile-Id']}.collapsed"), encoding='utf-8') as trace:
+                    self.assertIn('slow_sync_part', trace.read())
+
+
+class PropertyImportTests(APITestCase):
+    row = {
+        'external_ref': 'A-1', 'title': 'Flat', 'description': '-', 'location': 'Kyiv', 'price': '100',
+        'num_rooms': 2, 'property_type': 'apartment',
+    }
+
+    def test_reimport_updates_existing_rows(self):
+        report = import_properties(self.landlord.pk, [self.row, {**self.row, 'external_ref': 'A-2'}])
+        self.assertEqual((report.created, report.updated, report.failed), (2, 0, 0))
+
+        report = import_properties(self.landlord.pk, [{**self.row, 'price': '150'}])
+        self.assertEqual((report.created, report.updated), (0, 1))
+        self.assertEqual(Property.objects.filter(user=self.landlord).count(), 2)
+        self.assertEqual(Property.objects.get(external_ref='A-1').price, 150)
+
+    def test_missing_columns_keep_their_values(self):
+        property = self.create_property(
+            external_ref='A-1', is_active=False, available=False, latitude=49.84, longitude=24.03,
+        )
+        row = {**self.row, 'location': 'Lviv', 'price': '150', 'latitude': 49.84, 'longitude': 24.03}
+        import_properties(self.landlord.pk, [row])
+        property.refresh_from_db()
+        self.assertEqual(property.price, 150)
+        self.assertFalse(property.is_active)
+        self.assertFalse(property.available)
+
+        import_properties(self.landlord.pk, [{**self.row, 'is_active': True}])
+        property.refresh_from_db()
+        self.assertTrue(property.is_active)
+        self.assertFalse(property.available)
+
+    def test_bulk_endpoint_accepts_ndjson_and_csv(self):
+        client = self.client_for(self.landlord)
+        url = reverse('property-bulk')
+        ndjson = '\n'.join(json.dumps({**self.row, 'external_ref': ref}) for ref in ('A-1', 'A-2')) + '\nnot json\n'
+        response = client.post(url, ndjson, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(response.json()['errors'][0]['row'], 3)
+
+        # Пустая ячейка is_active не меняет значение
+        Property.objects.filter(external_ref='A-1').update(is_active=False)
+        body = 'external_ref,title,description,location,price,num_rooms,property_type,is_active\n'
+        body += 'A-1,Renamed,-,Kyiv,120,2,apartment,\n'
+        response = client.post(url, body, content_type='text/csv')
+        self.assertEqual((response.json()['created'], response.json()['updated']), (0, 1))
+        property = Property.objects.get(external_ref='A-1')
+        self.assertEqual((property.title, property.is_active), ('Renamed', False))
+
+    def test_tenants_cannot_import(self):
+        response = self.client_for(self.tenant).post(reverse('property-bulk'), [self.row], content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_rows_are_reported(self):
+        report = import_properties(self.landlord.pk, [self.row, {**self.row, 'external_ref': 'A-2', 'price': 'x'}, 'x'])
+        self.assertEqual((report.created, report.failed), (1, 2))
+        self.assertEqual([error['row'] for error in report.errors], [2, 3])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}})
+class SyntheticDataTests(APITestCase):
+    def test_generates_the_requested_data_set(self):
+        sizes = {
+            'landlords': 2, 'tenants': 5, 'properties': 20, 'bookings_per_property': 2,
+            'reviews': 10, 'views': 30, 'searches': 10,
+        }
+        generations = get_generations(['property', 'booking'])
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = SyntheticData(seed=1, batch_size=7).generate(**sizes)
+            # Кэш сбрасывается только после коммита транзакции генерации
+            self.assertEqual(get_generations(['property', 'booking']), generations)
+        self.assertNotEqual(get_generations(['property']), generations[:1])
+        self.assertNotEqual(get_generations(['booking']), generations[1:])
+
+        self.assertEqual((counts['landlords'], counts['tenants']), (2, 5))
+        self.assertEqual(Property.objects.count(), 20)
+        self.assertEqual(Booking.objects.count(), counts['bookings'])
+        self.assertEqual(Review.objects.count(), counts['reviews'])
+        # Агрегаты отзывов пересчитаны после генерации
+        rated = Property.objects.filter(rating_count__gt=0)
+        self.assertEqual(sum(rated.values_list('rating_count', flat=True)), counts['reviews'])
+
+    def test_same_seed_gives_the_same_listings(self):
+        columns = ('title', 'location', 'price', 'num_rooms', 'property_type')
+        SyntheticData(seed=3).generate(landlords=1, tenants=2, properties=10, reviews=0, views=0, searches=0)
+        first = list(Property.objects.order_by('pk').values_list(*columns))
+        SyntheticData(seed=3).generate(landlords=1, tenants=2, properties=10, reviews=0, views=0, searches=0)
+        self.assertEqual(list(Property.objects.order_by('pk').values_list(*columns))[10:], first)
+
+
+class BenchTests(APITestCase):
+    def test_percentile_interpolates(self):
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 90), 4.6)
+        self.assertIsNone(percentile([], 50))
+
+    def test_measure_counts_queries(self):
+        self.create_property()
+        result = measure(lambda: list(Property.objects.all()), iterations=5, warmup=1)
+        self.assertEqual(result['count'], 5)
+        self.assertEqual(result['queries_per_call'], 1)
+        self.assertLessEqual(result['p50_ms'], result['max_ms'])
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for price in (300, 100, 200, 100, 300, 100, 200):
+            self.create_property(price=price)
+
+    def test_keyset_chunks_follow_the_requested_ordering(self):
+        fields = ['id', 'title', 'price']
+        for ordering in (['-price'], ['price', '-created_at'], ['-id'], []):
+            with self.subTest(ordering=ordering):
+                queryset = Property.objects.order_by(*ordering)
+                keys = keyset_ordering(queryset)
+                self.assertEqual(keys[-1][0], 'id')
+                expected = list(queryset.order_by(*ordering, 'pk').values_list(*fields))
+                self.assertEqual(list(keyset_rows(queryset, fields, 2, keys)), expected)
+
+    def export(self, user, url):
+        response = self.client_for(user).get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export_of_own_properties(self):
+        other = CustomUser.objects.create_user(
+            email='other@example.com', username='other', password=None, is_landlord=True,
+        )
+        self.create_property(user=other)
+        url = reverse('property-export', args=['csv']) + '?ordering=price&fields=title,price'
+        response, body = self.export(self.landlord, url)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertRegex(response['Content-Disposition'], r'^attachment; filename="properties-\d{8}\.csv"$')
+        rows = list(csv.reader(body.splitlines()))
+        self.assertEqual(rows[0], ['id', 'title', 'price'])
+        self.assertEqual([row[2] for row in rows[1:]], ['100.00'] * 3 + ['200.00'] * 2 + ['300.00'] * 2)
+
+    def test_ndjson_export_counts_active_bookings(self):
+        property = Property.objects.order_by('pk').first()
+        for status, days in (('confirmed', 5), ('pending', 10), ('cancelled', 15)):
+            start, end = self.stay(days, 2)
+            Booking.objects.create(property=property, user=self.tenant, start_date=start, end_date=end, status=status)
+        response, body = self.export(self.landlord, reverse('property-export', args=['ndjson']))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = {row['id']: row for row in map(json.loads, body.splitlines())}
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[property.pk]['bookings_count'], 2)
+        self.assertEqual(rows[property.pk]['price'], '300.00')
+
+        _, body = self.export(self.tenant, reverse('booking-export', args=['ndjson']))
+        bookings = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual({booking['property__title'] for booking in bookings}, {property.title})
+        self.assertEqual(len(bookings), 3)
+
+    def test_tenants_cannot_export_properties(self):
+        response = self.client_for(self.tenant).get(reverse('property-export', args=['csv']))
+        self.assertEqual(response.status_code, 403)
+
+    def test_unsupported_ordering_is_rejected_on_mysql(self):
+        queryset = Property.objects.order_by('external_ref')
+        with mock.patch('rental.exports.connection') as connection:
+            connection.vendor = 'mysql'
+            with self.assertRaises(ValidationError):
+                iterate_rows(queryset, ['id'], 100)
+
+
+class SearchTests(APITestCase):
+    def test_backends_rank_title_matches_first(self):
+        title = self.create_property(title='Sunny loft', description='-')
+        description = self.create_property(title='Flat', description='A loft with a sunny balcony')
+        self.create_property(title='House', description='Garden')
+        for backend in (InvertedIndexBackend(), SQLiteFTS5Backend()):
+            with self.subTest(backend=type(backend).__name__):
+                hits = backend.search('sunny lof')
+                self.assertEqual([pk for pk, _ in hits], [title.pk, description.pk])
+                self.assertGreater(hits[0][1], hits[1][1])
+                # Слова запроса объединяются через AND
+                self.assertEqual(backend.search('sunny garden'), [])
+                matching = Property.objects.filter(pk__in=backend.matching_ids('loft'))
+                self.assertCountEqual(matching.values_list('pk', flat=True), [title.pk, description.pk])
+
+    def test_search_results_follow_the_rank(self):
+        description = self.create_property(title='Flat', description='A loft')
+        title = self.create_property(title='Loft', description='-')
+        response = self.client_for(self.tenant).get(reverse('property-list') + '?search=loft')
+        self.assertEqual([result['id'] for result in response.json()['results']], [title.pk, description.pk])
+
+    def test_available_filter_excludes_overlapping_bookings(self):
+        start, end = self.stay(10, 3)
+        free = self.create_property(title='Free')
+        busy = self.create_property(title='Busy')
+        adjacent = self.create_property(title='Adjacent')
+        cancelled = self.create_property(title='Cancelled')
+        Booking.objects.create(
+            property=busy, user=self.tenant, start_date=start + timedelta(days=2), end_date=end + timedelta(days=2),
+        )
+        # День выезда - день заезда следующего гостя
+        Booking.objects.create(property=adjacent, user=self.tenant, start_date=start - timedelta(days=3), end_date=start)
+        Booking.objects.create(property=cancelled, user=self.tenant, start_date=start, end_date=end, status='cancelled')
+
+        url = reverse('property-list') + f'?available_from={start}&available_to={end}'
+        results = self.walk(self.client_for(self.tenant), url)
+        self.assertCountEqual([result['id'] for result in results], [free.pk, adjacent.pk, cancelled.pk])
+        self.assertEqual(self.client_for(self.tenant).get(url.split('&')[0]).status_code, 400)
+
+    @override_settings(SEARCH_MAX_RESULTS=2)
+    def test_matches_beyond_the_ranking_cap_are_paged(self):
+        best = self.create_property(title='Loft loft loft', description='loft')
+        others = [self.create_property(title=f'Flat {i}', description='a loft nearby') for i in range(4)]
+        self.create_property(title='House', description='-')
+
+        results = self.walk(self.client_for(self.tenant), reverse('property-list') + '?search=loft&page_size=2')
+        ids = [result['id'] for result in results]
+        self.assertEqual(ids[0], best.pk)
+        self.assertEqual(sorted(ids), sorted([best.pk] + [other.pk for other in others]))
+
+
+@override_settings(VIEW_COUNTER_BUFFERED=True)
+class ViewCounterTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_property()
+        self.second = self.create_property()
+        self.counter = ViewCounter()
+        # Сбрасываем вручную, без фонового потока
+        patcher = mock.patch.object(self.counter, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def views(self):
+        return dict(Property.objects.values_list('pk', 'views_count'))
+
+    def test_flush_writes_the_buffered_total(self):
+        for property in (self.first, self.first, self.first, self.second):
+            self.counter.record(property.pk, self.tenant.pk)
+        self.assertEqual(self.counter.pending(), 4)
+        self.assertEqual(self.views(), {self.first.pk: 0, self.second.pk: 0})
+
+        self.assertEqual(self.counter.flush(), 4)
+        self.assertEqual(self.counter.pending(), 0)
+        self.assertEqual(self.views(), {self.first.pk: 3, self.second.pk: 1})
+        self.assertEqual(PropertyView.objects.filter(property=self.first).count(), 3)
+
+    def test_failed_flush_keeps_the_views(self):
+        self.counter.record(self.first.pk, self.tenant.pk)
+        self.counter.record(self.second.pk, self.tenant.pk)
+        with mock.patch.object(self.counter, '_write', side_effect=RuntimeError), self.assertLogs('rental.counters'):
+            self.assertEqual(self.counter.flush(), 0)
+        self.assertEqual(self.counter.pending(), 2)
+        self.assertEqual(self.counter.flush(), 2)
+        self.assertEqual(self.views(), {self.first.pk: 1, self.second.pk: 1})
+
+    @override_settings(VIEW_COUNTER_BUFFERED=False)
+    def test_increment_view_endpoint(self):
+        response = self.client_for(self.tenant).post(reverse('property-increment-view', args=[self.first.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.views_count, 1)
+
+
+class PropertyListTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.properties = [self.create_property(title=f'Flat {price}', price=price) for price in (300, 100, 200, 100, 250)]
+
+    def test_cursor_pages_with_sparse_fields(self):
+        client = self.client_for(self.tenant)
+        results = self.walk(client, reverse('property-list') + '?fields=id,title&ordering=price&page_size=2')
+        self.assertEqual({tuple(result) for result in results}, {('id', 'title')})
+        # Порядок одинаковых цен не задан: проверяем цены и что каждый объект выдан ровно раз
+        prices = {property.pk: property.price for property in self.properties}
+        ids = [result['id'] for result in results]
+        self.assertCountEqual(ids, prices)
+        self.assertEqual([prices[pk] for pk in ids], sorted(prices.values()))
+
+    def test_new_rows_do_not_shift_later_pages(self):
+        client = self.client_for(self.tenant)
+        page = client.get(reverse('property-list') + '?page_size=2').json()
+        self.create_property(title='Newest')
+        results = page['results'] + self.walk(client, page['next'])
+        newest_first = sorted(self.properties, key=lambda property: (property.created_at, property.pk), reverse=True)
+        self.assertEqual([result['id'] for result in results], [property.pk for property in newest_first])
+
+
+class IndexTests(APITestCase):
+    def plans(self):
+        return {name: explain(queryset) for name, queryset in query_shapes()}
+
+    def test_hot_queries_do_not_scan_tables(self):
+        for name, plan in self.plans().items():
+            with self.subTest(name):
+                self.assertNotIn('FULL SCAN', [severity for severity, _ in find_scans(plan)])
+        call_command('explain_queries', '--fail-on-scan', stdout=StringIO())
+
+    def test_overlap_check_uses_the_composite_index(self):
+        plan = self.plans()['bookings: overlap check']
+        self.assertIn('booking_property_dates_idx', ' '.join(step['detail'] for step in plan))
+
+    def test_full_scan_is_reported(self):
+        plan = explain(Property.objects.filter(description='-'))
+        self.assertEqual([severity for severity, _ in find_scans(plan)], ['FULL SCAN'])
+
+
+class RatingAggregateTests(APITestCase):
+    fields = ('rating_avg', 'rating_count', 'rating_sum', *HISTOGRAM_FIELDS)
+
+    def snapshot(self):
+        return list(Property.objects.order_by('pk').values_list('pk', *self.fields))
+
+    def assertMatchesRebuild(self):
+        live = self.snapshot()
+        rebuild_aggregates()
+        self.assertEqual(live, self.snapshot())
+        return live
+
+    def test_review_changes_match_rebuild(self):
+        first = self.create_property()
+        second = self.create_property()
+        review = Review.objects.create(property=first, user=self.tenant, rating=5, comment='-')
+        Review.objects.create(property=first, user=self.tenant, rating=2, comment='-')
+        self.assertMatchesRebuild()
+        first.refresh_from_db()
+        self.assertEqual((first.rating_count, first.rating_avg, first.rating_5, first.rating_2), (2, Decimal('3.50'), 1, 1))
+
+        review.rating = 4
+        review.save()
+        self.assertMatchesRebuild()
+        review.property = second
+        review.save()
+        self.assertMatchesRebuild()
+        review.delete()
+        live = self.assertMatchesRebuild()
+        self.assertEqual(live[1][1:], (Decimal('0.00'), 0, 0, 0, 0, 0, 0, 0))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'responses'}})
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.property = self.create_property()
+        self.tenant_client = self.client_for(self.tenant)
+        self.url = reverse('property-list')
+
+    def test_second_request_is_served_from_the_cache(self):
+        first = self.tenant_client.get(self.url + '?fields=id,title')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        # Порядок полей в ?fields= не влияет на ключ
+        second = self.tenant_client.get(self.url + '?fields=title,id')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.tenant_client.get(self.url)['ETag']
+        response = self.tenant_client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_write_bumps_the_generation_after_commit(self):
+        etag = self.tenant_client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.property.title = 'Renamed'
+            self.property.save()
+            # До коммита кэш отдаёт прежний ответ
+            self.assertEqual(self.tenant_client.get(self.url)['X-Cache'], 'HIT')
+        for callback in callbacks:
+            callback()
+
+        response = self.tenant_client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['title'], 'Renamed')
+
+
+class LoginTests(APITestCase):
+    password = 'login-password-1'
+
+    def login(self, email='tenant@example.com'):
+        return Client().post(reverse('login'), {'email': email, 'password': self.password})
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_login_issues_one_token_pair(self):
+        self.tenant.set_password(self.password)
+        self.tenant.save()
+        with mock.patch.object(views, 'issue_tokens', wraps=issue_tokens) as issue:
+            # Домен email нормализуется так же, как при регистрации
+            response = self.login('tenant@EXAMPLE.com')
+        self.assertEqual(response.status_code, 200)
+        issue.assert_called_once()
+        self.assertEqual(response.cookies['access_token'].value, response.json()['access'])
+        client = Client(headers={'Authorization': f"Bearer {response.json()['access']}"})
+        self.assertEqual(client.get(reverse('booking-list')).status_code, 200)
+
+    def test_changed_hash_cost_is_applied_on_login(self):
+        with self.settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.tenant.set_password(self.password)
+            self.tenant.save()
+        self.assertTrue(self.tenant.password.startswith('pbkdf2_sha256$1000$'))
+        token_client = self.client_for(self.tenant)
+
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+        self.tenant.refresh_from_db()
+        self.assertTrue(self.tenant.password.startswith('pbkdf2_sha256$2000$'))
+        # Перехэширование того же пароля не отзывает выданные токены
+        self.assertEqual(token_client.get(reverse('booking-list')).status_code, 200)
+
+    def test_wrong_password_is_rejected(self):
+        self.tenant.set_password(self.password)
+        self.tenant.save()
+        response = Client().post(reverse('login'), {'email': 'tenant@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ASYNC_API_FANOUT=False)
+class AsyncAPITests(APITestCase):
+    # Пул потоков gather_queries открывает свои соединения и не видит транзакцию теста
+
+    def setUp(self):
+        super().setUp()
+        self.properties = [self.create_property(title=f'Flat {i}') for i in range(5)]
+        start, end = self.stay(5, 2)
+        self.booking = Booking.objects.create(
+            property=self.properties[0], user=self.tenant, start_date=start, end_date=end,
+        )
+        self.auth = {'Authorization': f'Bearer {issue_tokens(self.tenant).access_token}'}
+
+    async def walk_async(self, url):
+        client = AsyncClient()
+        results, params = [], {'page_size': 2}
+        while True:
+            response = await client.get(url, params, headers=self.auth)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            results += page['results']
+            if not page['next_cursor']:
+                return results
+            params['cursor'] = page['next_cursor']
+
+    async def test_property_list_matches_the_sync_endpoint(self):
+        results = await self.walk_async(reverse('async-property-list'))
+        sync = await sync_to_async(lambda: self.walk(self.client_for(self.tenant), reverse('property-list')))()
+        self.assertEqual(results, sync)
+
+    async def test_property_detail_includes_busy_dates(self):
+        property = self.properties[0]
+        response = await AsyncClient().get(reverse('async-property-detail', args=[property.pk]), headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['id'], property.pk)
+        self.assertEqual(data['busy'], [[self.booking.start_date.isoformat(), self.booking.end_date.isoformat()]])
+        missing = await AsyncClient().get(reverse('async-property-detail', args=[0]), headers=self.auth)
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_bookings_are_limited_to_the_user(self):
+        results = await self.walk_async(reverse('async-booking-list'))
+        self.assertEqual([result['id'] for result in results], [self.booking.pk])
+
+    async def test_requires_authentication_and_read_only_methods(self):
+        url = reverse('async-property-list')
+        self.assertEqual((await AsyncClient().get(url)).status_code, 401)
+        self.assertEqual((await AsyncClient().post(url, headers=self.auth)).status_code, 405)
+
+
+@override_settings(INGEST_BUFFERED=True)
+class IngestTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        # Пачки пишутся вручную через flush(), без фонового потока
+        patcher = mock.patch.object(EventIngestor, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Очередь общая для процесса: не оставляем в ней события теста
+        self.addCleanup(search_history_events._take, 10 ** 6)
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        self.spool_dir = spool.name
+
+    def test_create_is_accepted_and_written_by_flush(self):
+        response = self.client_for(self.tenant).post(reverse('search-history-list'), {'keyword': 'loft'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'accepted': 1})
+        self.assertFalse(SearchHistory.objects.exists())
+
+        self.assertEqual(search_history_events.flush(), 1)
+        self.assertEqual(list(SearchHistory.objects.values_list('user_id', 'keyword')), [(self.tenant.pk, 'loft')])
+
+    def test_full_queue_answers_service_unavailable(self):
+        client = self.client_for(self.tenant)
+        with self.settings(INGEST_QUEUE_SIZE=1, INGEST_ENQUEUE_TIMEOUT=0):
+            response = client.post(
+                reverse('search-history-bulk'), [{'keyword': 'a'}, {'keyword': 'b'}], content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(search_history_events.pending(), 0)
+
+    def test_failed_batch_is_spooled_and_replayed(self):
+        ingestor = EventIngestor(SearchHistory, 'created_at')
+        with self.settings(INGEST_SPOOL_DIR=self.spool_dir):
+            ingestor.submit([{'user_id': self.tenant.pk, 'keyword': keyword} for keyword in ('loft', 'flat')])
+            accepted_at = ingestor._pending[0]['created_at']
+            with mock.patch.object(SearchHistory.objects, 'bulk_create', side_effect=RuntimeError):
+                with self.assertLogs('rental.ingest'):
+                    self.assertEqual(ingestor.flush(), 0)
+            self.assertEqual(len(os.listdir(self.spool_dir)), 1)
+            self.assertFalse(SearchHistory.objects.exists())
+
+            # Следующая попытка после INGEST_RETRY_INTERVAL
+            ingestor._retry_at = 0
+            self.assertEqual(ingestor.flush(), 2)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+        self.assertCountEqual(
+            SearchHistory.objects.values_list('keyword', 'created_at'), [('loft', accepted_at), ('flat', accepted_at)],
+        )
+        self.assertEqual(ingestor.stats()['replayed'], 2)
+
+
+class RetentionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.property = self.create_property()
+        self.today = timezone.localdate()
+
+    def add_views(self, days_ago, count):
+        viewed_at = timezone.now() - timedelta(days=days_ago)
+        PropertyView.objects.bulk_create([
+            PropertyView(property=self.property, user=self.tenant, viewed_at=viewed_at) for _ in range(count)
+        ])
+
+    def apply_retention(self):
+        call_command('apply_retention', view_days=30, search_days=30, chunk_size=2, stdout=StringIO())
+
+    def report(self):
+        start, end = self.today - timedelta(days=60), self.today + timedelta(days=1)
+        return daily_views(self.property.pk, start, end), top_keywords(start, end, 10)
+
+    def test_rollup_keeps_the_reports_and_is_idempotent(self):
+        self.add_views(40, 3)
+        self.add_views(45, 1)
+        self.add_views(1, 2)
+        SearchHistory.objects.bulk_create([
+            SearchHistory(user=self.tenant, keyword=keyword, created_at=timezone.now() - timedelta(days=days_ago))
+            for keyword, days_ago in (('Loft ', 40), ('loft', 41), ('house', 1))
+        ])
+        before = self.report()
+
+        self.apply_retention()
+        self.assertEqual(self.report(), before)
+        self.assertEqual(PropertyView.objects.count(), 2)
+        self.assertEqual(SearchHistory.objects.count(), 1)
+        # Ключевые слова нормализуются: 'Loft ' и 'loft' - одно слово (разные дни)
+        self.assertEqual(list(SearchKeywordDaily.objects.values_list('keyword', 'searches')), [('loft', 1), ('loft', 1)])
+
+        # Повторный запуск ничего не меняет
+        rolled = sorted(PropertyViewDaily.objects.values_list('day', 'views'))
+        self.apply_retention()
+        self.assertEqual(sorted(PropertyViewDaily.objects.values_list('day', 'views')), rolled)
+        self.assertEqual(self.report(), before)
+
+        # Поздние события за уже свёрнутый день добавляются к агрегату
+        self.add_views(40, 2)
+        self.apply_retention()
+        views = dict(PropertyViewDaily.objects.values_list('day', 'views'))
+        self.assertEqual(views[timezone.localdate(timezone.now() - timedelta(days=40))], 5)
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_property()
+        profiles = tempfile.TemporaryDirectory()
+        self.addCleanup(profiles.cleanup)
+        self.profiles = profiles.name
+
+    def get(self, mode, **headers):
+        with self.settings(PROFILING_ENABLED=True, PROFILING_MODE=mode, PROFILING_DIR=self.profiles):
+            # Цепочка middleware собирается заново с новыми настройками
+            return self.client_for(self.tenant).get(reverse('property-list'), headers=headers)
+
+    def test_requests_without_the_header_are_not_profiled(self):
+        response = self.get('sample')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(os.listdir(self.profiles), [])
+
+    def test_cprofile_trace_and_phases(self):
+        response = self.get('cprofile', **{'X-Profile': '1'})
+        self.assertEqual(os.listdir(self.profiles), [f"{response['X-Profile-Id']}.prof"])
+        phases = [timing.split(';')[0] for timing in response['Server-Timing'].split(', ')]
+        self.assertIn('orm', phases)
+        self.assertEqual(phases[-1], 'total')
+
+    def test_sampling_writes_collapsed_stacks(self):
+        response = self.get('sample', **{'X-Profile': '1'})
+        with open(os.path.join(self.profiles, f"{response['X-Profile-Id']}.collapsed"), encoding='utf-8') as trace:
+            lines = trace.read().splitlines()
+        # "кадр;кадр;... число" - формат flamegraph.pl
+        for line in lines:
+            self.assertRegex(line, r'^\S.* \d+$')
+
+    def test_request_without_samples_writes_an_empty_trace(self):
+        with override_settings(PROFILING_INTERVAL=60):
+            response = self.get('sample', **{'X-Profile': '1'})
+        with open(os.path.join(self.profiles, f"{response['X-Profile-Id']}.collapsed"), encoding='utf-8') as trace:
+            self.assertEqual(trace.read(), '')
+
+    def test_phase_is_taken_from_the_deepest_matching_frame(self):
+        self.assertEqual(classify('/site-packages/django/db/models/query.py', '__iter__'), 'orm')
+        self.assertEqual(classify('/rental/serializers.py', 'to_representation'), 'serialization')
+        self.assertEqual(classify('/rental/views.py', 'get_queryset'), None)
+
+
+class GeoTests(APITestCase):
+    center = (50.4501, 30.5234)
+
+    def place(self, latitude, longitude):
+        return self.create_property(location='-', latitude=latitude, longitude=longitude)
+
+    def scatter(self, count, spread):
+        generator = random.Random(18)
+        return [
+            self.place(self.center[0] + generator.uniform(-spread, spread), self.center[1] + generator.uniform(-spread, spread))
+            for _ in range(count)
+        ]
+
+    def test_radius_matches_brute_force(self):
+        properties = self.scatter(300, 0.5)
+        for radius in (1, 7.5, 25):
+            with self.subTest(radius=radius):
+                found = within_radius(Property.objects.all(), *self.center, radius)
+                expected = {p.pk for p in properties if haversine_km(*self.center, p.latitude, p.longitude) <= radius}
+                self.assertEqual(set(found.values_list('pk', flat=True)), expected)
+
+    def test_radius_edge(self):
+        km_per_degree = EARTH_RADIUS_KM * math.pi / 180
+        inside = self.place(self.center[0] + 9.99 / km_per_degree, self.center[1])
+        self.place(self.center[0] - 10.01 / km_per_degree, self.center[1])
+        found = within_radius(Property.objects.all(), *self.center, 10)
+        self.assertEqual(list(found.values_list('pk', flat=True)), [inside.pk])
+        self.assertAlmostEqual(found.get().distance_km, 9.99, places=3)
+
+    def test_large_radius_keeps_points_near_the_circle(self):
+        # Точки на 0.999 радиуса по 16 направлениям, включая крайние по долготе
+        radius = 400
+        angular = 0.999 * radius / EARTH_RADIUS_KM
+        lat, lng = map(math.radians, self.center)
+        points = []
+        for step in range(16):
+            bearing = 2 * math.pi * step / 16
+            lat2 = math.asin(math.sin(lat) * math.cos(angular) + math.cos(lat) * math.sin(angular) * math.cos(bearing))
+            lng2 = lng + math.atan2(
+                math.sin(bearing) * math.sin(angular) * math.cos(lat), math.cos(angular) - math.sin(lat) * math.sin(lat2),
+            )
+            points.append(self.place(math.degrees(lat2), math.degrees(lng2)))
+        found = within_radius(Property.objects.all(), *self.center, radius)
+        self.assertCountEqual(found.values_list('pk', flat=True), [point.pk for point in points])
+
+    def test_bbox_includes_its_edges(self):
+        properties = self.scatter(200, 0.5)
+        bounds = (50.2, 30.3, 50.6, 30.9)
+        corner = self.place(50.2, 30.9)
+        self.place(50.2 - 1e-6, 30.9)
+        expected = {corner.pk} | {
+            p.pk for p in properties if bounds[0] <= p.latitude <= bounds[2] and bounds[1] <= p.longitude <= bounds[3]
+        }
+        found = within_bbox(Property.objects.all(), *bounds)
+        self.assertEqual(set(found.values_list('pk', flat=True)), expected)
+
+    def test_near_results_are_ordered_by_distance(self):
+        self.scatter(30, 0.2)
+        client = self.client_for(self.tenant)
+        results = self.walk(client, reverse('property-list') + '?near=50.4501,30.5234&radius_km=15&page_size=7')
+        distances = [haversine_km(*self.center, result['latitude'], result['longitude']) for result in results]
+        self.assertTrue(results)
+        self.assertEqual(distances, sorted(distances))
+        self.assertEqual(client.get(reverse('property-list') + '?radius_km=5').status_code, 400)
+
+
+class FacetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        generator = random.Random(19)
+        self.properties = [
+            self.create_property(
+                price=generator.choice([200, 499.99, 500, 999, 1000, 2500, 5000, 8000]),
+                num_rooms=generator.randint(1, 7),
+                property_type=generator.choice(['apartment', 'house']),
+                location=generator.choice(['Kyiv', 'Lviv']),
+            )
+            for _ in range(60)
+        ]
+
+    def expected(self, properties):
+        # Подсчёт в Python по тем же корзинам
+        counts = {}
+        for name, buckets in FACETS.items():
+            counts[name] = []
+            for value, _, condition in buckets:
+                matching = Property.objects.filter(condition, pk__in=[p.pk for p in properties])
+                counts[name].append((value, matching.count()))
+        return counts
+
+    def test_counts_follow_the_filters_not_the_page(self):
+        url = reverse('property-list') + '?facets=1&page_size=5&location=Kyiv&price__gte=500&num_rooms__lte=4'
+        response = self.client_for(self.tenant).get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+        facets = {
+            name: [(bucket['value'], bucket['count']) for bucket in buckets]
+            for name, buckets in response.json()['facets'].items()
+        }
+        filtered = [p for p in self.properties if p.location == 'Kyiv' and p.price >= 500 and p.num_rooms <= 4]
+        self.assertEqual(facets, self.expected(filtered))
+        self.assertEqual(sum(count for _, count in facets['property_type']), len(filtered))
+        self.assertEqual(sum(count for _, count in facets['price']), len(filtered))
+
+    def test_price_bands_are_half_open(self):
+        response = self.client_for(self.tenant).get(reverse('property-list') + '?facets=price')
+        bands = {band['value']: band['count'] for band in response.json()['facets']['price']}
+        self.assertEqual(list(response.json()['facets']), ['price'])
+        self.assertEqual(bands['0-500'], sum(1 for p in self.properties if p.price < 500))
+        self.assertEqual(bands['5000+'], sum(1 for p in self.properties if p.price >= 5000))
+
+    def test_unknown_facet_is_rejected(self):
+        response = self.client_for(self.tenant).get(reverse('property-list') + '?facets=price,color')
+        self.assertEqual(response.status_code, 400)
+
+
+class RecommendationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        generator = random.Random(20)
+        self.properties = [self.create_property(title=f'Flat {i}') for i in range(12)]
+        users = CustomUser.objects.bulk_create(
+            CustomUser(email=f'viewer{i}@example.com', username=f'viewer{i}') for i in range(40)
+        )
+        # У каждого зрителя свои «любимые» объекты, чтобы близости различались
+        self.views = {
+            (user.pk, property.pk)
+            for user in users
+            for property in self.properties
+            if generator.random() < 0.15 + 0.05 * ((property.pk + user.pk) % 4)
+        }
+        PropertyView.objects.bulk_create(PropertyView(user_id=u, property_id=p) for u, p in self.views)
+
+    def brute_force(self, min_support):
+        # Плотная косинусная близость объектов по совместным просмотрам
+        users = sorted({u for u, _ in self.views})
+        items = sorted({p for _, p in self.views})
+        viewed = np.zeros((len(users), len(items)))
+        for u, p in self.views:
+            viewed[users.index(u), items.index(p)] = 1
+        coviews = viewed.T @ viewed
+        np.fill_diagonal(coviews, 0)
+        coviews[coviews < min_support] = 0
+        counts = viewed.sum(axis=0)
+        return items, coviews / np.sqrt(np.outer(counts, counts))
+
+    def test_neighbors_keep_the_top_k_scores(self):
+        RecommendationBuilder(top_k=3, min_support=2).build()
+        items, similarity = self.brute_force(2)
+        for row, property_id in enumerate(items):
+            with self.subTest(property=property_id):
+                stored = list(
+                    PropertyNeighbor.objects.filter(property_id=property_id)
+                    .order_by('-score').values_list('score', flat=True)
+                )
+                expected = sorted(similarity[row][similarity[row] > 0], reverse=True)[:3]
+                self.assertEqual(len(stored), len(expected))
+                np.testing.assert_allclose(stored, expected, rtol=1e-5)
+
+    def test_recommend_returns_limit_best_neighbors(self):
+        RecommendationBuilder(top_k=5, min_support=2).build()
+        seed = self.properties[0]
+        PropertyView.objects.create(user=self.tenant, property=seed)
+        scores = dict(PropertyNeighbor.objects.filter(property=seed).values_list('neighbor_id', 'score'))
+        self.assertGreater(len(scores), 2)
+
+        properties, source = recommend(self.tenant.pk, 2)
+        self.assertEqual(source, 'personal')
+        self.assertEqual(len(properties), 2)
+        self.assertNotIn(seed, properties)
+        self.assertEqual(
+            [scores[property.pk] for property in properties], sorted(scores.values(), reverse=True)[:2],
+        )
+
+    def test_short_personal_list_is_filled_with_popular(self):
+        RecommendationBuilder(top_k=2, min_support=2).build()
+        PropertyView.objects.create(user=self.tenant, property=self.properties[0])
+        response = self.client_for(self.tenant).get(reverse('property-recommended') + '?limit=6')
+        self.assertEqual(response.status_code, 200)
+        ids = [property['id'] for property in response.json()['results']]
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(len(set(ids)), 6)
+        self.assertNotIn(self.properties[0].pk, ids)
+        self.assertEqual(response.json()['source'], 'personal')
+
+    def test_limit_must_be_an_integer(self):
+        response = self.client_for(self.tenant).get(reverse('property-recommended') + '?limit=many')
+        self.assertEqual(response.status_code, 400)
+
+
+# TestCase держит тест в транзакции, а там router всегда читает с primary
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        patcher = mock.patch.object(replica_health, 'healthy', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_safe_request_reads_from_replica(self):
+        with routing(True) as state:
+            self.assertEqual(self.router.db_for_read(Property), 'replica')
+            self.assertEqual(state.replica, 'replica')
+
+    def test_writes_go_to_primary_and_pin_later_reads(self):
+        with routing(True) as state:
+            self.assertEqual(self.router.db_for_read(Property), 'replica')
+            self.assertEqual(self.router.db_for_write(Property), 'default')
+            self.assertTrue(state.wrote)
+            self.assertEqual(self.router.db_for_read(Property), 'default')
+
+    def test_reads_inside_atomic_use_primary(self):
+        with routing(True):
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(Property), 'default')
+            self.assertEqual(self.router.db_for_read(Property), 'replica')
+
+    def test_use_primary_block(self):
+        with routing(True):
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(Property), 'default')
+            self.assertEqual(self.router.db_for_read(Property), 'replica')
+
+    def test_unsafe_request_and_no_request_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Property), 'default')
+        self.assertEqual(self.router.db_for_write(Property), 'default')
+        with routing(False):
+            self.assertEqual(self.router.db_for_read(Property), 'default')
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        replica_health.healthy.return_value = False
+        with routing(True) as state:
+            self.assertEqual(self.router.db_for_read(Property), 'default')
+            self.assertIsNone(state.replica)
+
+
+class PriceStatsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        generator = random.Random(23)
+        self.properties = [
+            self.create_property(
+                price=Decimal(generator.randint(5000, 900000)) / 100,
+                num_rooms=generator.randint(1, 6),
+                property_type=generator.choice(['apartment', 'house']),
+                location=generator.choice(['Kyiv', 'Lviv', 'Odesa']),
+            )
+            for _ in range(120)
+        ]
+
+    def get(self, query):
+        return self.client_for(self.tenant).get(reverse('property-price-stats') + query)
+
+    def test_matches_numpy_on_the_filtered_subset(self):
+        response = self.get('?location=Kyiv&property_type=house&num_rooms__gte=2&price__lte=7000&bins=7')
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        prices = np.array([
+            float(p.price) for p in self.properties
+            if p.location == 'Kyiv' and p.property_type == 'house' and p.num_rooms >= 2 and p.price <= 7000
+        ])
+        self.assertGreater(prices.size, 5)
+        self.assertEqual(stats['count'], prices.size)
+        self.assertEqual((stats['min'], stats['max']), (prices.min(), prices.max()))
+        self.assertAlmostEqual(stats['mean'], prices.mean(), places=2)
+        self.assertEqual(
+            list(stats['quantiles'].values()), np.round(np.quantile(prices, QUANTILES), 2).tolist(),
+        )
+        counts, edges = np.histogram(prices, bins=7)
+        self.assertEqual([bucket['count'] for bucket in stats['histogram']], counts.tolist())
+        self.assertEqual(stats['histogram'][0]['min'], round(edges[0], 2))
+        self.assertEqual(stats['histogram'][-1]['max'], round(edges[-1], 2))
+
+    def test_single_price_is_one_bucket(self):
+        price = float(self.properties[0].price)
+        stats = self.get(f'?price__gte={price}&price__lte={price}').json()
+        self.assertEqual(stats['histogram'], [{'min': price, 'max': price, 'count': stats['count']}])
+        self.assertEqual(set(stats['quantiles'].values()), {price})
+
+    def test_empty_subset(self):
+        stats = self.get('?location=Nowhere').json()
+        self.assertEqual((stats['count'], stats['min'], stats['histogram']), (0, None, []))
+
+    def test_snapshot_is_reused_until_refreshed(self):
+        count = self.get('').json()['count']
+        self.create_property(price=50)
+        self.assertEqual(self.get('').json()['count'], count)
+        price_stats.refresh()
+        self.assertEqual(self.get('').json()['count'], count + 1)
+
+    def test_invalid_parameters(self):
+        for query in ('?bins=0', '?bins=1000', '?bins=x', '?price__gte=cheap', '?property_type=castle'):
+            with self.subTest(query=query):
+                self.assertEqual(self.get(query).status_code, 400)
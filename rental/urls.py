@@ -1,9 +1,11 @@
 # rental/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     PropertyViewSet, RegisterView, LoginView, BookingViewSet,
-    ReviewViewSet, SearchHistoryViewSet, PropertyViewViewSet, GroupViewSet
+    ReviewViewSet, SearchHistoryViewSet, PropertyViewViewSet, GroupViewSet,
+    ResponseCacheStatsView, IngestStatsView, LandlordStatsView
 )
 
 router = DefaultRouter()
@@ -17,5 +19,15 @@ router.register(r'property-views', PropertyViewViewSet, basename='property-views
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
+    path('cache-stats/', ResponseCacheStatsView.as_view(), name='cache-stats'),
+    path('ingest-stats/', IngestStatsView.as_view(), name='ingest-stats'),
+    path('landlord/stats/', LandlordStatsView.as_view(), name='landlord-stats'),
+    # Асинхронные read-only эндпоинты (ASGI)
+    path('async/properties/', async_views.property_list, name='async-property-list'),
+    path('async/properties/<int:pk>/', async_views.property_detail, name='async-property-detail'),
+    path('async/properties/<int:property_pk>/reviews/', async_views.review_list, name='async-property-reviews'),
+    path('async/properties/<int:property_pk>/reviews/<int:pk>/', async_views.review_detail, name='async-property-review-detail'),
+    path('async/bookings/', async_views.booking_list, name='async-booking-list'),
+    path('async/bookings/<int:pk>/', async_views.booking_detail, name='async-booking-detail'),
     path('', include(router.urls)),  # Подключение всех маршрутов от router без дублирования
 ]
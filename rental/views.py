@@ -1,21 +1,87 @@
 from rest_framework import viewsets, generics, permissions, filters
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Property, CustomUser, Booking, Review, SearchHistory, PropertyView
+from .counters import view_counter
+from .ingest import IngestCreateMixin, ingestors, property_view_events, search_history_events
 from .serializers import (
     PropertySerializer, RegisterSerializer, LoginSerializer,
     BookingSerializer, ReviewSerializer, SearchHistorySerializer,
-    PropertyViewSerializer, GroupSerializer, UserSerializer
+    PropertyViewSerializer, GroupSerializer, UserSerializer, requested_fields
 )
+from .pagination import CreatedAtCursorPagination, PropertyCursorPagination, ViewedAtCursorPagination
+from .filters import BookingFilter, PropertyFilter, PropertySearchFilter
+from .availability import BookingConflict, IntervalIndex, VersionConflict, claim_version, reserve
+from .cache import CachedResponseMixin, stats as response_cache_stats
+from .authentication import issue_tokens
+from .recommendations import recommend
+from .retention import daily_views, top_keywords
+from .exports import ExportMixin
+from .facets import FacetMixin
+from .fast_serializers import FastListMixin
+from .idempotency import IdempotentCreateMixin
+from .imports import CSVParser, NDJSONParser, import_properties
+from .landlord_stats import summary as landlord_summary
+from .price_stats import parse_filters as parse_price_filters, price_stats as price_snapshot
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from django.contrib.auth.models import Group
 from rest_framework import status
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
+from datetime import date, timedelta
 from rest_framework import serializers
 
 
+class SparseFieldsetViewMixin:
+    # При ?fields= загружаем из БД только запрошенные колонки
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = requested_fields(self.request)
+        if fields and self.request.method in ('GET', 'HEAD'):
+            queryset = queryset.only(*self.get_serializer_class().sparse_columns(fields | self.get_ordering_fields()))
+        return queryset
+
+    def get_ordering_fields(self):
+        # Пагинатору нужны значения полей сортировки для построения курсора
+        ordering = self.request.query_params.get('ordering')
+        if ordering:
+            names = ordering.split(',')
+        else:
+            names = getattr(self.pagination_class, 'ordering', None) or ()
+        return {name.strip().lstrip('-') for name in names}
+
+
+def date_range(params, default_start, default_days):
+    # Полуинтервал [from, to) из параметров запроса
+    try:
+        start = date.fromisoformat(params['from']) if 'from' in params else default_start
+        end = date.fromisoformat(params['to']) if 'to' in params else start + timedelta(days=default_days)
+    except ValueError:
+        raise serializers.ValidationError("Dates must be in YYYY-MM-DD format.")
+    if start >= end:
+        raise serializers.ValidationError("'to' must be after 'from'.")
+    return start, end
+
+
+def expected_version(request):
+    raw = request.headers.get('If-Match', '').strip()
+    if raw.startswith('W/'):
+        raw = raw[2:]
+    raw = raw.strip('"') or (request.data.get('version') if hasattr(request.data, 'get') else None)
+    if raw in (None, '', '*'):
+        return None
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({'version': ['A valid integer is required.']})
+
+
 class GroupViewSet(viewsets.ModelViewSet):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
@@ -44,18 +110,21 @@ class LoginView(APIView):
         serializer = LoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
+        refresh = issue_tokens(user)
+
+        access = str(refresh.access_token)
 
         # Создаем ответ с токенами
         response = Response({
-            'access': str(refresh.access_token),
+            'access': access,
             'refresh': str(refresh),
+            'user': UserSerializer(user).data,
         })
 
         # Сохраняем access токен в куки
         response.set_cookie(
             key='access_token',
-            value=str(refresh.access_token),
+            value=access,
             httponly=True,  # Защита от доступа через JavaScript
             secure=False,  # Установите True для HTTPS в production
             samesite='Lax',  # Защита от CSRF в браузере
@@ -69,81 +138,183 @@ class IsLandlord(permissions.BasePermission):
         return request.user and request.user.is_landlord
 
 
-class PropertyViewSet(viewsets.ModelViewSet):
+class PropertyViewSet(CachedResponseMixin, FastListMixin, FacetMixin, ExportMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Property.objects.all()
     serializer_class = PropertySerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-
-    filterset_fields = {
-        'price': ['gte', 'lte'],
-        'location': ['exact', 'icontains'],
-        'num_rooms': ['gte', 'lte'],
-        'property_type': ['exact'],
-    }
+    pagination_class = PropertyCursorPagination
+    filter_backends = [DjangoFilterBackend, PropertySearchFilter, filters.OrderingFilter]
+
+    filterset_class = PropertyFilter
     search_fields = ['title', 'description']
-    ordering_fields = ['price', 'created_at', 'views_count']
+    ordering_fields = ['price', 'created_at', 'views_count', 'rating_avg', 'rating_count']
+    cache_tables = ('property',)
+    export_name = 'properties'
+    export_fields = (
+        'id', 'title', 'location', 'price', 'num_rooms', 'property_type', 'is_active', 'available', 'created_at',
+        'views_count', 'rating_avg', 'rating_count', 'bookings_count',
+    )
+
+    def get_cache_tables(self):
+        # Фильтр свободных дат зависит ещё и от бронирований
+        if 'available_from' in self.request.query_params:
+            return self.cache_tables + ('booking',)
+        return self.cache_tables
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'export', 'bulk']:
             self.permission_classes = [permissions.IsAuthenticated, IsLandlord]
         else:
             self.permission_classes = [permissions.IsAuthenticated]
         return super(PropertyViewSet, self).get_permissions()
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.pk)
+
+    def get_export_queryset(self):
+        # Выгрузка - только своих объектов, со статистикой бронирований
+        return super().get_export_queryset().filter(user_id=self.request.user.pk).annotate(
+            bookings_count=Count('booking', filter=~Q(booking__status='cancelled')),
+        )
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser, CSVParser])
+    def bulk(self, request):
+        # JSON-массив, NDJSON или CSV; объекты создаются или обновляются по external_ref
+        rows = request.data
+        if isinstance(rows, dict):
+            raise serializers.ValidationError({'non_field_errors': ['Expected a list of properties.']})
+        report = import_properties(request.user.pk, rows)
+        return Response(report.as_dict())
+
+    @action(detail=True, methods=['get'])
+    def availability(self, request, pk=None):
+        property = self.get_object()
+        start, end = date_range(request.query_params, timezone.localdate(), 90)
+        index = IntervalIndex.for_range(start, end, [property.pk])
+        return Response({
+            'property': property.pk,
+            'from': start,
+            'to': end,
+            'busy': index.busy(property.pk, start, end),
+            'free': index.free_ranges(property.pk, start, end),
+        })
+
+    @action(detail=True, methods=['get'])
+    def view_stats(self, request, pk=None):
+        property = self.get_object()
+        if property.user_id != request.user.pk and not request.user.is_staff:
+            raise PermissionDenied("Only the owner can see view statistics.")
+        start, end = date_range(request.query_params, timezone.localdate() - timedelta(days=29), 30)
+        if (end - start).days > 366:
+            raise serializers.ValidationError("The range must not exceed 366 days.")
+        return Response({'property': property.pk, 'from': start, 'to': end, 'days': daily_views(property.pk, start, end)})
+
+    @action(detail=False, methods=['get'])
+    def recommended(self, request):
+        # Предрасчитанные соседи недавно просмотренного и связи недавних запросов
+        try:
+            limit = min(int(request.query_params.get('limit', settings.RECOMMEND_LIMIT)), 50)
+        except ValueError:
+            raise serializers.ValidationError("limit must be an integer.")
+        properties, source = recommend(request.user.pk, max(limit, 1))
+        return Response({'source': source, 'results': self.get_serializer(properties, many=True).data})
+
+    @action(detail=False, methods=['get'], url_path='price-stats')
+    def price_stats(self, request):
+        # Мин/макс, квантили и гистограмма цен по снимку в памяти, без запроса к БД
+        bins, price_filters = parse_price_filters(request.query_params)
+        return Response(price_snapshot.snapshot().stats(bins, **price_filters))
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def increment_view(self, request, pk=None):
         property = self.get_object()
-        property.views_count += 1
-        property.save()
-        PropertyView.objects.create(user=request.user, property=property)
+        view_counter.record(property.pk, request.user.pk)
         return Response({'status': 'view count incremented'})
 
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(IdempotentCreateMixin, FastListMixin, ExportMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
 
-    filterset_fields = {
-        'property': ['exact'],
-        'start_date': ['gte', 'lte'],
-        'end_date': ['gte', 'lte'],
-        'status': ['exact'],
-    }
+    filterset_class = BookingFilter
     ordering_fields = ['start_date', 'end_date', 'created_at']
+    export_name = 'bookings'
+    export_fields = (
+        'id', 'property_id', 'property__title', 'user_id', 'start_date', 'end_date', 'status', 'created_at',
+    )
 
     def get_queryset(self):
+        queryset = super().get_queryset()
+        # request.user может быть ClaimsUser без строки в БД, поэтому фильтруем по id
+        if self.action in ('update', 'partial_update'):
+            # update() проверяет владельца объекта
+            queryset = queryset.select_related('property')
         if self.request.user.is_landlord:
-            return self.queryset.filter(property__user=self.request.user)
-        return self.queryset.filter(user=self.request.user)
+            return queryset.filter(property__user_id=self.request.user.pk)
+        return queryset.filter(user_id=self.request.user.pk)
 
     def perform_create(self, serializer):
         property = serializer.validated_data['property']
         start_date = serializer.validated_data['start_date']
         end_date = serializer.validated_data['end_date']
 
-        if Booking.objects.filter(property=property, start_date__lt=end_date, end_date__gt=start_date).exists():
+        try:
+            with reserve(property.pk, start_date, end_date):
+                serializer.save(user_id=self.request.user.pk)
+        except BookingConflict:
             raise serializers.ValidationError("The selected dates overlap with an existing booking.")
 
-        serializer.save(user=self.request.user)
+    def perform_update(self, serializer):
+        # claim_version отсекает изменения, сделанные после чтения брони в этом запросе
+        booking = serializer.instance
+        if all(getattr(booking, field) == value for field, value in serializer.validated_data.items()):
+            # Ничего не меняется: версия остаётся прежней
+            return
+        if booking.status == 'cancelled':
+            with transaction.atomic():
+                claim_version(booking)
+                serializer.save()
+            return
+
+        property_id = serializer.validated_data['property'].pk if 'property' in serializer.validated_data else booking.property_id
+        start_date = serializer.validated_data.get('start_date', booking.start_date)
+        end_date = serializer.validated_data.get('end_date', booking.end_date)
+        try:
+            with reserve(property_id, start_date, end_date, exclude_booking=booking.pk):
+                claim_version(booking)
+                serializer.save()
+        except BookingConflict:
+            raise serializers.ValidationError("The selected dates overlap with an existing booking.")
 
     def update(self, request, *args, **kwargs):
         booking = self.get_object()
-        if request.user != booking.property.user:
+        if request.user.pk != booking.property.user_id:
             return Response({'detail': 'You do not have permission to confirm or cancel this booking.'}, status=403)
 
+        # Версия, которую видел клиент: If-Match: "3" или поле version в теле
+        expected = expected_version(request)
+        if expected is not None and expected != booking.version:
+            return self.version_conflict(booking.version)
+
         serializer = self.get_serializer(booking, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
+        try:
+            self.perform_update(serializer)
+        except VersionConflict as conflict:
+            return self.version_conflict(conflict.current)
         return Response(serializer.data)
 
+    def version_conflict(self, current):
+        return Response(
+            {'detail': 'The booking was modified by another request.', 'version': current},
+            status=status.HTTP_409_CONFLICT,
+        )
+
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
@@ -154,30 +325,61 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         property = serializer.validated_data['property']
-        if not Booking.objects.filter(property=property, user=self.request.user, end_date__lt=timezone.now()).exists():
+        if not Booking.objects.filter(property=property, user_id=self.request.user.pk, end_date__lt=timezone.now()).exists():
             raise serializers.ValidationError("You can only review properties you've stayed at.")
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.pk)
 
 
-class SearchHistoryViewSet(viewsets.ModelViewSet):
+class SearchHistoryViewSet(IngestCreateMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = SearchHistory.objects.all()
     serializer_class = SearchHistorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    ingestor = search_history_events
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        return super().get_queryset().filter(user_id=self.request.user.pk)
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def trending(self, request):
+        # Популярные запросы всех пользователей - только для персонала
+        start, end = date_range(request.query_params, timezone.localdate() - timedelta(days=6), 7)
+        if (end - start).days > 366:
+            raise serializers.ValidationError("The range must not exceed 366 days.")
+        return Response({'from': start, 'to': end, 'keywords': top_keywords(start, end, limit=20)})
 
 
-class PropertyViewViewSet(viewsets.ModelViewSet):
+class PropertyViewViewSet(IngestCreateMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = PropertyView.objects.all()
     serializer_class = PropertyViewSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ViewedAtCursorPagination
+    ingestor = property_view_events
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        return super().get_queryset().filter(user_id=self.request.user.pk)
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+
+class ResponseCacheStatsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(response_cache_stats.as_dict())
+
+
+class LandlordStatsView(APIView):
+    # Панель арендодателя: просмотры, брони, занятость, выручка и отзывы по дням и объектам
+    permission_classes = (permissions.IsAuthenticated, IsLandlord)
+
+    def get(self, request):
+        start, end = date_range(request.query_params, timezone.localdate() - timedelta(days=29), 30)
+        if (end - start).days > 366:
+            raise serializers.ValidationError("The range must not exceed 366 days.")
+        return Response(landlord_summary(request.user.pk, start, end))
+
+
+class IngestStatsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response({ingestor.name: ingestor.stats() for ingestor in ingestors})